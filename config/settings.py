@@ -98,6 +98,51 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL  = f"{FORCE_SCRIPT_NAME}/media/"
 MEDIA_ROOT  = BASE_DIR / 'media'
 
+# Uploads deduplicados por SHA-256 (hardlinks para MEDIA_ROOT/.blobs)
+STORAGES = {
+    "default": {"BACKEND": "core.storage.ArmazenamentoDeduplicado"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# --- Cache ---
+# Em arquivos, compartilhado pelos workers do gunicorn: com o LocMem padrão
+# cada processo tem o seu cache e uma invalidação feita num worker não
+# chegava aos outros (estatísticas de recebimentos, volume por cliente...)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": config('CACHE_DIR', default=str(BASE_DIR / '.cache')),
+    }
+}
+
+# Processos usados para gerar as versões reduzidas das imagens (0 = metade dos núcleos)
+IMAGENS_PROCESSOS = config('IMAGENS_PROCESSOS', default=0, cast=int)
+
+# Uploads acima deste tamanho vão direto para arquivo temporário em disco
+FILE_UPLOAD_MAX_MEMORY_SIZE = config('FILE_UPLOAD_MAX_MEMORY_SIZE', default=1024 * 1024, cast=int)
+# Miniaturas geradas ao mesmo tempo em cada processo do servidor (limita o pico de memória)
+IMAGENS_DECODIFICACOES_SIMULTANEAS = config('IMAGENS_DECODIFICACOES_SIMULTANEAS', default=2, cast=int)
+
+# Tamanho máximo de um upload retomável (enviado em partes)
+UPLOAD_RETOMAVEL_TAMANHO_MAXIMO = config('UPLOAD_RETOMAVEL_TAMANHO_MAXIMO', default=200 * 1024 * 1024, cast=int)
+# Arquivos dos uploads retomáveis em andamento. Fora do MEDIA_ROOT, para que os comandos de
+# manutenção da mídia não os tratem como arquivos salvos; no mesmo volume, para o arquivo
+# montado virar blob por hardlink
+UPLOADS_PARCIAIS_ROOT = config('UPLOADS_PARCIAIS_ROOT', default=str(BASE_DIR / 'uploads_parciais'))
+
+# Miniaturas entregues pelo nginx (X-Accel-Redirect para MEDIA_URL) em vez do Django
+MINIATURAS_X_ACCEL = config('MINIATURAS_X_ACCEL', default=not DEBUG, cast=bool)
+
+# Documentos protegidos (boletos, NFs, comprovantes): entregues pelo nginx a partir de um
+# location interno depois da autorização na view midia_protegida (ver core/midia_protegida.py)
+MIDIA_PROTEGIDA_X_ACCEL = config('MIDIA_PROTEGIDA_X_ACCEL', default=not DEBUG, cast=bool)
+MIDIA_PROTEGIDA_X_ACCEL_PREFIXO = config('MIDIA_PROTEGIDA_X_ACCEL_PREFIXO', default='/midia-protegida/')
+
+# Ponto com localização (ver core/geolocalizacao.py): precisão máxima aceita do GPS, em metros,
+# e serviço de geocodificação reversa para pontos fora das áreas cadastradas ('' desativa)
+PONTO_PRECISAO_MAXIMA = config('PONTO_PRECISAO_MAXIMA', default=100, cast=int)
+PONTO_GEOCODIFICACAO_URL = config('PONTO_GEOCODIFICACAO_URL', default='https://nominatim.openstreetmap.org/reverse')
+
 # --- Auth (URLs sob /blockline) --
 LOGIN_URL = f"{FORCE_SCRIPT_NAME}/accounts/login/"
 LOGIN_REDIRECT_URL = f"{FORCE_SCRIPT_NAME}/"
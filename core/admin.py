@@ -3,11 +3,11 @@ from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 from .models import (
     Empresa, PerfilUsuario, Setor, Fornecedor, Cliente,
-    ItemFornecedor, ItemEstoque, Recebimento,
+    ItemFornecedor, ItemEstoque, Recebimento, ItemRecebido,
     ImagemItemEstoque, ProdutoFabricado, DocumentoProdutoFabricado,
     ImagemProdutoFabricado, Componente, Expedicao,
     ItemExpedido, DocumentoExpedicao, ImagemExpedicao,
-    JornadaTrabalho, RegistroPonto, ResumoMensal, AbonoDia,
+    JornadaTrabalho, RegistroPonto, ResumoMensal, ResumoDiario, AbonoDia, Feriado, LancamentoBancoHoras, LocalPonto,
     MovimentacaoEstoque, RequisicaoCompra, HistoricoRequisicao,
     GastoViagem, GastoCaixaInterno,
     Project, Milestone, Sprint, Label, ProjectTask, ProjectAutomation, TaskQuantidadeFeita, TaskHistorico,
@@ -55,13 +55,20 @@ admin.site.register(Setor)
 admin.site.register(ItemFornecedor)
 admin.site.register(ImagemItemEstoque)
 
+class ItemRecebidoInline(admin.TabularInline):
+    model = ItemRecebido
+    extra = 0
+    fields = ('codigo_produto', 'descricao', 'item_estoque', 'unidade', 'quantidade', 'valor_unitario', 'valor_total')
+    raw_id_fields = ('item_estoque',)
+
 @admin.register(Recebimento)
 class RecebimentoAdmin(admin.ModelAdmin):
     list_display = ('numero_nota_fiscal', 'fornecedor', 'get_nome_fornecedor', 'setor', 'valor_total', 'status', 'data_recebimento', 'usuario')
     list_filter = ('status', 'data_recebimento', 'setor')
-    search_fields = ('numero_nota_fiscal', 'fornecedor__nome', 'fornecedor_nome', 'observacoes')
+    search_fields = ('numero_nota_fiscal', 'fornecedor__nome', 'fornecedor_nome', 'observacoes', 'chave_acesso')
     readonly_fields = ('data_recebimento',)
     exclude = ('empresa',)  # Ocultar campo empresa
+    inlines = [ItemRecebidoInline]
 
     def get_nome_fornecedor(self, obj):
         return obj.get_nome_fornecedor()
@@ -72,11 +79,16 @@ admin.site.register(ImagemProdutoFabricado)
 admin.site.register(Componente)
 @admin.register(Expedicao)
 class ExpedicaoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'cliente', 'nota_fiscal', 'usuario', 'data_expedicao')
+    list_display = ('id', 'cliente', 'get_nome_cliente', 'nota_fiscal', 'usuario', 'data_expedicao')
     list_filter = ('data_expedicao',)
-    search_fields = ('cliente', 'nota_fiscal', 'observacoes')
+    search_fields = ('cliente__nome', 'cliente_nome', 'nota_fiscal', 'observacoes')
     readonly_fields = ('data_expedicao',)
     exclude = ('empresa',)  # Ocultar campo empresa
+    list_select_related = ('cliente', 'usuario')
+
+    def get_nome_cliente(self, obj):
+        return obj.get_nome_cliente()
+    get_nome_cliente.short_description = 'Nome Cliente'
 admin.site.register(ItemExpedido)
 admin.site.register(DocumentoExpedicao)
 admin.site.register(ImagemExpedicao)
@@ -84,13 +96,15 @@ admin.site.register(ImagemExpedicao)
 # --- Registros de Ponto ---
 @admin.register(JornadaTrabalho)
 class JornadaTrabalhoAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'horas_diarias', 'horas_sexta', 'intervalo_almoco', 'dias_semana', 'periodo_mes_display')
+    list_display = ('usuario', 'controla_ponto', 'inicio_controle', 'horas_diarias', 'horas_sexta', 'intervalo_almoco', 'dias_semana', 'periodo_mes_display')
+    list_filter = ('controla_ponto',)
     search_fields = ('usuario__username',)
     fieldsets = (
-        ('Usuário', {'fields': ('usuario',)}),
+        ('Usuário', {'fields': ('usuario', 'controla_ponto', 'inicio_controle')}),
         ('Horários', {'fields': ('horas_diarias', 'horas_sexta', 'intervalo_almoco')}),
         ('Dias da Semana', {'fields': ('dias_semana',)}),
         ('Período do Mês', {'fields': ('dia_inicio_mes', 'dia_fim_mes'), 'description': 'Configure o período de cálculo mensal. Use 0 para "último dia do mês".'}),
+        ('Banco de Horas', {'fields': ('validade_banco_horas',)}),
     )
 
     def periodo_mes_display(self, obj):
@@ -102,12 +116,25 @@ class JornadaTrabalhoAdmin(admin.ModelAdmin):
             return f'Dia {obj.dia_inicio_mes} ao {obj.dia_fim_mes}'
     periodo_mes_display.short_description = 'Período do Mês'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Horas esperadas e faltas dos períodos abertos dependem do início do controle
+        if {'controla_ponto', 'inicio_controle'} & set(form.changed_data):
+            from .ponto import recalcular_periodos_abertos
+            recalcular_periodos_abertos(obj.usuario)
+
 @admin.register(RegistroPonto)
 class RegistroPontoAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'tipo', 'data_hora', 'abonado', 'abonado_por', 'localizacao')
-    list_filter = ('tipo', 'abonado', 'data_hora')
+    list_display = ('usuario', 'tipo', 'data_hora', 'abonado', 'abonado_por', 'localizacao', 'local')
+    list_filter = ('tipo', 'abonado', 'data_hora', 'local')
     search_fields = ('usuario__username',)
-    readonly_fields = ('data_hora',)
+    readonly_fields = ('data_hora', 'latitude', 'longitude', 'precisao', 'local')
+
+@admin.register(LocalPonto)
+class LocalPontoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'empresa', 'tolerancia_metros', 'ativo')
+    list_filter = ('empresa', 'ativo')
+    search_fields = ('nome', 'empresa__nome')
 
 @admin.register(AbonoDia)
 class AbonoDiaAdmin(admin.ModelAdmin):
@@ -123,10 +150,42 @@ class AbonoDiaAdmin(admin.ModelAdmin):
 
 @admin.register(ResumoMensal)
 class ResumoMensalAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'mes', 'ano', 'horas_trabalhadas', 'horas_esperadas', 'saldo_horas')
-    list_filter = ('mes', 'ano')
+    list_display = ('usuario', 'mes', 'ano', 'data_inicio', 'data_fim', 'horas_trabalhadas', 'horas_abonadas', 'horas_esperadas', 'saldo_horas', 'fechado')
+    list_filter = ('fechado', 'mes', 'ano')
+    search_fields = ('usuario__username',)
+    readonly_fields = ('fechado_em',)
+
+@admin.register(ResumoDiario)
+class ResumoDiarioAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'data', 'horas_trabalhadas', 'horas_abonadas', 'horas_esperadas', 'presente', 'abonado')
+    list_filter = ('presente', 'abonado', 'data')
     search_fields = ('usuario__username',)
 
+@admin.register(Feriado)
+class FeriadoAdmin(admin.ModelAdmin):
+    list_display = ('data', 'nome', 'tipo', 'recorrente')
+    list_filter = ('tipo', 'recorrente')
+    search_fields = ('nome',)
+    date_hierarchy = 'data'
+
+@admin.register(LancamentoBancoHoras)
+class LancamentoBancoHorasAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'data', 'tipo', 'horas', 'saldo', 'horas_restantes', 'vence_em', 'criado_por')
+    list_filter = ('tipo', 'data')
+    search_fields = ('usuario__username', 'descricao')
+    readonly_fields = ('saldo', 'horas_restantes', 'vence_em', 'resumo', 'criado_em')
+
+    def has_add_permission(self, request):
+        # O saldo acumulado depende da ordem: lançamentos só pela tela do banco de horas
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Correções entram como ajuste, para não quebrar os saldos seguintes
+        return False
+
 # --- Registro de Movimentações de Estoque ---
 @admin.register(MovimentacaoEstoque)
 class MovimentacaoEstoqueAdmin(admin.ModelAdmin):
@@ -166,11 +225,11 @@ class ClienteAdmin(admin.ModelAdmin):
 
 @admin.register(Fornecedor)
 class FornecedorAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'telefone', 'email', 'mercado', 'data_cadastro')
+    list_display = ('nome', 'cnpj', 'telefone', 'email', 'mercado', 'data_cadastro')
     list_filter = ('mercado', 'data_cadastro')
-    search_fields = ('nome', 'email', 'telefone')
+    search_fields = ('nome', 'cnpj', 'email', 'telefone')
     fieldsets = (
-        ('Informações Básicas', {'fields': ('empresa', 'nome', 'mercado')}),
+        ('Informações Básicas', {'fields': ('empresa', 'nome', 'cnpj', 'mercado')}),
         ('Contato', {'fields': ('telefone', 'email', 'site')}),
         ('Endereço', {'fields': ('endereco',)}),
         ('Descrição', {'fields': ('descricao',)}),
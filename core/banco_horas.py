@@ -0,0 +1,172 @@
+# core/banco_horas.py
+"""
+Banco de horas.
+
+É um livro-razão: cada LancamentoBancoHoras guarda o saldo acumulado logo
+depois dele, então o banco atual é a leitura de uma linha (o último
+lançamento) e nunca é preciso somar os pontos desde a admissão. Cada
+período fechado lança o seu saldo (ver ponto.fechar_periodo); ajustes e
+horas pagas em folha são lançados pelo supervisor.
+
+Horas positivas viram créditos que vencem após JornadaTrabalho.
+validade_banco_horas meses. Débitos compensam primeiro os créditos que
+vencem antes; o que vence sem ser compensado é baixado por
+expirar_creditos() com um lançamento de expiração. Débitos maiores que os
+créditos deixam o saldo negativo, que não expira e é abatido pelos
+próximos créditos.
+"""
+import calendar
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import JornadaTrabalho, LancamentoBancoHoras
+
+ZERO = Decimal('0')
+
+
+class SaldoInsuficiente(Exception):
+    """O débito é maior que o saldo do banco (ex: pagamento em folha)."""
+
+    def __init__(self, saldo):
+        self.saldo = saldo
+        super().__init__(f'Saldo disponível: {saldo}h')
+
+
+def somar_meses(data, meses):
+    """`data` + `meses`, limitando o dia ao último dia do mês (31/01 + 1 = 28/02)."""
+    mes = data.month - 1 + meses
+    ano, mes = data.year + mes // 12, mes % 12 + 1
+    return date(ano, mes, min(data.day, calendar.monthrange(ano, mes)[1]))
+
+
+def saldo_atual(usuario):
+    """Saldo do banco de horas: o saldo do último lançamento."""
+    saldo = (
+        LancamentoBancoHoras.objects.filter(usuario=usuario)
+        .order_by('-id').values_list('saldo', flat=True).first()
+    )
+    return saldo if saldo is not None else ZERO
+
+
+def creditos_a_vencer(usuario):
+    """[(vence_em, horas)] dos créditos ainda não compensados, do mais próximo ao mais distante."""
+    return list(
+        LancamentoBancoHoras.objects.filter(usuario=usuario, horas_restantes__gt=0, vence_em__isnull=False)
+        .values('vence_em').annotate(horas=Sum('horas_restantes')).order_by('vence_em')
+        .values_list('vence_em', 'horas')
+    )
+
+
+def _travar(usuario):
+    """Bloqueia a jornada do usuário: os lançamentos dele ficam em fila."""
+    JornadaTrabalho.objects.get_or_create(usuario=usuario)
+    return JornadaTrabalho.objects.select_for_update().get(usuario=usuario)
+
+
+def _compensar(usuario, horas):
+    """Abate `horas` dos créditos em aberto, começando pelos que vencem antes."""
+    creditos = (
+        LancamentoBancoHoras.objects.filter(usuario=usuario, horas_restantes__gt=0)
+        .order_by(F('vence_em').asc(nulls_last=True), 'id')
+    )
+    usados = []
+    for credito in creditos:
+        if horas <= 0:
+            break
+        abatido = min(horas, credito.horas_restantes)
+        credito.horas_restantes -= abatido
+        horas -= abatido
+        usados.append(credito)
+    LancamentoBancoHoras.objects.bulk_update(usados, ['horas_restantes'])
+
+
+def lancar(usuario, horas, tipo, data, descricao='', resumo=None, criado_por=None, exigir_saldo=False):
+    """
+    Registra um lançamento de `horas` (positivo = crédito, negativo =
+    débito) e atualiza o saldo acumulado.
+
+    Returns:
+        LancamentoBancoHoras criado
+
+    Raises:
+        SaldoInsuficiente: com exigir_saldo, o débito é maior que o saldo.
+            A conferência é feita com o banco do usuário travado, então dois
+            pagamentos simultâneos não passam ambos.
+    """
+    horas = Decimal(str(horas)).quantize(Decimal('0.01'))
+    with transaction.atomic():
+        jornada = _travar(usuario)
+        # Créditos vencidos até a data não podem compensar este lançamento
+        _baixar_vencidos(usuario, data)
+        anterior = saldo_atual(usuario)
+        if exigir_saldo and horas < 0 and -horas > anterior:
+            raise SaldoInsuficiente(anterior)
+        lancamento = LancamentoBancoHoras(
+            usuario=usuario, data=data, tipo=tipo, horas=horas, saldo=anterior + horas,
+            resumo=resumo, descricao=descricao, criado_por=criado_por,
+        )
+        if horas > 0:
+            # Se o banco estava negativo, a parte que cobre a dívida não vira crédito
+            credito = horas - max(ZERO, -anterior)
+            if credito > 0:
+                lancamento.horas_restantes = credito
+                if jornada.validade_banco_horas:
+                    lancamento.vence_em = somar_meses(data, jornada.validade_banco_horas)
+        elif horas < 0:
+            _compensar(usuario, -horas)
+        lancamento.save()
+    return lancamento
+
+
+def lancar_fechamento(resumo):
+    """
+    Lança o saldo de um período fechado (uma única vez por período). Não
+    lança nada para quem não controla ponto nem para período que terminou
+    antes do início do controle.
+    """
+    jornada = JornadaTrabalho.objects.filter(usuario_id=resumo.usuario_id).first()
+    if jornada is None or not jornada.controla_ponto:
+        return None
+    if jornada.inicio_controle and resumo.data_fim < jornada.inicio_controle:
+        return None
+    if LancamentoBancoHoras.objects.filter(resumo=resumo).exists():
+        return None
+    return lancar(
+        resumo.usuario, resumo.saldo_horas, 'periodo', resumo.data_fim,
+        descricao=f'Período {resumo.data_inicio:%d/%m/%Y} a {resumo.data_fim:%d/%m/%Y}',
+        resumo=resumo,
+    )
+
+
+def _baixar_vencidos(usuario, hoje):
+    vencidos = list(
+        LancamentoBancoHoras.objects.filter(usuario=usuario, horas_restantes__gt=0, vence_em__lte=hoje)
+        .order_by('vence_em', 'id')
+    )
+    saldo = saldo_atual(usuario)
+    criados = []
+    for credito in vencidos:
+        saldo -= credito.horas_restantes
+        criados.append(LancamentoBancoHoras(
+            usuario=usuario, data=credito.vence_em, tipo='expiracao', horas=-credito.horas_restantes,
+            saldo=saldo, descricao=f'Crédito de {credito.data:%d/%m/%Y} não compensado',
+        ))
+        credito.horas_restantes = ZERO
+    LancamentoBancoHoras.objects.bulk_update(vencidos, ['horas_restantes'])
+    return LancamentoBancoHoras.objects.bulk_create(criados)
+
+
+def expirar_creditos(usuario, hoje):
+    """
+    Baixa os créditos vencidos até `hoje` que não foram compensados, com um
+    lançamento de expiração para cada um.
+
+    Returns:
+        list[LancamentoBancoHoras]: lançamentos de expiração criados
+    """
+    with transaction.atomic():
+        _travar(usuario)
+        return _baixar_vencidos(usuario, hoje)
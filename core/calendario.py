@@ -0,0 +1,131 @@
+# core/calendario.py
+"""
+Calendário de trabalho: dias úteis e horas esperadas de uma jornada.
+
+As horas esperadas de qualquer intervalo saem em forma fechada: conta-se
+quantas vezes cada dia da semana aparece no intervalo (semanas inteiras
+mais o resto), multiplica-se pelas horas da jornada naquele dia da semana
+e descontam-se os feriados que caem em dia de trabalho. O custo não depende
+do tamanho do intervalo. Dias anteriores ao início do controle de ponto
+da jornada (inicio_controle) não contam como dias úteis.
+
+Os feriados vêm da tabela Feriado e ficam em memória por ano (um dict por
+processo). Salvar ou excluir um Feriado limpa o cache do processo; nos
+demais workers a cópia expira em TEMPO_CACHE_FERIADOS segundos.
+
+É a base usada pelo controle de ponto, pelo relatório da equipe e pelos
+ResumoMensal (ver core/ponto.py).
+"""
+import time
+
+from django.db.models import Q
+
+from .models import Feriado
+
+TEMPO_CACHE_FERIADOS = 600
+
+# ano -> (momento da carga, {data: nome})
+_feriados_por_ano = {}
+
+
+def limpar_cache_feriados():
+    _feriados_por_ano.clear()
+
+
+def feriados_do_ano(ano):
+    """{data: nome} dos feriados do ano, incluindo os que se repetem todo ano."""
+    em_cache = _feriados_por_ano.get(ano)
+    if em_cache and time.monotonic() - em_cache[0] < TEMPO_CACHE_FERIADOS:
+        return em_cache[1]
+
+    feriados = {}
+    for data, nome, recorrente in Feriado.objects.filter(
+        Q(data__year=ano) | Q(recorrente=True),
+    ).values_list('data', 'nome', 'recorrente'):
+        if recorrente:
+            if data.year > ano:
+                continue
+            try:
+                data = data.replace(year=ano)
+            except ValueError:
+                continue  # 29/02 em ano não bissexto
+        feriados.setdefault(data, nome)
+    _feriados_por_ano[ano] = (time.monotonic(), feriados)
+    return feriados
+
+
+def feriado(data):
+    """Nome do feriado em `data`, ou None."""
+    return feriados_do_ano(data.year).get(data)
+
+
+def feriados_entre(inicio, fim):
+    """{data: nome} dos feriados em [inicio, fim]."""
+    encontrados = {}
+    for ano in range(inicio.year, fim.year + 1):
+        encontrados.update(
+            (data, nome) for data, nome in feriados_do_ano(ano).items() if inicio <= data <= fim
+        )
+    return encontrados
+
+
+def contagem_dias_semana(inicio, fim):
+    """
+    Quantas segundas, terças, ..., domingos há em [inicio, fim], sem
+    percorrer os dias.
+
+    Returns:
+        list[int]: 7 contagens, índice 0 = segunda (como date.weekday())
+    """
+    total = (fim - inicio).days + 1
+    if total <= 0:
+        return [0] * 7
+    semanas, resto = divmod(total, 7)
+    contagem = [semanas] * 7
+    primeiro = inicio.weekday()
+    for i in range(resto):
+        contagem[(primeiro + i) % 7] += 1
+    return contagem
+
+
+def _inicio_controle(jornada, inicio):
+    """`inicio`, ou o início do controle de ponto da jornada se for posterior."""
+    return max(inicio, jornada.inicio_controle) if jornada.inicio_controle else inicio
+
+
+def eh_dia_util(jornada, data):
+    """Dia de trabalho da jornada que não é feriado."""
+    if jornada.inicio_controle and data < jornada.inicio_controle:
+        return False
+    return data.weekday() in jornada.dias_trabalho and feriado(data) is None
+
+
+def horas_esperadas_dia(jornada, data):
+    """Horas esperadas em `data`: zero em folgas e feriados."""
+    if not eh_dia_util(jornada, data):
+        return 0.0
+    return jornada.horas_por_dia_semana[data.weekday()]
+
+
+def dias_uteis(jornada, inicio, fim):
+    """Número de dias úteis da jornada em [inicio, fim]."""
+    inicio = _inicio_controle(jornada, inicio)
+    if fim < inicio:
+        return 0
+    contagem = contagem_dias_semana(inicio, fim)
+    total = sum(contagem[dia] for dia in jornada.dias_trabalho)
+    total -= sum(1 for data in feriados_entre(inicio, fim) if data.weekday() in jornada.dias_trabalho)
+    return total
+
+
+def horas_esperadas(jornada, inicio, fim):
+    """Horas esperadas em [inicio, fim], já descontados os feriados."""
+    inicio = _inicio_controle(jornada, inicio)
+    if fim < inicio:
+        return 0.0
+    horas_por_dia = jornada.horas_por_dia_semana
+    contagem = contagem_dias_semana(inicio, fim)
+    total = sum(quantidade * horas for quantidade, horas in zip(contagem, horas_por_dia))
+    total -= sum(horas_por_dia[data.weekday()] for data in feriados_entre(inicio, fim))
+    return total
+
@@ -0,0 +1,111 @@
+# core/estoque.py
+"""
+Baixa e devolução de estoque em lote.
+
+Usado pelas expedições (registro, edição e exclusão): as quantidades de todas as linhas são somadas por
+item e aplicadas de uma vez, com os itens travados (select_for_update) em
+ordem de id para que duas operações simultâneas nunca se bloqueiem em ordem
+invertida. O número de consultas é fixo, independente da quantidade de linhas.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Q, When
+from django.utils import timezone
+
+from .models import ItemEstoque, MovimentacaoEstoque
+
+
+class EstoqueInsuficiente(Exception):
+    """Uma ou mais baixas deixariam o estoque negativo."""
+
+    def __init__(self, faltas):
+        # Lista de (nome do item, quantidade disponível, quantidade solicitada)
+        self.faltas = faltas
+        super().__init__(', '.join(f"{nome} (disponível: {disponivel})" for nome, disponivel, _ in faltas))
+
+
+def somar_por_item(linhas):
+    """Soma pares (item_estoque_id, quantidade) por item, ignorando linhas sem item de estoque."""
+    total = defaultdict(int)
+    for item_id, quantidade in linhas:
+        if item_id:
+            total[item_id] += quantidade
+    return dict(total)
+
+
+def aplicar_deltas_estoque(deltas, usuario=None, observacoes=''):
+    """
+    Aplica variações de estoque por item. Deve ser chamada dentro de um
+    transaction.atomic().
+
+    Args:
+        deltas: dict {item_estoque_id: quantidade}. Positivo é saída
+            (baixa), negativo é entrada (devolução ao estoque).
+        usuario: Usuário registrado nas movimentações
+        observacoes: Texto das movimentações geradas
+
+    Raises:
+        EstoqueInsuficiente: se alguma saída for maior que o disponível.
+            Nada é alterado nesse caso.
+    """
+    deltas = {item_id: quantidade for item_id, quantidade in deltas.items() if quantidade}
+    if not deltas:
+        return
+
+    ids = sorted(deltas)
+    itens = {
+        item.pk: item
+        for item in ItemEstoque.objects.select_for_update().filter(pk__in=ids).order_by('pk').only('id', 'nome', 'quantidade')
+    }
+
+    faltas = [
+        (itens[item_id].nome, itens[item_id].quantidade, deltas[item_id])
+        for item_id in ids
+        if item_id in itens and deltas[item_id] > itens[item_id].quantidade
+    ]
+    if faltas:
+        raise EstoqueInsuficiente(faltas)
+
+    # Um único UPDATE; a condição por item garante que nenhuma saída passe do disponível
+    condicao = Q()
+    for item_id in ids:
+        if deltas[item_id] > 0:
+            condicao |= Q(pk=item_id, quantidade__gte=deltas[item_id])
+        else:
+            condicao |= Q(pk=item_id)
+    atualizados = ItemEstoque.objects.filter(condicao).update(
+        quantidade=Case(
+            *[When(pk=item_id, then=F('quantidade') - deltas[item_id]) for item_id in ids],
+            default=F('quantidade'),
+            output_field=IntegerField(),
+        ),
+        data_atualizacao=timezone.now(),
+    )
+    if atualizados != len(itens):
+        raise EstoqueInsuficiente([
+            (item.nome, item.quantidade, deltas[item.pk]) for item in itens.values()
+        ])
+
+    MovimentacaoEstoque.objects.bulk_create([
+        MovimentacaoEstoque(
+            item_id=item_id,
+            tipo='saida' if deltas[item_id] > 0 else 'entrada',
+            quantidade=abs(deltas[item_id]),
+            usuario=usuario,
+            observacoes=observacoes,
+        )
+        for item_id in ids if item_id in itens
+    ])
+
+
+def reconciliar_estoque(antigas, novas, usuario=None, observacoes=''):
+    """
+    Compara dois conjuntos de quantidades por item ({item_id: quantidade})
+    e aplica só a diferença líquida: o que aumentou sai do estoque e o que
+    diminuiu (ou foi removido) volta para ele.
+    """
+    deltas = {
+        item_id: novas.get(item_id, 0) - antigas.get(item_id, 0)
+        for item_id in set(antigas) | set(novas)
+    }
+    aplicar_deltas_estoque(deltas, usuario=usuario, observacoes=observacoes)
@@ -0,0 +1,90 @@
+# core/exportacao.py
+"""
+Exportação de relatórios em CSV e XLSX sem montar o arquivo inteiro em memória.
+
+O CSV é gerado linha a linha numa StreamingHttpResponse (separador ";" e
+vírgula decimal, como o Excel em português espera). O XLSX usa o modo
+write-only do openpyxl, que grava as linhas direto num arquivo temporário,
+e é enviado em blocos com FileResponse.
+
+gerar_csv() e salvar_xlsx() também servem para gravar o arquivo direto
+em disco (comandos de gerenciamento).
+"""
+import csv
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+
+
+class _Eco:
+    """Objeto com write() que só devolve o texto, para o csv.writer gerar linhas."""
+
+    def write(self, valor):
+        return valor
+
+
+def _valor_csv(valor):
+    if isinstance(valor, (float, Decimal)):
+        return f"{valor:.2f}".replace('.', ',')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if valor is None:
+        return ''
+    return valor
+
+
+def gerar_csv(cabecalho, linhas):
+    """Gerador com o texto do CSV, linha a linha (BOM, separador ";" e vírgula decimal)."""
+    escritor = csv.writer(_Eco(), delimiter=';')
+    # BOM para o Excel reconhecer o UTF-8
+    yield '\ufeff' + escritor.writerow(cabecalho)
+    for linha in linhas:
+        yield escritor.writerow([_valor_csv(v) for v in linha])
+
+
+def resposta_csv(nome_arquivo, cabecalho, linhas):
+    """
+    CSV em streaming.
+
+    Args:
+        nome_arquivo: nome sugerido para download (ex: ponto_2025-01.csv)
+        cabecalho: lista com os títulos das colunas
+        linhas: iterável de listas (pode ser um gerador)
+    """
+    resposta = StreamingHttpResponse(gerar_csv(cabecalho, linhas), content_type='text/csv; charset=utf-8')
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return resposta
+
+
+def salvar_xlsx(arquivo, cabecalho, linhas, titulo='Relatório'):
+    """Grava o XLSX em `arquivo` (caminho ou arquivo binário) no modo write-only do openpyxl."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=titulo[:31])
+    celulas = []
+    for titulo_coluna in cabecalho:
+        celula = WriteOnlyCell(ws, value=titulo_coluna)
+        celula.font = Font(bold=True)
+        celulas.append(celula)
+    ws.append(celulas)
+    for linha in linhas:
+        ws.append([float(v) if isinstance(v, Decimal) else v for v in linha])
+    wb.save(arquivo)
+
+
+def resposta_xlsx(nome_arquivo, cabecalho, linhas, titulo='Relatório'):
+    """XLSX gerado em modo write-only num arquivo temporário e enviado em blocos."""
+    arquivo = tempfile.TemporaryFile()
+    salvar_xlsx(arquivo, cabecalho, linhas, titulo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=nome_arquivo,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -3,8 +3,9 @@ from .models import (
     ItemEstoque, Recebimento, ProdutoFabricado,
     DocumentoProdutoFabricado, Componente, ImagemProdutoFabricado,
     Fornecedor, ItemFornecedor, Expedicao, ItemExpedido, DocumentoExpedicao, ImagemExpedicao,
-    Cliente
+    Cliente, Setor
 )
+from .uploads import UploadRetomavelMixin
 
 # Formulário para CRIAR e EDITAR um Item de Estoque
 class ItemEstoqueForm(forms.ModelForm):
@@ -118,6 +119,29 @@ class RecebimentoForm(forms.ModelForm):
 
         return cleaned_data
 
+class ImportarNFeForm(forms.Form):
+    arquivo = forms.FileField(
+        label="XML da NF-e ou arquivo .zip",
+        help_text="Envie um XML de NF-e ou um .zip com vários XMLs.",
+        widget=forms.FileInput(attrs={
+            'class': 'mt-1 block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-md file:border-0 file:bg-indigo-50 file:text-indigo-700 hover:file:bg-indigo-100',
+            'accept': '.xml,.zip',
+        })
+    )
+    setor = forms.ModelChoiceField(
+        queryset=Setor.objects.all(),
+        label="Setor de Destino",
+        widget=forms.Select(attrs={
+            'class': 'mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'
+        })
+    )
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if not arquivo.name.lower().endswith(('.xml', '.zip')):
+            raise forms.ValidationError('Envie um arquivo .xml ou .zip.')
+        return arquivo
+
 # --- Formulários de Produto ---
 
 class ProdutoFabricadoForm(forms.ModelForm):
@@ -138,13 +162,15 @@ class ComponenteForm(forms.ModelForm):
             'item_estoque': forms.Select(attrs={'class': 'block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
             'quantidade_necessaria': forms.NumberInput(attrs={'class': 'block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
         }
-class DocumentoProdutoForm(forms.ModelForm):
+class DocumentoProdutoForm(UploadRetomavelMixin, forms.ModelForm):
+    campos_upload_retomavel = ('documento',)
+
     class Meta:
         model = DocumentoProdutoFabricado
         fields = ['documento', 'tipo']
         labels = {'documento': 'Arquivo', 'tipo': 'Tipo de Documento'}
         widgets = {
-            'documento': forms.FileInput(attrs={'class': 'block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-indigo-50 file:text-indigo-700 hover:file:bg-indigo-100'}),
+            'documento': forms.FileInput(attrs={'class': 'block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-indigo-50 file:text-indigo-700 hover:file:bg-indigo-100', 'data-upload-retomavel': ''}),
             'tipo': forms.Select(attrs={'class': 'block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
         }
 # O FORMULÁRIO QUE ESTAVA FALTANDO
@@ -170,10 +196,11 @@ class ProducaoForm(forms.Form):
 class ItemFornecedorForm(forms.ModelForm):
     class Meta:
         model = ItemFornecedor
-        fields = ['fornecedor', 'fornecedor_nome', 'valor_pago', 'data_cotacao']
+        fields = ['fornecedor', 'fornecedor_nome', 'codigo_produto', 'valor_pago', 'data_cotacao']
         labels = {
             'fornecedor': 'Fornecedor Cadastrado (opcional)',
             'fornecedor_nome': 'Ou digite o nome do fornecedor',
+            'codigo_produto': 'Código do Produto no Fornecedor (opcional)',
             'valor_pago': 'Valor (R$)',
             'data_cotacao': 'Data da Cotação',
         }
@@ -185,6 +212,10 @@ class ItemFornecedorForm(forms.ModelForm):
                 'class': 'block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm',
                 'placeholder': 'Digite o nome do fornecedor se não estiver cadastrado'
             }),
+            'codigo_produto': forms.TextInput(attrs={
+                'class': 'block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm',
+                'placeholder': 'Código que aparece na NF-e do fornecedor'
+            }),
             'valor_pago': forms.NumberInput(attrs={
                 'class': 'block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm',
                 'placeholder': '0.00',
@@ -210,18 +241,38 @@ class ItemFornecedorForm(forms.ModelForm):
 class ExpedicaoForm(forms.ModelForm):
     class Meta:
         model = Expedicao
-        fields = fields = ['empresa', 'cliente', 'nota_fiscal', 'observacoes']
+        fields = ['empresa', 'cliente', 'cliente_nome', 'nota_fiscal', 'observacoes']
         labels = {
-            'cliente': 'Cliente / Destino',
+            'cliente': 'Cliente Cadastrado',
+            'cliente_nome': 'Ou digite o cliente / destino',
             'nota_fiscal': 'Número da Nota Fiscal',
             'observacoes': 'Observações Gerais',
         }
         widgets = {
-            'cliente': forms.TextInput(attrs={'class': 'mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
+            'cliente': forms.Select(attrs={'class': 'mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
+            'cliente_nome': forms.TextInput(attrs={'class': 'mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm', 'placeholder': 'Digite o nome se o cliente não estiver cadastrado'}),
             'nota_fiscal': forms.TextInput(attrs={'class': 'mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
             'observacoes': forms.Textarea(attrs={'class': 'mt-1 block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm', 'rows': 3}),
         }
 
+    def clean(self):
+        from .utils import normalizar_nome
+
+        cleaned_data = super().clean()
+        cliente = cleaned_data.get('cliente')
+        cliente_nome = cleaned_data.get('cliente_nome')
+
+        if not cliente and not cliente_nome:
+            raise forms.ValidationError('Selecione um cliente cadastrado ou digite o nome.')
+
+        # Nome digitado que corresponde a um cliente cadastrado: vincula pela FK
+        if not cliente and cliente_nome:
+            candidato = Cliente.objects.filter(nome_normalizado=normalizar_nome(cliente_nome)).first()
+            if candidato:
+                cleaned_data['cliente'] = candidato
+
+        return cleaned_data
+
 class ItemExpedidoForm(forms.ModelForm):
     class Meta:
         model = ItemExpedido
@@ -232,13 +283,15 @@ class ItemExpedidoForm(forms.ModelForm):
             'quantidade': forms.NumberInput(attrs={'class': 'block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
         }
 
-class DocumentoExpedicaoForm(forms.ModelForm):
+class DocumentoExpedicaoForm(UploadRetomavelMixin, forms.ModelForm):
+    campos_upload_retomavel = ('documento',)
+
     class Meta:
         model = DocumentoExpedicao
         fields = ['documento', 'tipo']
         labels = {'documento': '', 'tipo': ''}
         widgets = {
-            'documento': forms.FileInput(attrs={'class': 'block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-indigo-50 file:text-indigo-700 hover:file:bg-indigo-100'}),
+            'documento': forms.FileInput(attrs={'class': 'block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-indigo-50 file:text-indigo-700 hover:file:bg-indigo-100', 'data-upload-retomavel': ''}),
             'tipo': forms.Select(attrs={'class': 'block w-full px-3 py-2 border border-gray-300 rounded-md shadow-sm focus:outline-none focus:ring-indigo-500 focus:border-indigo-500 sm:text-sm'}),
         }
 
@@ -255,9 +308,10 @@ class ImagemExpedicaoForm(forms.ModelForm):
 class FornecedorForm(forms.ModelForm):
     class Meta:
         model = Fornecedor
-        fields = ['nome', 'endereco', 'telefone', 'email', 'site', 'mercado', 'descricao']
+        fields = ['nome', 'cnpj', 'endereco', 'telefone', 'email', 'site', 'mercado', 'descricao']
         widgets = {
             'nome': forms.TextInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent'}),
+            'cnpj': forms.TextInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent', 'placeholder': '00.000.000/0000-00'}),
             'endereco': forms.Textarea(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent', 'rows': 3}),
             'telefone': forms.TextInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent', 'placeholder': '(00) 0000-0000'}),
             'email': forms.EmailInput(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent', 'placeholder': 'exemplo@email.com'}),
@@ -266,6 +320,13 @@ class FornecedorForm(forms.ModelForm):
             'descricao': forms.Textarea(attrs={'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent', 'rows': 4}),
         }
 
+    def clean_cnpj(self):
+        # Guarda só os dígitos para casar com o CNPJ do emitente da NF-e
+        cnpj = ''.join(c for c in (self.cleaned_data.get('cnpj') or '') if c.isdigit())
+        if cnpj and len(cnpj) != 14:
+            raise forms.ValidationError('O CNPJ deve ter 14 dígitos.')
+        return cnpj or None
+
 class ClienteForm(forms.ModelForm):
     class Meta:
         model = Cliente
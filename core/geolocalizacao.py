@@ -0,0 +1,224 @@
+# core/geolocalizacao.py
+"""
+Validação da localização do ponto, feita no servidor.
+
+O navegador manda latitude, longitude e precisão junto com o ponto. Cada
+Empresa pode ter LocalPonto (polígonos da fábrica, escritório...); se o
+funcionário tem locais cadastrados, o ponto só é aceito dentro de um deles,
+com a tolerância do local mais a precisão do GPS (até
+PONTO_PRECISAO_MAXIMA metros).
+
+Os polígonos ficam em memória já projetados em metros num plano local
+(bom para áreas de alguns quilômetros) e com o retângulo envolvente
+calculado, então o teste é um descarte pelo retângulo seguido de um
+ray casting. Salvar ou excluir um LocalPonto limpa o cache do processo;
+nos demais workers ele expira em TEMPO_CACHE_LOCAIS segundos.
+
+Pontos fora das áreas cadastradas (ou de quem não tem área) guardam um
+endereço aproximado obtido no Nominatim pelo servidor. A resposta fica no
+cache do Django pela coordenada arredondada (~100 m), então pontos
+repetidos do mesmo lugar não fazem nova consulta. Pontos dentro de uma
+área usam o nome do local e não consultam nada.
+"""
+import json
+import logging
+import math
+import time
+import urllib.parse
+import urllib.request
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import LocalPonto
+
+logger = logging.getLogger(__name__)
+
+RAIO_TERRA = 6371000
+TEMPO_CACHE_LOCAIS = 600
+TEMPO_CACHE_ENDERECOS = 30 * 24 * 3600
+CASAS_ENDERECO = 3  # ~110 m de latitude
+
+# (momento da carga, [área preparada])
+_cache_locais = None
+
+
+def limpar_cache_locais():
+    global _cache_locais
+    _cache_locais = None
+
+
+def _projetar(lat, lon, lat_ref):
+    """Latitude/longitude -> (x, y) em metros numa projeção equiretangular em torno de lat_ref."""
+    return (
+        math.radians(lon) * RAIO_TERRA * math.cos(math.radians(lat_ref)),
+        math.radians(lat) * RAIO_TERRA,
+    )
+
+
+def _preparar(local):
+    lat_ref = sum(v[0] for v in local.poligono) / len(local.poligono)
+    pontos = [_projetar(lat, lon, lat_ref) for lat, lon in local.poligono]
+    xs = [x for x, _ in pontos]
+    ys = [y for _, y in pontos]
+    return {
+        'id': local.pk,
+        'nome': local.nome,
+        'empresa_id': local.empresa_id,
+        'lat_ref': lat_ref,
+        'pontos': pontos,
+        'caixa': (min(xs), min(ys), max(xs), max(ys)),
+        'tolerancia': local.tolerancia_metros,
+    }
+
+
+def areas():
+    """Locais ativos já preparados para o teste, em cache por processo."""
+    global _cache_locais
+    if _cache_locais and time.monotonic() - _cache_locais[0] < TEMPO_CACHE_LOCAIS:
+        return _cache_locais[1]
+    preparadas = [
+        _preparar(local)
+        for local in LocalPonto.objects.filter(ativo=True)
+        if isinstance(local.poligono, list) and len(local.poligono) >= 3
+    ]
+    _cache_locais = (time.monotonic(), preparadas)
+    return preparadas
+
+
+def areas_do_usuario(usuario):
+    """
+    Áreas em que o usuário pode bater ponto: as das empresas do perfil; sem
+    empresa no perfil (ou superusuário), as de todas as empresas.
+    """
+    todas = areas()
+    if not todas or usuario.is_superuser:
+        return todas
+    perfil = getattr(usuario, 'perfil', None)
+    empresas = set(perfil.empresas_permitidas.values_list('pk', flat=True)) if perfil else set()
+    if not empresas:
+        return todas
+    return [area for area in todas if area['empresa_id'] in empresas]
+
+
+def _dentro(pontos, x, y):
+    """Ray casting: o ponto está dentro do polígono?"""
+    dentro = False
+    j = len(pontos) - 1
+    for i in range(len(pontos)):
+        xi, yi = pontos[i]
+        xj, yj = pontos[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            dentro = not dentro
+        j = i
+    return dentro
+
+
+def _distancia_borda(pontos, x, y):
+    """Menor distância (metros) do ponto até as arestas do polígono."""
+    menor = math.inf
+    j = len(pontos) - 1
+    for i in range(len(pontos)):
+        (ax, ay), (bx, by) = pontos[j], pontos[i]
+        dx, dy = bx - ax, by - ay
+        comprimento = dx * dx + dy * dy
+        t = max(0.0, min(1.0, ((x - ax) * dx + (y - ay) * dy) / comprimento)) if comprimento else 0.0
+        menor = min(menor, math.hypot(x - (ax + t * dx), y - (ay + t * dy)))
+        j = i
+    return menor
+
+
+def localizar(lat, lon, precisao, areas_permitidas):
+    """
+    Área que contém o ponto (com tolerância e precisão do GPS).
+
+    Returns:
+        (área, 0) se aceito; (None, (nome, distância em metros) da área mais próxima) se não
+    """
+    folga_gps = min(precisao or 0, settings.PONTO_PRECISAO_MAXIMA)
+    mais_proxima = None
+    for area in areas_permitidas:
+        x, y = _projetar(lat, lon, area['lat_ref'])
+        folga = area['tolerancia'] + folga_gps
+        x0, y0, x1, y1 = area['caixa']
+        if x0 - folga <= x <= x1 + folga and y0 - folga <= y <= y1 + folga:
+            if _dentro(area['pontos'], x, y):
+                return area, 0
+        distancia = _distancia_borda(area['pontos'], x, y)
+        if distancia <= folga:
+            return area, 0
+        if mais_proxima is None or distancia < mais_proxima[1]:
+            mais_proxima = (area['nome'], distancia)
+    return None, mais_proxima
+
+
+def ler_coordenadas(dados):
+    """(latitude, longitude, precisão em metros) do POST, ou None se ausentes/inválidas."""
+    try:
+        lat = Decimal(dados.get('latitude', '')).quantize(Decimal('0.000001'))
+        lon = Decimal(dados.get('longitude', '')).quantize(Decimal('0.000001'))
+    except (InvalidOperation, TypeError):
+        return None
+    if not (lat.is_finite() and lon.is_finite() and -90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    try:
+        precisao = max(0, round(float(dados.get('precisao', ''))))
+    except (ValueError, OverflowError):
+        precisao = None
+    return lat, lon, precisao
+
+
+def endereco_aproximado(lat, lon):
+    """Endereço da coordenada pelo Nominatim, em cache pela coordenada arredondada."""
+    url_base = settings.PONTO_GEOCODIFICACAO_URL
+    if not url_base:
+        return None
+    lat, lon = round(float(lat), CASAS_ENDERECO), round(float(lon), CASAS_ENDERECO)
+    chave = f'geocodificacao:{lat}:{lon}'
+    endereco = cache.get(chave)
+    if endereco is not None:
+        return endereco or None
+
+    consulta = urllib.parse.urlencode({'format': 'json', 'lat': lat, 'lon': lon, 'zoom': 18})
+    pedido = urllib.request.Request(f'{url_base}?{consulta}', headers={'User-Agent': 'Blockline/1.0 (controle de ponto)'})
+    try:
+        with urllib.request.urlopen(pedido, timeout=3) as resposta:
+            endereco = (json.load(resposta).get('display_name') or '')[:200]
+        cache.set(chave, endereco, TEMPO_CACHE_ENDERECOS)
+    except Exception as e:
+        # Sem endereço o ponto é registrado só com as coordenadas; tenta de novo em uma hora
+        logger.warning('Falha na geocodificação de %s,%s: %s', lat, lon, e)
+        cache.set(chave, '', 3600)
+        return None
+    return endereco or None
+
+
+def validar_localizacao(usuario, dados):
+    """
+    Confere a localização enviada com o ponto.
+
+    Returns:
+        (mensagem de erro ou None, campos de localização para o RegistroPonto)
+    """
+    coordenadas = ler_coordenadas(dados)
+    permitidas = areas_do_usuario(usuario)
+    if coordenadas is None:
+        if permitidas:
+            return 'Permita o acesso à localização para registrar o ponto.', {}
+        return None, {}
+
+    lat, lon, precisao = coordenadas
+    campos = {'latitude': lat, 'longitude': lon, 'precisao': precisao}
+    if permitidas:
+        if precisao is None or precisao > settings.PONTO_PRECISAO_MAXIMA:
+            return 'Localização imprecisa. Aguarde o GPS estabilizar (de preferência ao ar livre) e tente de novo.', {}
+        area, mais_proxima = localizar(float(lat), float(lon), precisao, permitidas)
+        if area is None:
+            nome, distancia = mais_proxima
+            return f'Você está fora da área permitida para o ponto ({distancia:.0f} m de {nome}).', {}
+        campos.update(local_id=area['id'], localizacao=area['nome'])
+        return None, campos
+
+    campos['localizacao'] = endereco_aproximado(lat, lon)
+    return None, campos
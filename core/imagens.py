@@ -0,0 +1,424 @@
+# core/imagens.py
+"""
+Pipeline de imagens.
+
+O arquivo original enviado é mantido como está e, depois que a transação
+confirma, as versões reduzidas (renditions) são geradas em segundo plano num
+pool de processos. Cada rendition existe em WebP e em JPEG e fica em
+MEDIA_ROOT/renditions/<tamanho>/<caminho do original>.<formato>
+(ex: renditions/thumb/fotos_itens/a.jpg.webp).
+
+No mesmo passo é calculada a prévia (placeholder) de cada imagem: um WebP
+minúsculo em data URI mais a largura e a altura do original, guardados no
+campo JSON `placeholders` do registro, por nome de campo. Os templates a
+colocam como fundo do <img> com loading="lazy", então a página já abre com
+o layout final e as fotos só são baixadas ao entrar na tela.
+
+As funções executadas no pool só recebem caminhos de arquivo e usam apenas
+o Pillow, para poderem rodar em outro processo sem depender do Django.
+"""
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo (largura, altura) de cada rendition
+RENDITIONS = {
+    'thumb': (320, 320),
+    'medium': (800, 800),
+    'large': (1600, 1600),
+}
+FORMATOS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+QUALIDADE = {'webp': 80, 'jpeg': 82}
+PASTA_RENDITIONS = 'renditions'
+# Cache das miniaturas geradas sob demanda (o limpar_midia_orfa remove as de originais que mudaram ou sumiram)
+PASTA_MINIATURAS = '.miniaturas'
+# Lado maior da prévia embutida no HTML (em pixels)
+TAMANHO_PLACEHOLDER = 16
+# Orientações EXIF que giram a imagem em 90 graus
+ORIENTACOES_GIRADAS = (5, 6, 7, 8)
+
+# Campos de imagem atendidos pelo pipeline: (modelo, [campos])
+CAMPOS_IMAGEM = [
+    ('ItemEstoque', ['foto_principal']),
+    ('ImagemItemEstoque', ['imagem']),
+    ('Recebimento', ['foto_documento', 'foto_embalagem']),
+    ('ProdutoFabricado', ['foto_principal']),
+    ('ImagemProdutoFabricado', ['imagem']),
+    ('ImagemExpedicao', ['imagem']),
+    ('GastoViagem', ['imagem']),
+    ('GastoCaixaInterno', ['imagem']),
+]
+
+
+def caminho_rendition(nome, tamanho, formato='webp'):
+    """Caminho relativo (ao MEDIA_ROOT) da rendition de um arquivo."""
+    return f"{PASTA_RENDITIONS}/{tamanho}/{nome}.{FORMATOS[formato][1]}"
+
+
+def abrir_imagem(origem, tamanho_max):
+    """
+    Abre uma imagem pronta para ser reduzida a no máximo tamanho_max
+    (largura, altura): JPEGs são decodificados já em escala reduzida
+    (draft), a orientação EXIF é aplicada e o modo vira RGB com fundo branco.
+    """
+    from PIL import Image, ImageOps
+
+    img = Image.open(origem)
+    if img.format == 'JPEG':
+        img.draft('RGB', tamanho_max)
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        fundo = Image.new('RGB', img.size, (255, 255, 255))
+        fundo.paste(img, mask=img.split()[-1])
+        img = fundo
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def _salvar_atomico(img, destino, formato):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = f"{destino}.tmp{os.getpid()}"
+    img.save(temporario, format=FORMATOS[formato][0], quality=QUALIDADE[formato], optimize=True)
+    os.replace(temporario, destino)
+
+
+def gerar_renditions(caminho_original, media_root, nome):
+    """
+    Gera todas as renditions de um arquivo. Roda no pool de processos.
+
+    Args:
+        caminho_original: Caminho absoluto do arquivo original
+        media_root: MEDIA_ROOT, onde as renditions serão gravadas
+        nome: Nome do arquivo relativo ao MEDIA_ROOT (ex: fotos_itens/a.jpg)
+
+    Returns:
+        list: Caminhos relativos das renditions geradas
+    """
+    maior = max(RENDITIONS.values())
+    img = abrir_imagem(caminho_original, maior)
+    geradas = []
+    # Do maior para o menor: cada tamanho é reduzido a partir do anterior
+    for tamanho, dimensoes in sorted(RENDITIONS.items(), key=lambda par: -par[1][0]):
+        img.thumbnail(dimensoes)
+        for formato in FORMATOS:
+            relativo = caminho_rendition(nome, tamanho, formato)
+            _salvar_atomico(img, os.path.join(media_root, relativo), formato)
+            geradas.append(relativo)
+    return geradas
+
+
+def gerar_placeholder(caminho_original):
+    """
+    Calcula a prévia de uma imagem. Roda no pool de processos.
+
+    Returns:
+        dict: lqip (data URI de um WebP com até TAMANHO_PLACEHOLDER pixels de
+            lado), largura e altura do original já com a orientação EXIF
+    """
+    from PIL import Image
+
+    with Image.open(caminho_original) as original:
+        largura, altura = original.size
+        if original.getexif().get(0x0112) in ORIENTACOES_GIRADAS:
+            largura, altura = altura, largura
+
+    img = abrir_imagem(caminho_original, (TAMANHO_PLACEHOLDER, TAMANHO_PLACEHOLDER))
+    img.thumbnail((TAMANHO_PLACEHOLDER, TAMANHO_PLACEHOLDER))
+    saida = io.BytesIO()
+    img.save(saida, format='WEBP', quality=40)
+    return {
+        'lqip': 'data:image/webp;base64,' + base64.b64encode(saida.getvalue()).decode('ascii'),
+        'largura': largura,
+        'altura': altura,
+    }
+
+
+def processar_imagem(caminho_original, media_root, nome, renditions=True):
+    """
+    Tarefa do pool para uma imagem nova: renditions (opcional, quando ainda
+    não existem) e prévia.
+
+    Returns:
+        dict: renditions (caminhos gerados) e placeholder
+    """
+    geradas = gerar_renditions(caminho_original, media_root, nome) if renditions else []
+    return {'renditions': geradas, 'placeholder': gerar_placeholder(caminho_original)}
+
+
+def hash_conteudo(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+
+def comprimir_arquivo(caminho, hash_registrado=None, max_dimensoes=(1920, 1080), qualidade=85, dry_run=False):
+    """
+    Recomprime um original em JPEG. Roda no pool de processos.
+
+    O arquivo é ignorado quando o hash do conteúdo é igual a hash_registrado
+    (já foi processado antes) e mantido quando a versão comprimida não fica
+    menor. Fora do dry-run, JPEGs são substituídos no mesmo caminho e outros
+    formatos ganham um arquivo .jpg ao lado (o original fica para o chamador
+    remover depois de atualizar o banco).
+
+    Returns:
+        dict: status ('ignorado', 'mantido' ou 'comprimido'), tamanho_antes,
+            tamanho_depois, hash (do conteúdo final) e destino (caminho final)
+    """
+    with open(caminho, 'rb') as f:
+        dados = f.read()
+    hash_atual = hash_conteudo(dados)
+    resultado = {
+        'status': 'ignorado', 'tamanho_antes': len(dados), 'tamanho_depois': len(dados),
+        'hash': hash_atual, 'destino': caminho,
+    }
+    if hash_atual == hash_registrado:
+        return resultado
+
+    img = abrir_imagem(io.BytesIO(dados), max_dimensoes)
+    img.thumbnail(max_dimensoes)
+    saida = io.BytesIO()
+    img.save(saida, format='JPEG', quality=qualidade, optimize=True)
+    comprimido = saida.getvalue()
+
+    if len(comprimido) >= len(dados):
+        resultado['status'] = 'mantido'
+        return resultado
+
+    resultado.update(status='comprimido', tamanho_depois=len(comprimido))
+    if dry_run:
+        return resultado
+
+    base, extensao = os.path.splitext(caminho)
+    destino = caminho
+    if extensao.lower() not in ('.jpg', '.jpeg'):
+        destino = f"{base}.jpg"
+        sufixo = 1
+        while os.path.exists(destino):
+            destino = f"{base}_{sufixo}.jpg"
+            sufixo += 1
+    temporario = f"{destino}.tmp{os.getpid()}"
+    with open(temporario, 'wb') as f:
+        f.write(comprimido)
+    os.replace(temporario, destino)
+    resultado.update(hash=hash_conteudo(comprimido), destino=destino)
+    return resultado
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_decodificacoes = None
+
+
+def _limite_decodificacoes():
+    """Semáforo de IMAGENS_DECODIFICACOES_SIMULTANEAS, criado no primeiro uso (não nos processos do pool)."""
+    global _decodificacoes
+    with _executor_lock:
+        if _decodificacoes is None:
+            _decodificacoes = threading.BoundedSemaphore(max(1, settings.IMAGENS_DECODIFICACOES_SIMULTANEAS))
+        return _decodificacoes
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            processos = getattr(settings, 'IMAGENS_PROCESSOS', None) or max(1, (os.cpu_count() or 2) // 2)
+            _executor = ProcessPoolExecutor(max_workers=processos)
+        return _executor
+
+
+def _registrar_falha(futuro, nome):
+    erro = futuro.exception()
+    if erro:
+        logger.warning("Falha ao gerar renditions de %s: %s", nome, erro)
+    return erro
+
+
+def salvar_placeholder(modelo, pk, campo, nome, placeholder):
+    """
+    Grava a prévia de um campo no registro, se ele ainda aponta para o mesmo
+    arquivo. Só a chave do campo é alterada; as dos outros campos ficam.
+    """
+    with transaction.atomic():
+        atual = (
+            modelo._default_manager.select_for_update()
+            .filter(pk=pk, **{campo: nome})
+            .values_list('placeholders', flat=True)
+            .first()
+        )
+        if atual is None:
+            return False
+        placeholders = dict(atual or {})
+        placeholders[campo] = dict(placeholder, nome=nome)
+        modelo._default_manager.filter(pk=pk).update(placeholders=placeholders)
+    return True
+
+
+def _concluir_processamento(futuro, modelo, pk, campo, nome):
+    if _registrar_falha(futuro, nome):
+        return
+    # Roda na thread do executor, que tem a própria conexão com o banco
+    close_old_connections()
+    try:
+        salvar_placeholder(modelo, pk, campo, nome, futuro.result()['placeholder'])
+    except Exception as e:
+        logger.warning("Falha ao salvar a prévia de %s: %s", nome, e)
+    finally:
+        close_old_connections()
+
+
+def renditions_existem(nome):
+    return os.path.exists(os.path.join(settings.MEDIA_ROOT, caminho_rendition(nome, 'thumb')))
+
+
+def placeholder_atual(field_file):
+    """Prévia guardada para o arquivo atual do campo, ou None (ausente ou de um arquivo anterior)."""
+    if not field_file or not field_file.name:
+        return None
+    placeholders = getattr(field_file.instance, 'placeholders', None) or {}
+    placeholder = placeholders.get(field_file.field.name)
+    if not placeholder or placeholder.get('nome') != field_file.name:
+        return None
+    return placeholder
+
+
+def agendar_renditions(field_file):
+    """
+    Coloca a geração das renditions e da prévia de um arquivo na fila do
+    pool, depois que a transação atual confirmar. Arquivos que já têm as
+    duas coisas são ignorados.
+    """
+    if not field_file or not field_file.name:
+        return
+    nome = field_file.name
+    try:
+        caminho = field_file.path
+    except NotImplementedError:
+        # Storage sem caminho local: não há como processar em outro processo
+        return
+    faltam_renditions = not renditions_existem(nome)
+    instance = field_file.instance
+    falta_placeholder = hasattr(instance, 'placeholders') and placeholder_atual(field_file) is None
+    if not faltam_renditions and not falta_placeholder:
+        return
+    modelo, pk, campo = type(instance), instance.pk, field_file.field.name
+
+    def enviar():
+        futuro = _get_executor().submit(
+            processar_imagem, caminho, str(settings.MEDIA_ROOT), nome, faltam_renditions,
+        )
+        futuro.add_done_callback(lambda f: _concluir_processamento(f, modelo, pk, campo, nome))
+
+    transaction.on_commit(enviar)
+
+
+def pastas_com_miniatura():
+    """
+    Pastas (upload_to) dos campos de CAMPOS_IMAGEM, as únicas atendidas pelo
+    endpoint de miniaturas. Imagens de campos protegidos (midia_protegida)
+    nunca ganham uma cópia reduzida sem a conferência de acesso.
+    """
+    from django.apps import apps
+
+    return tuple(
+        apps.get_model('core', nome_modelo)._meta.get_field(campo).upload_to
+        for nome_modelo, campos in CAMPOS_IMAGEM
+        for campo in campos
+    )
+
+
+def chave_miniatura(nome, tamanho, formato):
+    """
+    Chave (e ETag) da miniatura de um arquivo. Inclui o tamanho e a data de
+    modificação do original, então trocar o arquivo gera outra chave e a
+    miniatura antiga nunca é servida no lugar da nova.
+    """
+    info = os.stat(os.path.join(settings.MEDIA_ROOT, nome))
+    return _chave(nome, info, tamanho, formato)
+
+
+def _chave(nome, info, tamanho, formato):
+    base = f"{nome}:{info.st_mtime_ns}:{info.st_size}:{tamanho}:{formato}"
+    return hashlib.sha1(base.encode()).hexdigest()
+
+
+def chaves_miniatura(nome):
+    """
+    Chaves de todas as miniaturas (tamanhos e formatos) que o arquivo atual
+    pode ter, com um único stat.
+
+    Raises:
+        FileNotFoundError: se o original não existir
+    """
+    info = os.stat(os.path.join(settings.MEDIA_ROOT, nome))
+    return {_chave(nome, info, tamanho, formato) for tamanho in RENDITIONS for formato in FORMATOS}
+
+
+def caminho_miniatura(chave, formato):
+    """Caminho relativo (ao MEDIA_ROOT) no cache, dividido em dois níveis de pastas."""
+    return f"{PASTA_MINIATURAS}/{chave[:2]}/{chave[2:4]}/{chave}.{FORMATOS[formato][1]}"
+
+
+def obter_miniatura(nome, tamanho, formato):
+    """
+    Retorna (caminho relativo, chave) da miniatura, gerando-a uma única vez.
+    Se a rendition pré-gerada existir ela é usada diretamente.
+
+    Raises:
+        FileNotFoundError: se o original não existir
+    """
+    chave = chave_miniatura(nome, tamanho, formato)
+    rendition = caminho_rendition(nome, tamanho, formato)
+    if os.path.exists(os.path.join(settings.MEDIA_ROOT, rendition)):
+        return rendition, chave
+
+    relativo = caminho_miniatura(chave, formato)
+    destino = os.path.join(settings.MEDIA_ROOT, relativo)
+    if not os.path.exists(destino):
+        # Gerada na própria requisição: poucas decodificações por vez em cada worker
+        with _limite_decodificacoes():
+            if not os.path.exists(destino):
+                img = abrir_imagem(os.path.join(settings.MEDIA_ROOT, nome), RENDITIONS[tamanho])
+                img.thumbnail(RENDITIONS[tamanho])
+                _salvar_atomico(img, destino, formato)
+    return relativo, chave
+
+
+def url_miniatura(field_file, tamanho='thumb', formato='webp'):
+    """URL do endpoint de miniaturas, com a chave na query para invalidar o cache do navegador."""
+    from django.urls import reverse
+
+    if not field_file or not field_file.name:
+        return ''
+    try:
+        chave = chave_miniatura(field_file.name, tamanho, formato)
+    except OSError:
+        return field_file.url
+    return f"{reverse('miniatura', args=[tamanho, formato, field_file.name])}?v={chave[:12]}"
+
+
+def url_rendition(field_file, tamanho='thumb', formato='webp'):
+    """
+    URL da rendition se ela já foi gerada; caso contrário, a URL do original
+    (a rendition pode ainda estar na fila).
+    """
+    if not field_file or not field_file.name:
+        return ''
+    relativo = caminho_rendition(field_file.name, tamanho, formato)
+    if os.path.exists(os.path.join(settings.MEDIA_ROOT, relativo)):
+        return field_file.storage.url(relativo)
+    return field_file.url
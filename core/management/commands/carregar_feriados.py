@@ -0,0 +1,101 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.calendario import limpar_cache_feriados
+from core.models import Feriado
+from core.ponto import recalcular_periodos_abertos
+
+FERIADOS_FIXOS = [
+    (1, 1, 'Confraternização Universal'),
+    (4, 21, 'Tiradentes'),
+    (5, 1, 'Dia do Trabalho'),
+    (9, 7, 'Independência do Brasil'),
+    (10, 12, 'Nossa Senhora Aparecida'),
+    (11, 2, 'Finados'),
+    (11, 15, 'Proclamação da República'),
+    (11, 20, 'Dia Nacional de Zumbi e da Consciência Negra'),
+    (12, 25, 'Natal'),
+]
+
+
+def domingo_de_pascoa(ano):
+    """Data da Páscoa no calendário gregoriano (algoritmo de Meeus/Jones/Butcher)."""
+    a = ano % 19
+    b, c = divmod(ano, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return date(ano, mes, dia + 1)
+
+
+def feriados_nacionais(ano, facultativos=False):
+    """[(data, nome, tipo)] dos feriados nacionais do ano."""
+    pascoa = domingo_de_pascoa(ano)
+    feriados = [(date(ano, mes, dia), nome, 'nacional') for mes, dia, nome in FERIADOS_FIXOS]
+    feriados.append((pascoa - timedelta(days=2), 'Sexta-feira Santa', 'nacional'))
+    if facultativos:
+        feriados += [
+            (pascoa - timedelta(days=48), 'Carnaval (segunda-feira)', 'empresa'),
+            (pascoa - timedelta(days=47), 'Carnaval (terça-feira)', 'empresa'),
+            (pascoa + timedelta(days=60), 'Corpus Christi', 'empresa'),
+        ]
+    return sorted(feriados)
+
+
+class Command(BaseCommand):
+    help = 'Cadastra os feriados nacionais (fixos e móveis) dos anos informados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'anos',
+            nargs='*',
+            type=int,
+            help='Anos a cadastrar (padrão: ano atual e o seguinte)',
+        )
+        parser.add_argument(
+            '--facultativos',
+            action='store_true',
+            help='Inclui Carnaval e Corpus Christi como feriados da empresa',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas lista os feriados que seriam cadastrados',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 MODO DRY-RUN - Nenhuma alteração será salva\n'))
+
+        ano_atual = timezone.localdate().year
+        anos = options['anos'] or [ano_atual, ano_atual + 1]
+
+        existentes = set(
+            Feriado.objects.filter(data__year__in=anos).values_list('data', 'nome')
+        )
+        novos = []
+        for ano in anos:
+            self.stdout.write(f'📅 {ano}')
+            for data, nome, tipo in feriados_nacionais(ano, options['facultativos']):
+                if (data, nome) in existentes:
+                    continue
+                novos.append(Feriado(data=data, nome=nome, tipo=tipo))
+                self.stdout.write(f'  ➕ {data:%d/%m/%Y} - {nome}')
+
+        if novos and not dry_run:
+            # bulk_create não dispara os sinais: cache e períodos abertos são tratados uma vez só
+            Feriado.objects.bulk_create(novos)
+            limpar_cache_feriados()
+            recalculados = recalcular_periodos_abertos()
+            self.stdout.write(f'🔄 {recalculados} período(s) aberto(s) recalculado(s)')
+
+        rotulo = 'a cadastrar' if dry_run else 'cadastrado(s)'
+        self.stdout.write(self.style.SUCCESS(f'\n✅ {len(novos)} feriado(s) {rotulo}.'))
@@ -1,165 +1,193 @@
-from django.core.management.base import BaseCommand
-from core.models import (
-    ItemEstoque, Recebimento, ProdutoFabricado,
-    ImagemItemEstoque, ImagemProdutoFabricado, ImagemExpedicao
-)
-from core.utils import compress_image
-from django.core.files.base import ContentFile
+import json
 import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.imagens import CAMPOS_IMAGEM, comprimir_arquivo
+
+ICONES = {
+    'ItemEstoque': '📦',
+    'Recebimento': '📋',
+    'ProdutoFabricado': '🏭',
+    'ImagemExpedicao': '🚚',
+    'GastoViagem': '✈️ ',
+    'GastoCaixaInterno': '💵',
+}
+ARQUIVO_ESTADO = '.compress_existing_images.json'
+SALVAR_ESTADO_A_CADA = 50
 
 
 class Command(BaseCommand):
-    help = 'Comprime todas as imagens existentes no banco de dados'
+    help = 'Comprime todas as imagens existentes no banco de dados (em paralelo, retomável)'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--dry-run',
             action='store_true',
-            help='Simula a compressão sem salvar',
+            help='Simula a compressão sem salvar (os tamanhos são calculados de verdade, em memória)',
+        )
+        parser.add_argument(
+            '--processos',
+            type=int,
+            default=os.cpu_count() or 2,
+            help='Número de processos de compressão (padrão: número de CPUs)',
+        )
+        parser.add_argument(
+            '--estado',
+            default=None,
+            help=f'Arquivo de progresso (padrão: MEDIA_ROOT/{ARQUIVO_ESTADO})',
+        )
+        parser.add_argument(
+            '--reiniciar',
+            action='store_true',
+            help='Ignora o progresso salvo e processa tudo novamente',
         )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
+        self.caminho_estado = options['estado'] or os.path.join(settings.MEDIA_ROOT, ARQUIVO_ESTADO)
 
         if dry_run:
             self.stdout.write(self.style.WARNING('🔍 MODO DRY-RUN - Nenhuma alteração será salva\n'))
         else:
             self.stdout.write(self.style.WARNING('⚠️  ATENÇÃO: Isso irá comprimir TODAS as imagens existentes!\n'))
 
-        total_compressed = 0
-        total_size_before = 0
-        total_size_after = 0
-
-        # Comprimir ItemEstoque.foto_principal
-        self.stdout.write('\n📦 Comprimindo fotos de ItemEstoque...')
-        for item in ItemEstoque.objects.exclude(foto_principal=''):
-            if item.foto_principal:
-                try:
-                    size_before = item.foto_principal.size
-                    if not dry_run:
-                        compressed = compress_image(item.foto_principal)
-                        item.foto_principal.save(compressed.name, compressed, save=True)
-                    size_after = item.foto_principal.size if not dry_run else size_before * 0.3  # Estimativa
-
-                    total_size_before += size_before
-                    total_size_after += size_after
-                    total_compressed += 1
-
-                    reduction = ((size_before - size_after) / size_before) * 100
-                    self.stdout.write(f'  ✓ {item.nome}: {size_before/1024:.1f}KB → {size_after/1024:.1f}KB ({reduction:.1f}% redução)')
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ✗ Erro ao comprimir {item.nome}: {e}'))
-
-        # Comprimir Recebimento.foto_documento e foto_embalagem
-        self.stdout.write('\n📋 Comprimindo fotos de Recebimento...')
-        for receb in Recebimento.objects.all():
-            if receb.foto_documento:
-                try:
-                    size_before = receb.foto_documento.size
-                    if not dry_run:
-                        compressed = compress_image(receb.foto_documento)
-                        receb.foto_documento.save(compressed.name, compressed, save=True)
-                    size_after = receb.foto_documento.size if not dry_run else size_before * 0.3
-
-                    total_size_before += size_before
-                    total_size_after += size_after
-                    total_compressed += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ✗ Erro: {e}'))
-
-            if receb.foto_embalagem:
-                try:
-                    size_before = receb.foto_embalagem.size
-                    if not dry_run:
-                        compressed = compress_image(receb.foto_embalagem)
-                        receb.foto_embalagem.save(compressed.name, compressed, save=True)
-                    size_after = receb.foto_embalagem.size if not dry_run else size_before * 0.3
-
-                    total_size_before += size_before
-                    total_size_after += size_after
-                    total_compressed += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ✗ Erro: {e}'))
-
-        # Comprimir ProdutoFabricado.foto_principal
-        self.stdout.write('\n🏭 Comprimindo fotos de ProdutoFabricado...')
-        for produto in ProdutoFabricado.objects.exclude(foto_principal=''):
-            if produto.foto_principal:
-                try:
-                    size_before = produto.foto_principal.size
-                    if not dry_run:
-                        compressed = compress_image(produto.foto_principal)
-                        produto.foto_principal.save(compressed.name, compressed, save=True)
-                    size_after = produto.foto_principal.size if not dry_run else size_before * 0.3
-
-                    total_size_before += size_before
-                    total_size_after += size_after
-                    total_compressed += 1
-
-                    reduction = ((size_before - size_after) / size_before) * 100
-                    self.stdout.write(f'  ✓ {produto.nome}: {size_before/1024:.1f}KB → {size_after/1024:.1f}KB ({reduction:.1f}% redução)')
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ✗ Erro ao comprimir {produto.nome}: {e}'))
-
-        # Comprimir ImagemItemEstoque
-        self.stdout.write('\n🖼️  Comprimindo ImagemItemEstoque...')
-        for img in ImagemItemEstoque.objects.all():
-            if img.imagem:
-                try:
-                    size_before = img.imagem.size
-                    if not dry_run:
-                        compressed = compress_image(img.imagem)
-                        img.imagem.save(compressed.name, compressed, save=True)
-                    size_after = img.imagem.size if not dry_run else size_before * 0.3
-
-                    total_size_before += size_before
-                    total_size_after += size_after
-                    total_compressed += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ✗ Erro: {e}'))
-
-        # Comprimir ImagemProdutoFabricado
-        self.stdout.write('\n🖼️  Comprimindo ImagemProdutoFabricado...')
-        for img in ImagemProdutoFabricado.objects.all():
-            if img.imagem:
-                try:
-                    size_before = img.imagem.size
-                    if not dry_run:
-                        compressed = compress_image(img.imagem)
-                        img.imagem.save(compressed.name, compressed, save=True)
-                    size_after = img.imagem.size if not dry_run else size_before * 0.3
-
-                    total_size_before += size_before
-                    total_size_after += size_after
-                    total_compressed += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ✗ Erro: {e}'))
-
-        # Comprimir ImagemExpedicao
-        self.stdout.write('\n🚚 Comprimindo ImagemExpedicao...')
-        for img in ImagemExpedicao.objects.all():
-            if img.imagem:
-                try:
-                    size_before = img.imagem.size
-                    if not dry_run:
-                        compressed = compress_image(img.imagem)
-                        img.imagem.save(compressed.name, compressed, save=True)
-                    size_after = img.imagem.size if not dry_run else size_before * 0.3
-
-                    total_size_before += size_before
-                    total_size_after += size_after
-                    total_compressed += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ✗ Erro: {e}'))
-
-        # Resumo final
-        total_reduction = ((total_size_before - total_size_after) / total_size_before * 100) if total_size_before > 0 else 0
-
-        self.stdout.write(self.style.SUCCESS(f'\n\n✅ Compressão concluída!'))
-        self.stdout.write(f'📊 Total de imagens: {total_compressed}')
-        self.stdout.write(f'📉 Tamanho antes: {total_size_before/1024/1024:.2f} MB')
-        self.stdout.write(f'📈 Tamanho depois: {total_size_after/1024/1024:.2f} MB')
-        self.stdout.write(self.style.SUCCESS(f'💾 Redução total: {total_reduction:.1f}% ({(total_size_before - total_size_after)/1024/1024:.2f} MB economizados)'))
-
-        if dry_run:
+        # Progresso: nome do arquivo -> hash do conteúdo já processado
+        self.processados = {} if options['reiniciar'] else self._carregar_estado()
+        if self.processados:
+            self.stdout.write(f'↩️  Retomando: {len(self.processados)} arquivo(s) já processado(s) serão ignorados se não mudaram')
+
+        self.totais = {'comprimidas': 0, 'mantidas': 0, 'ignoradas': 0, 'erros': 0, 'antes': 0, 'depois': 0}
+        self.pendentes_estado = 0
+        self.dry_run = dry_run
+
+        processos = max(1, options['processos'])
+        try:
+            with ProcessPoolExecutor(max_workers=processos) as executor:
+                for nome_modelo, campos in CAMPOS_IMAGEM:
+                    modelo = apps.get_model('core', nome_modelo)
+                    for campo in campos:
+                        icone = ICONES.get(nome_modelo, '🖼️ ')
+                        self.stdout.write(f'\n{icone} Comprimindo {nome_modelo}.{campo}...')
+                        self._processar_campo(executor, processos, modelo, campo)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\n⏸️  Interrompido. Execute novamente para continuar de onde parou.'))
+        finally:
+            if not dry_run:
+                self._salvar_estado()
+
+        self._resumo()
+
+    def _processar_campo(self, executor, processos, modelo, campo):
+        """
+        Percorre os ids em streaming e mantém no máximo algumas tarefas por
+        processo em andamento, para a memória não crescer com o tamanho da tabela.
+        """
+        limite = processos * 4
+        em_andamento = {}
+        registros = (
+            modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            .order_by('pk').values_list('pk', campo).iterator(chunk_size=500)
+        )
+        for pk, nome in registros:
+            caminho = os.path.join(settings.MEDIA_ROOT, nome)
+            if not os.path.exists(caminho):
+                self.totais['erros'] += 1
+                self.stdout.write(self.style.ERROR(f'  ✗ {nome}: arquivo não encontrado'))
+                continue
+            futuro = executor.submit(
+                comprimir_arquivo, caminho, self.processados.get(nome), dry_run=self.dry_run,
+            )
+            em_andamento[futuro] = (pk, nome)
+            if len(em_andamento) >= limite:
+                prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    self._registrar(modelo, campo, *em_andamento.pop(futuro), futuro)
+
+        prontos, _ = wait(em_andamento)
+        for futuro in prontos:
+            self._registrar(modelo, campo, *em_andamento.pop(futuro), futuro)
+
+    def _registrar(self, modelo, campo, pk, nome, futuro):
+        try:
+            resultado = futuro.result()
+        except Exception as e:
+            self.totais['erros'] += 1
+            self.stdout.write(self.style.ERROR(f'  ✗ Erro ao comprimir {nome}: {e}'))
+            return
+
+        status = resultado['status']
+        if status == 'ignorado':
+            self.totais['ignoradas'] += 1
+            return
+
+        antes, depois = resultado['tamanho_antes'], resultado['tamanho_depois']
+        self.totais['antes'] += antes
+        self.totais['depois'] += depois
+
+        if status == 'mantido':
+            self.totais['mantidas'] += 1
+            self._marcar(nome, resultado['hash'])
+            return
+
+        self.totais['comprimidas'] += 1
+        reducao = (antes - depois) / antes * 100
+        self.stdout.write(f'  ✓ {nome}: {antes/1024:.1f}KB → {depois/1024:.1f}KB ({reducao:.1f}% redução)')
+        if self.dry_run:
+            return
+
+        novo_nome = os.path.relpath(resultado['destino'], settings.MEDIA_ROOT).replace(os.sep, '/')
+        if novo_nome != nome:
+            # Outro formato virou .jpg: aponta o registro para o novo arquivo e remove o antigo
+            # pelo storage, que baixa a contagem de referências do blob deduplicado
+            modelo.objects.filter(pk=pk).update(**{campo: novo_nome})
+            try:
+                modelo._meta.get_field(campo).storage.delete(nome)
+            except OSError:
+                pass
+            self.processados.pop(nome, None)
+        self._marcar(novo_nome, resultado['hash'])
+
+    def _marcar(self, nome, hash_conteudo):
+        if self.dry_run:
+            return
+        self.processados[nome] = hash_conteudo
+        self.pendentes_estado += 1
+        if self.pendentes_estado >= SALVAR_ESTADO_A_CADA:
+            self._salvar_estado()
+
+    def _carregar_estado(self):
+        try:
+            with open(self.caminho_estado, encoding='utf-8') as f:
+                return json.load(f).get('arquivos', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _salvar_estado(self):
+        os.makedirs(os.path.dirname(self.caminho_estado) or '.', exist_ok=True)
+        temporario = f'{self.caminho_estado}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({'arquivos': self.processados}, f)
+        os.replace(temporario, self.caminho_estado)
+        self.pendentes_estado = 0
+
+    def _resumo(self):
+        totais = self.totais
+        antes, depois = totais['antes'], totais['depois']
+        reducao_total = ((antes - depois) / antes * 100) if antes > 0 else 0
+
+        self.stdout.write(self.style.SUCCESS('\n\n✅ Compressão concluída!'))
+        self.stdout.write(f'📊 Imagens comprimidas: {totais["comprimidas"]}')
+        self.stdout.write(f'⏭️  Já processadas (ignoradas): {totais["ignoradas"]}')
+        self.stdout.write(f'➖ Sem ganho (mantidas): {totais["mantidas"]}')
+        if totais['erros']:
+            self.stdout.write(self.style.ERROR(f'✗ Erros: {totais["erros"]}'))
+        self.stdout.write(f'📉 Tamanho antes: {antes/1024/1024:.2f} MB')
+        self.stdout.write(f'📈 Tamanho depois: {depois/1024/1024:.2f} MB')
+        self.stdout.write(self.style.SUCCESS(f'💾 Redução total: {reducao_total:.1f}% ({(antes - depois)/1024/1024:.2f} MB economizados)'))
+
+        if self.dry_run:
             self.stdout.write(self.style.WARNING('\n⚠️  DRY-RUN: Nenhuma alteração foi salva. Execute sem --dry-run para comprimir de verdade.'))
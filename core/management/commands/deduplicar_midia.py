@@ -0,0 +1,83 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.imagens import PASTA_RENDITIONS
+from core.storage import ArmazenamentoDeduplicado, hash_arquivo
+
+
+class Command(BaseCommand):
+    help = 'Converte os arquivos de mídia já existentes para o armazenamento deduplicado (hardlinks por SHA-256)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostra quanto espaço seria liberado sem alterar nada',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = default_storage
+        if not isinstance(storage, ArmazenamentoDeduplicado):
+            self.stdout.write(self.style.ERROR('✗ O storage padrão não é o ArmazenamentoDeduplicado (veja STORAGES no settings).'))
+            return
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 MODO DRY-RUN - Nenhuma alteração será salva\n'))
+
+        media_root = os.fspath(settings.MEDIA_ROOT)
+        # Pastas ocultas (.blobs, .miniaturas, .uploads de versões antigas) não são mídia dos modelos
+        ignorar = {os.path.abspath(storage.blobs_root), os.path.abspath(os.path.join(media_root, PASTA_RENDITIONS))}
+
+        arquivos = vinculados = 0
+        liberados = 0
+        vistos = set()  # hashes já presentes nesta simulação (dry-run)
+
+        pastas = [media_root]
+        while pastas:
+            pasta = pastas.pop()
+            with os.scandir(pasta) as entradas:
+                for entrada in entradas:
+                    if entrada.is_dir(follow_symlinks=False):
+                        if not entrada.name.startswith('.') and os.path.abspath(entrada.path) not in ignorar:
+                            pastas.append(entrada.path)
+                        continue
+                    if not entrada.is_file(follow_symlinks=False) or entrada.name.startswith('.'):
+                        continue
+                    info = entrada.stat()
+                    if info.st_nlink > 1:
+                        # Já está ligado a um blob
+                        continue
+
+                    arquivos += 1
+                    sha = hash_arquivo(entrada.path)
+                    blob = storage.caminho_blob(sha)
+                    existe = os.path.exists(blob) or sha in vistos
+
+                    if existe:
+                        vinculados += 1
+                        liberados += info.st_size
+                        self.stdout.write(f'  🔗 {os.path.relpath(entrada.path, media_root)} (duplicado, {info.st_size/1024:.1f}KB)')
+                    if dry_run:
+                        vistos.add(sha)
+                        continue
+
+                    if existe:
+                        # Troca o arquivo por um link para o blob já existente
+                        temporario = f'{entrada.path}.dedup'
+                        os.link(blob, temporario)
+                        os.replace(temporario, entrada.path)
+                    else:
+                        os.makedirs(os.path.dirname(blob), exist_ok=True)
+                        os.link(entrada.path, blob)
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Deduplicação concluída!'))
+        self.stdout.write(f'📊 Arquivos analisados: {arquivos}')
+        self.stdout.write(f'🔗 Duplicados: {vinculados}')
+        self.stdout.write(self.style.SUCCESS(f'💾 Espaço liberado: {liberados/1024/1024:.2f} MB'))
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('\n⚠️  DRY-RUN: Nenhuma alteração foi salva. Execute sem --dry-run para deduplicar de verdade.'))
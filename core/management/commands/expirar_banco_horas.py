@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.banco_horas import expirar_creditos
+from core.models import LancamentoBancoHoras
+
+
+class Command(BaseCommand):
+    help = 'Baixa do banco de horas os créditos vencidos que não foram compensados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas lista os créditos vencidos',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 MODO DRY-RUN - Nenhuma alteração será salva\n'))
+
+        hoje = timezone.localdate()
+        vencidos = (
+            LancamentoBancoHoras.objects.filter(horas_restantes__gt=0, vence_em__lte=hoje)
+            .values('usuario_id').annotate(horas=Sum('horas_restantes')).order_by('usuario_id')
+        )
+        usuarios = User.objects.in_bulk([v['usuario_id'] for v in vencidos])
+
+        total = 0
+        for vencido in vencidos:
+            usuario = usuarios[vencido['usuario_id']]
+            if not dry_run:
+                expirar_creditos(usuario, hoje)
+            total += 1
+            self.stdout.write(f'  ⌛ {usuario.username}: {vencido["horas"]}h vencidas')
+
+        rotulo = 'com créditos vencidos' if dry_run else 'atualizado(s)'
+        self.stdout.write(self.style.SUCCESS(f'\n✅ {total} funcionário(s) {rotulo}.'))
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.exportacao import gerar_csv, salvar_xlsx
+from core.models import ResumoMensal
+from core.ponto import COLUNAS_FOLHA, linhas_folha_pagamento
+
+
+class Command(BaseCommand):
+    help = 'Gera o arquivo da folha de pagamento com os períodos de ponto fechados de um mês'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mes',
+            type=int,
+            help='Mês em que os períodos terminam (1-12). Padrão: mês passado',
+        )
+        parser.add_argument(
+            '--ano',
+            type=int,
+            help='Ano em que os períodos terminam. Padrão: ano do mês passado',
+        )
+        parser.add_argument(
+            '--formato',
+            choices=['csv', 'xlsx'],
+            default='csv',
+            help='Formato do arquivo (padrão: csv)',
+        )
+        parser.add_argument(
+            '--saida',
+            help='Caminho do arquivo. Padrão: folha_AAAA-MM.<formato> na pasta atual',
+        )
+
+    def handle(self, *args, **options):
+        mes_passado = timezone.localdate().replace(day=1) - timedelta(days=1)
+        mes = options['mes'] or mes_passado.month
+        ano = options['ano'] or mes_passado.year
+        if not 1 <= mes <= 12:
+            raise CommandError('Mês inválido em --mes. Use 1 a 12.')
+        formato = options['formato']
+        saida = options['saida'] or f'folha_{ano}-{mes:02d}.{formato}'
+
+        self.stdout.write(f'📅 Folha de {mes:02d}/{ano}')
+        abertos = ResumoMensal.objects.filter(mes=mes, ano=ano, fechado=False).count()
+        if abertos:
+            self.stdout.write(self.style.WARNING(f'  ⚠️  {abertos} período(s) ainda aberto(s) ficam fora do arquivo'))
+
+        linhas = linhas_folha_pagamento(mes, ano)
+        if not linhas:
+            raise CommandError(f'Nenhum período fechado em {mes:02d}/{ano}. Rode o fechar_periodo antes.')
+
+        if formato == 'xlsx':
+            salvar_xlsx(saida, COLUNAS_FOLHA, linhas, titulo=f'Folha {mes:02d}-{ano}')
+        else:
+            with open(saida, 'w', encoding='utf-8', newline='') as arquivo:
+                arquivo.writelines(gerar_csv(COLUNAS_FOLHA, linhas))
+
+        self.stdout.write(self.style.SUCCESS(f'\n✅ {len(linhas)} funcionário(s) exportado(s) para {saida}'))
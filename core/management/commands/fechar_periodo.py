@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import JornadaTrabalho, ResumoMensal
+from core.ponto import fechar_periodo, periodo_da_data, resumo_do_periodo
+
+
+class Command(BaseCommand):
+    help = 'Fecha (congela) os períodos de ponto já encerrados, recalculando os totais a partir dos registros'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ate',
+            help='Fecha os períodos que terminam antes desta data (AAAA-MM-DD). Padrão: hoje',
+        )
+        parser.add_argument(
+            '--usuario',
+            help='Fecha apenas os períodos deste usuário (username)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas lista os períodos que seriam fechados',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['ate']:
+            try:
+                limite = datetime.strptime(options['ate'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Data inválida em --ate. Use AAAA-MM-DD.')
+        else:
+            limite = timezone.localdate()
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 MODO DRY-RUN - Nenhuma alteração será salva\n'))
+
+        # Só funcionários que controlam ponto; os demais não têm horas esperadas nem banco de horas
+        jornadas = JornadaTrabalho.objects.filter(controla_ponto=True, usuario__is_active=True).select_related('usuario')
+        if options['usuario']:
+            jornadas = jornadas.filter(usuario__username=options['usuario'])
+            if not jornadas.exists():
+                raise CommandError(f'Usuário "{options["usuario"]}" não encontrado ou não controla ponto.')
+
+        fechados = 0
+        for jornada in jornadas:
+            usuario = jornada.usuario
+
+            # Garante o resumo do último período encerrado, mesmo sem nenhum ponto nele,
+            # se o controle de ponto já tinha começado
+            inicio_atual, _ = periodo_da_data(jornada, limite)
+            fim_anterior = inicio_atual - timedelta(days=1)
+            if not dry_run and jornada.inicio_controle <= fim_anterior:
+                resumo_do_periodo(usuario, jornada, fim_anterior)
+
+            pendentes = ResumoMensal.objects.filter(
+                usuario=usuario, fechado=False, data_fim__lt=limite,
+            ).order_by('data_inicio')
+            for resumo in pendentes:
+                periodo = f'{resumo.data_inicio:%d/%m/%Y} a {resumo.data_fim:%d/%m/%Y}'
+                if dry_run:
+                    self.stdout.write(f'  🔒 {usuario.username}: {periodo}')
+                else:
+                    fechar_periodo(resumo, jornada)
+                    self.stdout.write(
+                        f'  🔒 {usuario.username}: {periodo} - saldo {resumo.saldo_horas:+.2f}h, '
+                        f'{resumo.dias_ausentes} falta(s)'
+                    )
+                fechados += 1
+
+        rotulo = 'a fechar' if dry_run else 'fechado(s)'
+        self.stdout.write(self.style.SUCCESS(f'\n✅ {fechados} período(s) {rotulo}.'))
@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.imagens import CAMPOS_IMAGEM, gerar_placeholder, salvar_placeholder
+
+
+class Command(BaseCommand):
+    help = 'Calcula as prévias (placeholder, largura e altura) das imagens que ainda não têm'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas conta as imagens sem prévia',
+        )
+        parser.add_argument(
+            '--processos',
+            type=int,
+            default=os.cpu_count() or 2,
+            help='Número de processos (padrão: número de CPUs)',
+        )
+        parser.add_argument(
+            '--todas',
+            action='store_true',
+            help='Recalcula também as prévias já existentes',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 MODO DRY-RUN - Nenhuma alteração será salva\n'))
+
+        totais = {'geradas': 0, 'erros': 0}
+        with ProcessPoolExecutor(max_workers=max(1, options['processos'])) as executor:
+            for nome_modelo, campos in CAMPOS_IMAGEM:
+                modelo = apps.get_model('core', nome_modelo)
+                for campo in campos:
+                    pendentes = self._pendentes(modelo, campo, options['todas'])
+                    self.stdout.write(f'🖼️  {nome_modelo}.{campo}: {len(pendentes)} imagem(ns) sem prévia')
+                    if dry_run:
+                        totais['geradas'] += len(pendentes)
+                        continue
+                    if not pendentes:
+                        continue
+
+                    caminhos = [os.path.join(settings.MEDIA_ROOT, nome) for _, nome in pendentes]
+                    resultados = executor.map(_placeholder_ou_erro, caminhos, chunksize=16)
+                    for (pk, nome), resultado in zip(pendentes, resultados):
+                        if isinstance(resultado, str):
+                            totais['erros'] += 1
+                            self.stdout.write(self.style.ERROR(f'  ✗ {nome}: {resultado}'))
+                            continue
+                        if salvar_placeholder(modelo, pk, campo, nome, resultado):
+                            totais['geradas'] += 1
+
+        rotulo = 'Sem prévia' if dry_run else 'Prévias geradas'
+        self.stdout.write(self.style.SUCCESS('\n✅ Concluído!'))
+        self.stdout.write(f'📊 {rotulo}: {totais["geradas"]}')
+        if totais['erros']:
+            self.stdout.write(self.style.WARNING(f'⚠️  Erros: {totais["erros"]}'))
+
+    def _pendentes(self, modelo, campo, todas):
+        """(pk, nome do arquivo) dos registros cuja prévia falta ou é de outro arquivo."""
+        registros = (
+            modelo._default_manager.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            .values_list('pk', campo, 'placeholders').iterator(chunk_size=2000)
+        )
+        return [
+            (pk, nome) for pk, nome, placeholders in registros
+            if todas or (placeholders or {}).get(campo, {}).get('nome') != nome
+        ]
+
+
+def _placeholder_ou_erro(caminho):
+    # Exceções viram texto para um arquivo ruim não interromper o map
+    try:
+        return gerar_placeholder(caminho)
+    except Exception as e:
+        return str(e) or e.__class__.__name__
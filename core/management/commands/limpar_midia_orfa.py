@@ -0,0 +1,187 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from core.imagens import PASTA_MINIATURAS, PASTA_RENDITIONS, chaves_miniatura, pastas_com_miniatura
+from core.storage import ArmazenamentoDeduplicado
+from core.uploads import limpar_uploads_expirados
+
+
+def campos_arquivo():
+    """Todos os FileField/ImageField concretos de todos os apps: (modelo, nome do campo)."""
+    for modelo in apps.get_models():
+        if modelo._meta.proxy or not modelo._meta.managed:
+            continue
+        for campo in modelo._meta.concrete_fields:
+            if isinstance(campo, models.FileField):
+                yield modelo, campo.attname
+
+
+def nome_original_da_rendition(relativo):
+    """
+    renditions/<tamanho>/<original>.<formato> -> <original>; None se o
+    caminho não for de uma rendition.
+    """
+    partes = relativo.split('/', 2)
+    if len(partes) < 3 or partes[0] != PASTA_RENDITIONS:
+        return None
+    return partes[2].rsplit('.', 1)[0]
+
+
+def eh_miniatura(relativo):
+    """.miniaturas/<xx>/<yy>/<chave>.<formato>: arquivo do cache de miniaturas."""
+    return relativo.startswith(f'{PASTA_MINIATURAS}/')
+
+
+def _percorrer(pasta, media_root):
+    """Lista (caminho relativo, mtime, tamanho) de todos os arquivos abaixo de pasta."""
+    arquivos = []
+    pendentes = [pasta]
+    while pendentes:
+        atual = pendentes.pop()
+        try:
+            entradas = os.scandir(atual)
+        except FileNotFoundError:
+            continue
+        with entradas:
+            for entrada in entradas:
+                if entrada.name.startswith('.'):
+                    # .blobs, .uploads, estado dos comandos e temporários
+                    continue
+                if entrada.is_dir(follow_symlinks=False):
+                    pendentes.append(entrada.path)
+                elif entrada.is_file(follow_symlinks=False):
+                    info = entrada.stat()
+                    relativo = os.path.relpath(entrada.path, media_root).replace(os.sep, '/')
+                    arquivos.append((relativo, info.st_mtime, info.st_size))
+    return arquivos
+
+
+class Command(BaseCommand):
+    help = 'Encontra (e opcionalmente apaga) arquivos de mídia que nenhum registro referencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apagar',
+            action='store_true',
+            help='Apaga os arquivos órfãos (sem esta opção, apenas lista)',
+        )
+        parser.add_argument(
+            '--carencia-horas',
+            type=int,
+            default=24,
+            help='Ignora arquivos modificados há menos de N horas (uploads em andamento). Padrão: 24',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Pastas percorridas em paralelo. Padrão: 8',
+        )
+
+    def handle(self, *args, **options):
+        apagar = options['apagar']
+        media_root = os.fspath(settings.MEDIA_ROOT)
+        limite = time.time() - options['carencia_horas'] * 3600
+
+        if not apagar:
+            self.stdout.write(self.style.WARNING('🔍 Apenas listando. Use --apagar para remover os órfãos.\n'))
+
+        # 1. Nomes referenciados pelo banco, em streaming
+        self.stdout.write('🗂️  Coletando arquivos referenciados...')
+        referenciados = set()
+        for modelo, campo in campos_arquivo():
+            nomes = (
+                modelo._default_manager.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .values_list(campo, flat=True).iterator(chunk_size=2000)
+            )
+            referenciados.update(nomes)
+        self.stdout.write(f'   {len(referenciados)} arquivo(s) referenciado(s)')
+
+        # 2. Arquivos em disco: cada subpasta do MEDIA_ROOT é percorrida numa thread
+        self.stdout.write('📂 Percorrendo MEDIA_ROOT...')
+        if not os.path.isdir(media_root):
+            self.stdout.write(self.style.ERROR(f'✗ MEDIA_ROOT não existe: {media_root}'))
+            return
+        raizes, soltos = [], []
+        with os.scandir(media_root) as entradas:
+            for entrada in entradas:
+                if entrada.name.startswith('.'):
+                    continue
+                if entrada.is_dir(follow_symlinks=False):
+                    raizes.append(entrada.path)
+                elif entrada.is_file(follow_symlinks=False):
+                    info = entrada.stat()
+                    soltos.append((entrada.name, info.st_mtime, info.st_size))
+
+        # O cache de miniaturas é a única pasta oculta percorrida
+        raizes.append(os.path.join(media_root, PASTA_MINIATURAS))
+
+        arquivos = soltos
+        with ThreadPoolExecutor(max_workers=max(1, options['threads'])) as executor:
+            for lista in executor.map(lambda pasta: _percorrer(pasta, media_root), raizes):
+                arquivos.extend(lista)
+
+        # Miniaturas válidas: as chaves dos originais referenciados como estão hoje em disco
+        miniaturas_validas = set()
+        pastas = pastas_com_miniatura()
+        for nome in referenciados:
+            if nome.startswith(pastas):
+                try:
+                    miniaturas_validas.update(chaves_miniatura(nome))
+                except OSError:
+                    continue
+
+        # 3. Órfãos: não referenciados, fora da carência; renditions seguem o original e
+        # miniaturas, a versão atual do original
+        orfaos = []
+        for relativo, mtime, tamanho in arquivos:
+            if mtime > limite:
+                continue
+            if eh_miniatura(relativo):
+                if relativo.rsplit('/', 1)[-1].split('.', 1)[0] in miniaturas_validas:
+                    continue
+            else:
+                original = nome_original_da_rendition(relativo)
+                if relativo in referenciados or (original is not None and original in referenciados):
+                    continue
+            orfaos.append((relativo, tamanho))
+
+        total_bytes = 0
+        for relativo, tamanho in sorted(orfaos):
+            total_bytes += tamanho
+            self.stdout.write(f'  🗑️  {relativo} ({tamanho/1024:.1f}KB)')
+            if apagar:
+                try:
+                    if eh_miniatura(relativo) or nome_original_da_rendition(relativo) is not None:
+                        os.remove(os.path.join(media_root, relativo))
+                    else:
+                        default_storage.delete(relativo)
+                except OSError as e:
+                    self.stdout.write(self.style.ERROR(f'  ✗ Erro ao apagar {relativo}: {e}'))
+
+        uploads, bytes_uploads = 0, 0
+        if apagar:
+            # Uploads retomáveis abandonados ou já usados (o arquivo montado vira blob)
+            uploads, bytes_uploads = limpar_uploads_expirados(options['carencia_horas'])
+
+        blobs, bytes_blobs = 0, 0
+        if apagar and isinstance(default_storage, ArmazenamentoDeduplicado):
+            blobs, bytes_blobs = default_storage.limpar_blobs_orfaos()
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Verificação concluída!'))
+        self.stdout.write(f'📊 Arquivos em disco: {len(arquivos)}')
+        self.stdout.write(f'🗑️  Órfãos: {len(orfaos)} ({total_bytes/1024/1024:.2f} MB)')
+        if apagar:
+            self.stdout.write(self.style.SUCCESS(
+                f'💾 Apagados: {len(orfaos)} arquivo(s), {blobs} blob(s) sem referência e {uploads} upload(s) expirado(s) '
+                f'({(total_bytes + bytes_blobs + bytes_uploads)/1024/1024:.2f} MB)'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING('\n⚠️  Nada foi apagado. Execute com --apagar para remover os órfãos.'))
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.calendario import eh_dia_util
+from core.models import AbonoDia, JornadaTrabalho, Notificacao
+from core.ponto import inconsistencias, pontos_do_dia
+
+
+class Command(BaseCommand):
+    help = 'Verifica os pontos do dia anterior e notifica funcionários e supervisores sobre inconsistências e dias sem registro'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data',
+            help='Dia a verificar (AAAA-MM-DD). Padrão: ontem',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas lista as ocorrências, sem criar notificações',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['data']:
+            try:
+                dia = datetime.strptime(options['data'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Data inválida em --data. Use AAAA-MM-DD.')
+        else:
+            dia = timezone.localdate() - timedelta(days=1)
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 MODO DRY-RUN - Nenhuma alteração será salva\n'))
+        self.stdout.write(f'📅 Verificando o ponto de {dia:%d/%m/%Y}')
+
+        # Funcionários que controlam ponto (ter uma JornadaTrabalho não basta: ela é criada ao abrir a tela)
+        jornadas = {
+            j.usuario_id: j
+            for j in JornadaTrabalho.objects.filter(
+                controla_ponto=True, usuario__is_active=True,
+            ).select_related('usuario')
+        }
+
+        # Uma consulta em ordem de usuário e horário; a máquina de estados roda por usuário
+        registros = (
+            pontos_do_dia(dia, usuario_id__in=list(jornadas))
+            .order_by('usuario_id', 'data_hora')
+            .values_list('usuario_id', 'tipo', 'data_hora')
+        )
+        ocorrencias = {}
+        com_ponto = set()
+        for usuario_id, pontos in groupby(registros.iterator(), key=itemgetter(0)):
+            com_ponto.add(usuario_id)
+            problemas = inconsistencias((tipo, data_hora) for _, tipo, data_hora in pontos)
+            if problemas:
+                ocorrencias[usuario_id] = ('ponto_inconsistente', problemas)
+
+        abonados = set(
+            AbonoDia.objects.filter(usuario_id__in=list(jornadas), data=dia).values_list('usuario_id', flat=True)
+        )
+        for usuario_id, jornada in jornadas.items():
+            if usuario_id not in com_ponto and usuario_id not in abonados and eh_dia_util(jornada, dia):
+                ocorrencias[usuario_id] = ('ponto_ausente', ['nenhum ponto registrado'])
+
+        for usuario_id, (tipo, problemas) in ocorrencias.items():
+            usuario = jornadas[usuario_id].usuario
+            self.stdout.write(f'  ⚠️  {usuario.username}: {"; ".join(problemas)}')
+
+        if not ocorrencias:
+            self.stdout.write(self.style.SUCCESS('\n✅ Nenhuma ocorrência.'))
+            return
+
+        notificacoes = self.montar_notificacoes(dia, ocorrencias, jornadas)
+        # Não repete as notificações se o comando rodar de novo para o mesmo dia
+        ja_enviadas = set(
+            Notificacao.objects.filter(
+                tipo__in=['ponto_inconsistente', 'ponto_ausente'],
+                titulo__in={n.titulo for n in notificacoes},
+            ).values_list('usuario_id', 'titulo')
+        )
+        notificacoes = [n for n in notificacoes if (n.usuario_id, n.titulo) not in ja_enviadas]
+        if not dry_run:
+            Notificacao.objects.bulk_create(notificacoes)
+
+        rotulo = 'a criar' if dry_run else 'criada(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ {len(ocorrencias)} ocorrência(s); {len(notificacoes)} notificação(ões) {rotulo}.'
+        ))
+
+    def montar_notificacoes(self, dia, ocorrencias, jornadas):
+        """Uma notificação para cada funcionário com ocorrência e um resumo para cada supervisor."""
+        data = dia.strftime('%d/%m/%Y')
+        notificacoes = []
+        linhas = []
+        for usuario_id, (tipo, problemas) in ocorrencias.items():
+            usuario = jornadas[usuario_id].usuario
+            if tipo == 'ponto_ausente':
+                titulo = f'Sem registro de ponto em {data}'
+                mensagem = (
+                    f'Não há ponto nem abono em {data}, que era dia útil. '
+                    'Se foi uma falta justificada, peça o abono ao seu supervisor.'
+                )
+            else:
+                titulo = f'Ponto inconsistente em {data}'
+                mensagem = (
+                    f'Seu ponto de {data} tem problemas: {"; ".join(problemas)}. '
+                    'Essas horas não entram no seu saldo até o ajuste; procure seu supervisor.'
+                )
+            notificacoes.append(Notificacao(usuario_id=usuario_id, tipo=tipo, titulo=titulo, mensagem=mensagem))
+            linhas.append(f'• {usuario.get_full_name() or usuario.username}: {"; ".join(problemas)}')
+
+        supervisores = User.objects.filter(is_superuser=True, is_active=True).values_list('id', flat=True)
+        # Título fixo por dia: uma nova execução (ex: depois de um ajuste) não repete o resumo
+        titulo = f'Ponto da equipe em {data}'
+        mensagem = f'{len(ocorrencias)} ocorrência(s):\n' + '\n'.join(linhas)
+        for supervisor_id in supervisores:
+            notificacoes.append(Notificacao(
+                usuario_id=supervisor_id, tipo='ponto_inconsistente', titulo=titulo, mensagem=mensagem,
+            ))
+        return notificacoes
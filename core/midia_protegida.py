@@ -0,0 +1,174 @@
+# core/midia_protegida.py
+"""
+Entrega autorizada de documentos sensíveis.
+
+Os FileFields listados em CAMPOS_PROTEGIDOS usam o ArmazenamentoProtegido,
+cuja URL é a view midia_protegida. A view descobre a que registro o arquivo
+pertence, confere o acesso uma única vez e, em produção, devolve só os
+cabeçalhos com X-Accel-Redirect: o nginx entrega o arquivo (com Range e
+sendfile) de um location interno, sem ocupar um worker do Django.
+
+Configuração do nginx (o acesso direto às pastas protegidas é negado):
+
+    location /blockline/media/requisicoes/ { deny all; }
+    location /blockline/media/comprovantes_boleto/ { deny all; }
+    location /midia-protegida/ {
+        internal;
+        alias /home/django_user/blockline_app/media/;
+    }
+
+Sem nginx (desenvolvimento) o próprio Django responde, também com suporte a
+Range e a GET condicional.
+"""
+import mimetypes
+import os
+import re
+
+from django.apps import apps
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse
+from django.utils.encoding import escape_uri_path
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+# Modelo -> campos cujos arquivos só saem pela view autorizada
+CAMPOS_PROTEGIDOS = [
+    ('RequisicaoCompra', ['documento_aprovacao', 'documento_boleto', 'documento_nota_fiscal']),
+    ('ParcelaBoleto', ['comprovante']),
+]
+RE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+TAMANHO_BLOCO = 64 * 1024
+
+
+def localizar_registro(nome):
+    """Registro que referencia o arquivo num campo protegido, ou None."""
+    for nome_modelo, campos in CAMPOS_PROTEGIDOS:
+        modelo = apps.get_model('core', nome_modelo)
+        filtro = Q()
+        for campo in campos:
+            filtro |= Q(**{campo: nome})
+        registro = modelo._default_manager.filter(filtro).first()
+        if registro is not None:
+            return registro
+    return None
+
+
+def pode_acessar(usuario, registro):
+    """
+    Superusuários e o financeiro veem todos os documentos; os demais, só os
+    das requisições em que participaram (requerente, aprovação, compra,
+    recebimento ou pagamento da parcela).
+    """
+    if not usuario.is_authenticated or not usuario.is_active:
+        return False
+    if usuario.is_superuser:
+        return True
+    perfil = getattr(usuario, 'perfil', None)
+    if perfil is not None and perfil.is_financeiro:
+        return True
+
+    requisicao = getattr(registro, 'requisicao', registro)
+    envolvidos = {
+        requisicao.requerente_id, requisicao.aprovado_por_id,
+        requisicao.comprado_por_id, requisicao.recebido_por_id,
+        getattr(registro, 'pago_por_id', None),
+    }
+    return usuario.pk in envolvidos
+
+
+def validadores(caminho):
+    """(ETag, Last-Modified em epoch, tamanho) do arquivo em disco."""
+    info = os.stat(caminho)
+    etag = quote_etag(f"{info.st_mtime_ns:x}-{info.st_size:x}")
+    return etag, int(info.st_mtime), info.st_size
+
+
+def intervalo_solicitado(cabecalho, tamanho):
+    """
+    Interpreta um cabeçalho Range de um único intervalo.
+
+    Returns:
+        (início, fim) inclusivos; None para enviar o arquivo inteiro
+        (sem Range ou com vários intervalos); False se não satisfazível
+    """
+    encontrado = RE_RANGE.match((cabecalho or '').strip())
+    if not encontrado:
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        # bytes=-N: os últimos N bytes
+        sufixo = int(fim)
+        if sufixo == 0:
+            return False
+        return max(tamanho - sufixo, 0), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return False
+    return inicio, fim
+
+
+def _ler_intervalo(arquivo, inicio, quantidade):
+    with arquivo:
+        arquivo.seek(inicio)
+        while quantidade > 0:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, quantidade))
+            if not bloco:
+                break
+            quantidade -= len(bloco)
+            yield bloco
+
+
+def resposta_arquivo(request, caminho, nome, x_accel_para=None):
+    """
+    Resposta para um arquivo já autorizado.
+
+    Com x_accel_para (URL do location interno do nginx) só os cabeçalhos são
+    enviados e o nginx cuida do corpo e do Range. Sem ele, o Django serve o
+    arquivo respondendo 206/416 para Range e 304 para GET condicional.
+    """
+    etag, modificado, tamanho = validadores(caminho)
+    tipo = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        nao_modificado = if_none_match.strip() == '*' or etag in [v.strip() for v in if_none_match.split(',')]
+    else:
+        desde = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        nao_modificado = desde is not None and modificado <= desde
+
+    if nao_modificado:
+        resposta = HttpResponse(status=304)
+    elif x_accel_para:
+        resposta = HttpResponse(content_type=tipo)
+        resposta['X-Accel-Redirect'] = x_accel_para
+    else:
+        intervalo = intervalo_solicitado(request.headers.get('Range'), tamanho)
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range.strip() not in (etag, http_date(modificado)):
+            # O arquivo mudou desde a primeira parte: envia tudo de novo
+            intervalo = None
+
+        if intervalo is False:
+            resposta = HttpResponse(status=416)
+            resposta['Content-Range'] = f'bytes */{tamanho}'
+        elif intervalo is None:
+            resposta = FileResponse(open(caminho, 'rb'), content_type=tipo)
+        else:
+            inicio, fim = intervalo
+            resposta = FileResponse(
+                _ler_intervalo(open(caminho, 'rb'), inicio, fim - inicio + 1),
+                status=206, content_type=tipo,
+            )
+            resposta['Content-Length'] = str(fim - inicio + 1)
+            resposta['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+        resposta['Accept-Ranges'] = 'bytes'
+
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = http_date(modificado)
+    resposta['Content-Disposition'] = f"inline; filename*=UTF-8''{escape_uri_path(os.path.basename(nome))}"
+    # Só o navegador do usuário guarda, e sempre revalida (o acesso pode ser revogado)
+    resposta['Cache-Control'] = 'private, no-cache'
+    return resposta
+
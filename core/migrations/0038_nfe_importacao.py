@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_itemestoque_numero_serie_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemRecebido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo_produto', models.CharField(blank=True, max_length=60, verbose_name='Código do Produto (cProd)')),
+                ('descricao', models.CharField(blank=True, max_length=255, verbose_name='Descrição na Nota')),
+                ('unidade', models.CharField(blank=True, max_length=10, verbose_name='Unidade')),
+                ('quantidade', models.DecimalField(decimal_places=4, default=0, max_digits=15, verbose_name='Quantidade')),
+                ('valor_unitario', models.DecimalField(decimal_places=10, default=0, max_digits=21, verbose_name='Valor Unitário')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Valor Total')),
+            ],
+            options={
+                'verbose_name': 'Item Recebido',
+                'verbose_name_plural': 'Itens Recebidos',
+                'ordering': ['recebimento', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='fornecedor',
+            name='cnpj',
+            field=models.CharField(blank=True, help_text='Somente números', max_length=14, null=True, unique=True, verbose_name='CNPJ'),
+        ),
+        migrations.AddField(
+            model_name='itemfornecedor',
+            name='codigo_produto',
+            field=models.CharField(blank=True, help_text='Código usado pelo fornecedor na NF-e (cProd)', max_length=60, null=True, verbose_name='Código do Produto no Fornecedor'),
+        ),
+        migrations.AddField(
+            model_name='recebimento',
+            name='chave_acesso',
+            field=models.CharField(blank=True, max_length=44, null=True, unique=True, verbose_name='Chave de Acesso da NF-e'),
+        ),
+        migrations.AddIndex(
+            model_name='itemfornecedor',
+            index=models.Index(fields=['fornecedor', 'codigo_produto'], name='itemforn_forn_codigo_idx'),
+        ),
+        migrations.AddField(
+            model_name='itemrecebido',
+            name='item_estoque',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='itens_recebidos', to='core.itemestoque', verbose_name='Item do Estoque'),
+        ),
+        migrations.AddField(
+            model_name='itemrecebido',
+            name='recebimento',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='core.recebimento'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Índices trigram para a busca da lista de recebimentos. O icontains do Django
+# no PostgreSQL gera UPPER("coluna"::text) LIKE UPPER(%s), por isso os índices
+# são sobre essa mesma expressão.
+INDICES_BUSCA = [
+    ('receb_nf_trgm_idx', 'core_recebimento', 'numero_nota_fiscal'),
+    ('fornecedor_nome_trgm_idx', 'core_fornecedor', 'nome'),
+    ('setor_nome_trgm_idx', 'core_setor', 'nome'),
+    ('auth_user_username_trgm_idx', 'auth_user', 'username'),
+]
+
+
+def criar_indices_busca(apps, schema_editor):
+    """Cria os índices trigram. Só existe suporte no PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for nome, tabela, coluna in INDICES_BUSCA:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nome} ON {tabela} '
+            f'USING gin (UPPER({coluna}::text) gin_trgm_ops)'
+        )
+
+
+def remover_indices_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nome, _tabela, _coluna in INDICES_BUSCA:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nome}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_nfe_importacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recebimento',
+            index=models.Index(fields=['data_recebimento', 'id'], name='receb_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recebimento',
+            index=models.Index(fields=['status', 'id'], name='receb_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recebimento',
+            index=models.Index(fields=['numero_nota_fiscal'], name='receb_nf_idx'),
+        ),
+        migrations.RunPython(criar_indices_busca, reverse_code=remover_indices_busca),
+    ]
@@ -0,0 +1,74 @@
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _normalizar(nome):
+    sem_acento = unicodedata.normalize('NFKD', nome or '')
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
+
+
+def vincular_clientes(apps, schema_editor):
+    """
+    Liga as expedições existentes ao Cliente cadastrado cujo nome normalizado
+    (sem acentos, minúsculo, espaços colapsados) bate com o texto digitado.
+    Procura primeiro na mesma empresa; se não houver, usa um cliente de outra
+    empresa apenas quando o nome for único. Um UPDATE por cliente encontrado.
+    """
+    Cliente = apps.get_model('core', 'Cliente')
+    Expedicao = apps.get_model('core', 'Expedicao')
+
+    por_empresa = {}
+    por_nome = {}
+    for pk, nome, empresa_id in Cliente.objects.values_list('pk', 'nome', 'empresa_id'):
+        chave = _normalizar(nome)
+        por_empresa[(empresa_id, chave)] = pk
+        por_nome.setdefault(chave, set()).add(pk)
+
+    expedicoes_por_cliente = {}
+    expedicoes = Expedicao.objects.filter(cliente__isnull=True).exclude(cliente_nome__isnull=True)
+    for pk, nome, empresa_id in expedicoes.values_list('pk', 'cliente_nome', 'empresa_id').iterator():
+        chave = _normalizar(nome)
+        cliente_id = por_empresa.get((empresa_id, chave))
+        if cliente_id is None and len(por_nome.get(chave, ())) == 1:
+            cliente_id = next(iter(por_nome[chave]))
+        if cliente_id is not None:
+            expedicoes_por_cliente.setdefault(cliente_id, []).append(pk)
+
+    for cliente_id, ids in expedicoes_por_cliente.items():
+        Expedicao.objects.filter(pk__in=ids).update(cliente_id=cliente_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_recebimento_indices'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='expedicao',
+            old_name='cliente',
+            new_name='cliente_nome',
+        ),
+        migrations.AlterField(
+            model_name='expedicao',
+            name='cliente_nome',
+            field=models.CharField(blank=True, max_length=200, null=True, verbose_name='Cliente/Destino'),
+        ),
+        migrations.AddField(
+            model_name='expedicao',
+            name='cliente',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expedicoes', to='core.cliente', verbose_name='Cliente'),
+        ),
+        migrations.AddIndex(
+            model_name='expedicao',
+            index=models.Index(fields=['cliente', '-data_expedicao'], name='exped_cliente_data_idx'),
+        ),
+        migrations.RunPython(
+            vincular_clientes,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:24
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_expedicao_cliente_fk'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadParcial',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nome_arquivo', models.CharField(max_length=255, verbose_name='Nome do Arquivo')),
+                ('tamanho', models.BigIntegerField(verbose_name='Tamanho (bytes)')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256 esperado')),
+                ('recebido', models.BigIntegerField(default=0, verbose_name='Bytes Recebidos')),
+                ('concluido', models.BooleanField(default=False, verbose_name='Concluído')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads_parciais', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Upload Parcial',
+                'verbose_name_plural': 'Uploads Parciais',
+                'indexes': [models.Index(fields=['atualizado_em'], name='upload_parcial_atualiz_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_upload_parcial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gastocaixainterno',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Prévias das Imagens'),
+        ),
+        migrations.AddField(
+            model_name='gastoviagem',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Prévias das Imagens'),
+        ),
+        migrations.AddField(
+            model_name='imagemexpedicao',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Prévias das Imagens'),
+        ),
+        migrations.AddField(
+            model_name='imagemitemestoque',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Prévias das Imagens'),
+        ),
+        migrations.AddField(
+            model_name='imagemprodutofabricado',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Prévias das Imagens'),
+        ),
+        migrations.AddField(
+            model_name='itemestoque',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Prévias das Imagens'),
+        ),
+        migrations.AddField(
+            model_name='produtofabricado',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Prévias das Imagens'),
+        ),
+        migrations.AddField(
+            model_name='recebimento',
+            name='placeholders',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Prévias das Imagens'),
+        ),
+    ]
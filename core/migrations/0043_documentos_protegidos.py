@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:29
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_placeholders_imagens'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parcelaboleto',
+            name='comprovante',
+            field=models.FileField(blank=True, null=True, storage=core.storage.armazenamento_protegido, upload_to='comprovantes_boleto/', verbose_name='Comprovante'),
+        ),
+        migrations.AlterField(
+            model_name='requisicaocompra',
+            name='documento_aprovacao',
+            field=models.FileField(blank=True, null=True, storage=core.storage.armazenamento_protegido, upload_to='requisicoes/aprovacao/', verbose_name='Documento/Imagem de Aprovação'),
+        ),
+        migrations.AlterField(
+            model_name='requisicaocompra',
+            name='documento_boleto',
+            field=models.FileField(blank=True, null=True, storage=core.storage.armazenamento_protegido, upload_to='requisicoes/boletos/', verbose_name='Documento do Boleto'),
+        ),
+        migrations.AlterField(
+            model_name='requisicaocompra',
+            name='documento_nota_fiscal',
+            field=models.FileField(blank=True, null=True, storage=core.storage.armazenamento_protegido, upload_to='requisicoes/notas_fiscais/', verbose_name='Documento da Nota Fiscal'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_documentos_protegidos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumomensal',
+            name='data_fim',
+            field=models.DateField(blank=True, null=True, verbose_name='Fim do Período'),
+        ),
+        migrations.AddField(
+            model_name='resumomensal',
+            name='data_inicio',
+            field=models.DateField(blank=True, null=True, verbose_name='Início do Período'),
+        ),
+        migrations.AddField(
+            model_name='resumomensal',
+            name='fechado',
+            field=models.BooleanField(default=False, verbose_name='Período Fechado'),
+        ),
+        migrations.AddField(
+            model_name='resumomensal',
+            name='fechado_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fechado em'),
+        ),
+        migrations.AddField(
+            model_name='resumomensal',
+            name='horas_abonadas',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('horas_trabalhadas', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('horas_abonadas', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('horas_esperadas', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('dia_util', models.BooleanField(default=False)),
+                ('presente', models.BooleanField(default=False, help_text='Tem registro de ponto')),
+                ('abonado', models.BooleanField(default=False)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'ordering': ['-data'],
+                'unique_together': {('usuario', 'data')},
+            },
+        ),
+    ]
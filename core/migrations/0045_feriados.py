@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_resumos_ponto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feriado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('tipo', models.CharField(choices=[('nacional', 'Nacional'), ('estadual', 'Estadual'), ('municipal', 'Municipal'), ('empresa', 'Da Empresa')], default='nacional', max_length=10, verbose_name='Tipo')),
+                ('recorrente', models.BooleanField(default=False, help_text='Mesmo dia e mês em todos os anos a partir desta data (ex: Natal, aniversário da cidade)', verbose_name='Repete todo ano')),
+            ],
+            options={
+                'verbose_name': 'Feriado',
+                'verbose_name_plural': 'Feriados',
+                'ordering': ['data'],
+                'indexes': [models.Index(fields=['data'], name='core_feriad_data_93e726_idx')],
+            },
+        ),
+    ]
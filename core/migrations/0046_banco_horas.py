@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_feriados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jornadatrabalho',
+            name='validade_banco_horas',
+            field=models.PositiveSmallIntegerField(default=6, help_text='Prazo para compensar as horas extras (0=não expiram)', verbose_name='Validade do Banco de Horas (meses)'),
+        ),
+        migrations.CreateModel(
+            name='LancamentoBancoHoras',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data de Referência')),
+                ('tipo', models.CharField(choices=[('periodo', 'Fechamento de Período'), ('ajuste', 'Ajuste Manual'), ('pagamento', 'Pagamento em Folha'), ('expiracao', 'Expiração')], max_length=10)),
+                ('horas', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('saldo', models.DecimalField(decimal_places=2, help_text='Saldo do banco após este lançamento', max_digits=8)),
+                ('horas_restantes', models.DecimalField(decimal_places=2, default=0, help_text='Parte do crédito ainda não compensada', max_digits=7)),
+                ('vence_em', models.DateField(blank=True, null=True, verbose_name='Vence em')),
+                ('descricao', models.CharField(blank=True, max_length=200, verbose_name='Descrição')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('criado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lancamentos_banco_horas_criados', to=settings.AUTH_USER_MODEL)),
+                ('resumo', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lancamento_banco_horas', to='core.resumomensal')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lancamentos_banco_horas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lançamento do Banco de Horas',
+                'verbose_name_plural': 'Banco de Horas',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['usuario', 'id'], name='core_lancam_usuario_6a74ab_idx'), models.Index(fields=['vence_em'], name='core_lancam_vence_e_d42d95_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0046_banco_horas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificacao',
+            name='tipo',
+            field=models.CharField(choices=[('tarefa_atribuida', 'Tarefa Atribuída'), ('tarefa_concluida', 'Tarefa Concluída'), ('prazo_proximo', 'Prazo Próximo'), ('tarefa_atrasada', 'Tarefa Atrasada'), ('comentario', 'Novo Comentário'), ('emprestimo_atrasado', 'Empréstimo Atrasado'), ('emprestimo_novo', 'Novo Empréstimo'), ('ponto_inconsistente', 'Ponto Inconsistente'), ('ponto_ausente', 'Dia sem Ponto')], max_length=30, verbose_name='Tipo'),
+        ),
+    ]
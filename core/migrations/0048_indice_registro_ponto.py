@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_notificacoes_ponto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registroponto',
+            index=models.Index(fields=['usuario', 'data_hora'], name='core_regist_usuario_dfd921_idx'),
+        ),
+    ]
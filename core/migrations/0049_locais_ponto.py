@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_indice_registro_ponto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registroponto',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='registroponto',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='registroponto',
+            name='precisao',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Precisão (metros)'),
+        ),
+        migrations.CreateModel(
+            name='LocalPonto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(help_text='Ex: Fábrica, Escritório', max_length=100, verbose_name='Nome')),
+                ('poligono', models.JSONField(help_text='Vértices em ordem, como [[latitude, longitude], ...]. Ex: [[-23.5501, -46.6341], [-23.5501, -46.6330], [-23.5510, -46.6330]]', verbose_name='Polígono')),
+                ('tolerancia_metros', models.PositiveIntegerField(default=30, help_text='Distância além da borda ainda aceita', verbose_name='Tolerância (metros)')),
+                ('ativo', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='locais_ponto', to='core.empresa', verbose_name='Empresa')),
+            ],
+            options={
+                'verbose_name': 'Local de Ponto',
+                'verbose_name_plural': 'Locais de Ponto',
+                'ordering': ['empresa', 'nome'],
+            },
+        ),
+        migrations.AddField(
+            model_name='registroponto',
+            name='local',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registros', to='core.localponto', verbose_name='Local'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _normalizar(nome):
+    sem_acento = unicodedata.normalize('NFKD', nome or '')
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
+
+
+def preencher_nome_normalizado(apps, schema_editor):
+    Cliente = apps.get_model('core', 'Cliente')
+    clientes = list(Cliente.objects.only('id', 'nome'))
+    for cliente in clientes:
+        cliente.nome_normalizado = _normalizar(cliente.nome)
+    Cliente.objects.bulk_update(clientes, ['nome_normalizado'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_locais_ponto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='nome_normalizado',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(
+            preencher_nome_normalizado,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0050_cliente_nome_normalizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadparcial',
+            name='gravando_desde',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
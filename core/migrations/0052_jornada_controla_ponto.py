@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:15
+
+from django.db import migrations, models
+from django.db.models import Min
+from django.utils import timezone
+
+
+def marcar_quem_registra_ponto(apps, schema_editor):
+    # Quem já tem ponto registrado controla ponto desde o primeiro registro
+    JornadaTrabalho = apps.get_model('core', 'JornadaTrabalho')
+    RegistroPonto = apps.get_model('core', 'RegistroPonto')
+    primeiros = dict(
+        RegistroPonto.objects.values('usuario_id').annotate(primeiro=Min('data_hora'))
+        .values_list('usuario_id', 'primeiro')
+    )
+    jornadas = list(JornadaTrabalho.objects.filter(usuario_id__in=list(primeiros)))
+    for jornada in jornadas:
+        jornada.controla_ponto = True
+        jornada.inicio_controle = timezone.localtime(primeiros[jornada.usuario_id]).date()
+    JornadaTrabalho.objects.bulk_update(jornadas, ['controla_ponto', 'inicio_controle'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0051_upload_reserva_parte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jornadatrabalho',
+            name='controla_ponto',
+            field=models.BooleanField(default=False, help_text='Ligado automaticamente no primeiro ponto registrado', verbose_name='Controla Ponto'),
+        ),
+        migrations.AddField(
+            model_name='jornadatrabalho',
+            name='inicio_controle',
+            field=models.DateField(blank=True, help_text='Horas esperadas e faltas contam a partir desta data (vazio = data de cadastro do usuário)', null=True, verbose_name='Início do Controle de Ponto'),
+        ),
+        migrations.RunPython(
+            marcar_quem_registra_ponto,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
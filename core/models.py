@@ -1,8 +1,13 @@
 # core/models.py
+import uuid
+
 from django.db import models
 from django.db.models import Sum
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .storage import armazenamento_protegido
 
 class Empresa(models.Model):
     nome = models.CharField(max_length=100, unique=True, verbose_name="Nome da Empresa")
@@ -47,6 +52,7 @@ class Fornecedor(models.Model):
 
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
     nome = models.CharField(max_length=200, unique=True, verbose_name="Nome")
+    cnpj = models.CharField(max_length=14, blank=True, null=True, unique=True, verbose_name="CNPJ", help_text="Somente números")
     endereco = models.TextField(blank=True, null=True, verbose_name="Endereço")
     telefone = models.CharField(max_length=20, blank=True, null=True, verbose_name="Telefone")
     email = models.EmailField(blank=True, null=True, verbose_name="E-mail")
@@ -85,6 +91,8 @@ class Cliente(models.Model):
 
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
     nome = models.CharField(max_length=200, verbose_name="Nome")
+    # Nome sem acentos, minúsculo e com espaços colapsados (utils.normalizar_nome), para achar o cliente pelo texto digitado
+    nome_normalizado = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
     endereco = models.TextField(blank=True, null=True, verbose_name="Endereço")
     telefone = models.CharField(max_length=20, blank=True, null=True, verbose_name="Telefone")
     email = models.EmailField(blank=True, null=True, verbose_name="E-mail")
@@ -100,6 +108,11 @@ class Cliente(models.Model):
         verbose_name_plural = "Clientes"
         ordering = ['nome']
 
+    def save(self, *args, **kwargs):
+        from .utils import normalizar_nome
+        self.nome_normalizado = normalizar_nome(self.nome)
+        super().save(*args, **kwargs)
+
     def __str__(self): return self.nome
 
 class Setor(models.Model):
@@ -115,9 +128,15 @@ class ItemFornecedor(models.Model):
     item_estoque = models.ForeignKey('ItemEstoque', on_delete=models.CASCADE)
     fornecedor = models.ForeignKey(Fornecedor, on_delete=models.CASCADE, null=True, blank=True)
     fornecedor_nome = models.CharField(max_length=200, blank=True, null=True, verbose_name="Nome do Fornecedor")
+    codigo_produto = models.CharField(max_length=60, blank=True, null=True, verbose_name="Código do Produto no Fornecedor", help_text="Código usado pelo fornecedor na NF-e (cProd)")
     valor_pago = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor de Custo/Cotação")
     data_cotacao = models.DateField(verbose_name="Data da Cotação")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fornecedor', 'codigo_produto'], name='itemforn_forn_codigo_idx'),
+        ]
+
     def get_nome_fornecedor(self):
         """Retorna o nome do fornecedor, seja da FK ou do campo de texto"""
         if self.fornecedor:
@@ -140,6 +159,7 @@ class ItemEstoque(models.Model):
     numero_serie = models.CharField(max_length=100, blank=True, null=True, unique=True, verbose_name="Número de Série")
     documentacao = models.FileField(upload_to='documentos_itens/', blank=True, null=True, verbose_name="Documentação")
     foto_principal = models.ImageField(upload_to='fotos_itens/', blank=True, null=True, verbose_name="Foto Principal")
+    placeholders = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Prévias das Imagens")
     links = models.TextField(blank=True, null=True, verbose_name="Links", help_text="Links úteis (um por linha)")
     fornecedores = models.ManyToManyField(Fornecedor, through=ItemFornecedor, blank=True)
     is_produto_fabricado = models.BooleanField(default=False)
@@ -188,12 +208,14 @@ class Recebimento(models.Model):
     setor = models.ForeignKey(Setor, on_delete=models.PROTECT, verbose_name="Setor de Destino")
     foto_documento = models.ImageField(upload_to='fotos_documentos/', blank=True, null=True, verbose_name="Foto da Nota Fiscal/Documento")
     foto_embalagem = models.ImageField(upload_to='fotos_embalagens/', blank=True, null=True, verbose_name="Foto da Embalagem")
+    placeholders = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Prévias das Imagens")
     data_recebimento = models.DateTimeField(auto_now_add=True, verbose_name="Data do Recebimento")
     numero_nota_fiscal = models.CharField(max_length=100, verbose_name="Número da Nota Fiscal", blank=True, null=True)
     fornecedor = models.ForeignKey(Fornecedor, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Fornecedor")
     fornecedor_nome = models.CharField(max_length=200, blank=True, null=True, verbose_name="Nome do Fornecedor")
     valor_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Valor Total da Nota")
     observacoes = models.TextField(blank=True, null=True, verbose_name="Observações Gerais")
+    chave_acesso = models.CharField(max_length=44, blank=True, null=True, unique=True, verbose_name="Chave de Acesso da NF-e")
 
     def get_nome_fornecedor(self):
         """Retorna o nome do fornecedor, seja da FK ou do campo de texto"""
@@ -203,12 +225,40 @@ class Recebimento(models.Model):
 
     STATUS_CHOICES = [('aguardando', 'Aguardando'), ('entregue', 'Entregue'),]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='aguardando')
-    
+
+    class Meta:
+        indexes = [
+            # Ordenação/cursor da lista de recebimentos
+            models.Index(fields=['data_recebimento', 'id'], name='receb_data_id_idx'),
+            models.Index(fields=['status', 'id'], name='receb_status_id_idx'),
+            models.Index(fields=['numero_nota_fiscal'], name='receb_nf_idx'),
+        ]
+
     def __str__(self): return f"Nota Fiscal {self.numero_nota_fiscal or 'N/A'}"
 
+class ItemRecebido(models.Model):
+    """Linha de produto de um recebimento importado de NF-e."""
+    recebimento = models.ForeignKey(Recebimento, on_delete=models.CASCADE, related_name='itens')
+    item_estoque = models.ForeignKey(ItemEstoque, on_delete=models.SET_NULL, null=True, blank=True, related_name='itens_recebidos', verbose_name="Item do Estoque")
+    codigo_produto = models.CharField(max_length=60, blank=True, verbose_name="Código do Produto (cProd)")
+    descricao = models.CharField(max_length=255, blank=True, verbose_name="Descrição na Nota")
+    unidade = models.CharField(max_length=10, blank=True, verbose_name="Unidade")
+    quantidade = models.DecimalField(max_digits=15, decimal_places=4, default=0, verbose_name="Quantidade")
+    valor_unitario = models.DecimalField(max_digits=21, decimal_places=10, default=0, verbose_name="Valor Unitário")
+    valor_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Valor Total")
+
+    class Meta:
+        ordering = ['recebimento', 'id']
+        verbose_name = "Item Recebido"
+        verbose_name_plural = "Itens Recebidos"
+
+    def __str__(self):
+        return f"{self.descricao or self.codigo_produto} ({self.quantidade})"
+
 class ImagemItemEstoque(models.Model):
     item = models.ForeignKey(ItemEstoque, related_name='imagens', on_delete=models.CASCADE)
     imagem = models.ImageField(upload_to='imagens_itens/')
+    placeholders = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Prévias das Imagens")
 
     def __str__(self): return f"Imagem de {self.item.nome}"
 
@@ -217,6 +267,7 @@ class ProdutoFabricado(models.Model):
     nome = models.CharField(max_length=200, unique=True, verbose_name="Nome do Produto")
     descricao = models.TextField(blank=True, null=True, verbose_name="Descrição do Produto")
     foto_principal = models.ImageField(upload_to='fotos_produtos/', blank=True, null=True, verbose_name="Foto Principal")
+    placeholders = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Prévias das Imagens")
     componentes = models.ManyToManyField(ItemEstoque, through='Componente', related_name='produtos_fabricados', verbose_name="Lista de Componentes")
 
     def __str__(self): return self.nome
@@ -231,6 +282,7 @@ class DocumentoProdutoFabricado(models.Model):
 class ImagemProdutoFabricado(models.Model):
     produto = models.ForeignKey(ProdutoFabricado, related_name='imagens', on_delete=models.CASCADE)
     imagem = models.ImageField(upload_to='imagens_produtos/')
+    placeholders = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Prévias das Imagens")
     def __str__(self): return f"Imagem de {self.produto.nome}"
 
 class Componente(models.Model):
@@ -242,14 +294,27 @@ class Componente(models.Model):
 
 class Expedicao(models.Model):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
-    cliente = models.CharField(max_length=200, verbose_name="Cliente/Destino")
+    cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, blank=True, related_name='expedicoes', verbose_name="Cliente")
+    cliente_nome = models.CharField(max_length=200, blank=True, null=True, verbose_name="Cliente/Destino")
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Responsável pela Expedição")
     data_expedicao = models.DateTimeField(auto_now_add=True, verbose_name="Data da Expedição")
     nota_fiscal = models.CharField(max_length=100, blank=True, null=True, verbose_name="Número da Nota Fiscal")
     observacoes = models.TextField(blank=True, null=True, verbose_name="Observações")
 
+    class Meta:
+        indexes = [
+            # Histórico do cliente: filtra por cliente já na ordem de data
+            models.Index(fields=['cliente', '-data_expedicao'], name='exped_cliente_data_idx'),
+        ]
+
+    def get_nome_cliente(self):
+        """Retorna o nome do cliente, seja da FK ou do campo de texto"""
+        if self.cliente:
+            return self.cliente.nome
+        return self.cliente_nome or "Cliente não informado"
+
     def __str__(self):
-        return f"Expedição #{self.pk} para {self.cliente}"
+        return f"Expedição #{self.pk} para {self.get_nome_cliente()}"
 
 class ItemExpedido(models.Model):
     expedicao = models.ForeignKey(Expedicao, on_delete=models.CASCADE, related_name='itens')
@@ -276,6 +341,7 @@ class DocumentoExpedicao(models.Model):
 class ImagemExpedicao(models.Model):
     expedicao = models.ForeignKey(Expedicao, on_delete=models.CASCADE, related_name='imagens')
     imagem = models.ImageField(upload_to='imagens_expedicao/')
+    placeholders = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Prévias das Imagens")
 
     def __str__(self):
         return f"Imagem para a Expedição #{self.expedicao.pk}"
@@ -430,6 +496,9 @@ class ProjectTask(models.Model):
     @property
     def quantidade_produzida(self):
         """Total produzido somando todas as entradas"""
+        # Listagens anotam o total (quantidade_produzida_total) para não somar tarefa por tarefa
+        if hasattr(self, 'quantidade_produzida_total'):
+            return self.quantidade_produzida_total or 0
         total = self.quantidades_feitas.aggregate(total=Sum('quantidade'))['total']
         return total or 0
 
@@ -558,6 +627,8 @@ class Notificacao(models.Model):
         ('comentario', 'Novo Comentário'),
         ('emprestimo_atrasado', 'Empréstimo Atrasado'),
         ('emprestimo_novo', 'Novo Empréstimo'),
+        ('ponto_inconsistente', 'Ponto Inconsistente'),
+        ('ponto_ausente', 'Dia sem Ponto'),
     ]
 
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notificacoes', verbose_name="Usuário")
@@ -639,6 +710,14 @@ class JornadaTrabalho(models.Model):
                                          help_text="Dia do mês em que inicia o período (1-31)")
     dia_fim_mes = models.IntegerField(default=0, verbose_name="Dia de Fim do Mês",
                                       help_text="Dia do mês em que termina o período (0=último dia do mês)")
+    validade_banco_horas = models.PositiveSmallIntegerField(default=6, verbose_name="Validade do Banco de Horas (meses)",
+                                                            help_text="Prazo para compensar as horas extras (0=não expiram)")
+
+    # Só quem controla ponto entra no fechamento de período, no banco de horas e na verificação diária
+    controla_ponto = models.BooleanField(default=False, verbose_name="Controla Ponto",
+                                         help_text="Ligado automaticamente no primeiro ponto registrado")
+    inicio_controle = models.DateField(null=True, blank=True, verbose_name="Início do Controle de Ponto",
+                                       help_text="Horas esperadas e faltas contam a partir desta data (vazio = data de cadastro do usuário)")
 
     class Meta:
         verbose_name = "Jornada de Trabalho"
@@ -647,6 +726,20 @@ class JornadaTrabalho(models.Model):
     def __str__(self):
         return f"{self.usuario.username} - {self.horas_diarias}h/dia"
 
+    def save(self, *args, **kwargs):
+        if self.controla_ponto and not self.inicio_controle:
+            self.inicio_controle = timezone.localtime(self.usuario.date_joined).date()
+        super().save(*args, **kwargs)
+
+    def iniciar_controle(self, data):
+        """Passa a controlar o ponto a partir de `data`. Retorna True se o controle acabou de começar."""
+        if self.controla_ponto:
+            return False
+        self.controla_ponto = True
+        self.inicio_controle = self.inicio_controle or data
+        self.save(update_fields=['controla_ponto', 'inicio_controle'])
+        return True
+
     def horas_esperadas_dia(self, data):
         """Retorna horas esperadas para um dia específico"""
         # Segunda a Quinta (0-3): 9h líquidas (8-18 com 1h almoço)
@@ -656,74 +749,83 @@ class JornadaTrabalho(models.Model):
         else:  # Segunda a Quinta
             return float(self.horas_diarias)
 
-    def horas_esperadas_periodo(self, data_inicio, data_fim):
-        """Calcula horas esperadas para um período específico"""
-        from datetime import timedelta
-        total_horas = 0
-        dias_trabalho = [int(d) for d in self.dias_semana.split(',')]
+    @cached_property
+    def dias_trabalho(self):
+        """Dias da semana trabalhados (0=Seg ... 6=Dom), lidos uma vez de dias_semana."""
+        return frozenset(int(d) for d in self.dias_semana.split(',') if d.strip())
 
-        dia_atual = data_inicio
-        while dia_atual <= data_fim:
-            if dia_atual.weekday() in dias_trabalho:
-                total_horas += self.horas_esperadas_dia(dia_atual)
-            dia_atual += timedelta(days=1)
+    @cached_property
+    def horas_por_dia_semana(self):
+        """Horas esperadas por dia da semana (índice 0=Seg); zero nos dias de folga."""
+        return tuple(
+            (float(self.horas_sexta) if dia == 4 else float(self.horas_diarias)) if dia in self.dias_trabalho else 0.0
+            for dia in range(7)
+        )
 
-        return total_horas
+    def horas_esperadas_periodo(self, data_inicio, data_fim):
+        """Calcula horas esperadas para um período específico, descontando feriados"""
+        from .calendario import horas_esperadas
+        return horas_esperadas(self, data_inicio, data_fim)
 
     @property
     def horas_mensais(self):
-        """Calcula horas mensais baseado nos dias úteis e período personalizado"""
-        import calendar
-        from datetime import datetime
-        now = datetime.now()
-
-        # Se usa período padrão (dia 1 ao último dia do mês)
-        if self.dia_inicio_mes == 1 and self.dia_fim_mes == 0:
-            dias_no_mes = calendar.monthrange(now.year, now.month)[1]
-            total_horas = 0
-            dias_trabalho = [int(d) for d in self.dias_semana.split(',')]
-
-            for dia in range(1, dias_no_mes + 1):
-                data = datetime(now.year, now.month, dia)
-                if data.weekday() in dias_trabalho:
-                    total_horas += self.horas_esperadas_dia(data)
-
-            return total_horas
-        else:
-            # Usa período personalizado - calcula com base no dia atual
-            dia_inicio = self.dia_inicio_mes
-            dia_fim = self.dia_fim_mes if self.dia_fim_mes != 0 else calendar.monthrange(now.year, now.month)[1]
-
-            # Determinar primeiro e último dia do período atual
-            if now.day >= dia_inicio:
-                # Período atual
-                primeiro_dia = datetime(now.year, now.month, dia_inicio).date()
-
-                if dia_fim >= dia_inicio:
-                    # Termina no mesmo mês
-                    ultimo_dia = datetime(now.year, now.month, dia_fim).date()
-                else:
-                    # Termina no próximo mês
-                    if now.month == 12:
-                        proximo_mes = 1
-                        proximo_ano = now.year + 1
-                    else:
-                        proximo_mes = now.month + 1
-                        proximo_ano = now.year
-                    ultimo_dia = datetime(proximo_ano, proximo_mes, dia_fim).date()
-            else:
-                # Período anterior
-                if now.month == 1:
-                    mes_anterior = 12
-                    ano_anterior = now.year - 1
-                else:
-                    mes_anterior = now.month - 1
-                    ano_anterior = now.year
-
-                primeiro_dia = datetime(ano_anterior, mes_anterior, dia_inicio).date()
-                ultimo_dia = datetime(now.year, now.month, dia_fim).date()
-
-            return self.horas_esperadas_periodo(primeiro_dia, ultimo_dia)
+        """Calcula horas mensais do período atual (padrão ou personalizado), descontando feriados"""
+        from .ponto import periodo_da_data
+        primeiro_dia, ultimo_dia = periodo_da_data(self, timezone.localdate())
+        return self.horas_esperadas_periodo(primeiro_dia, ultimo_dia)
+
+class Feriado(models.Model):
+    TIPO_CHOICES = [
+        ('nacional', 'Nacional'),
+        ('estadual', 'Estadual'),
+        ('municipal', 'Municipal'),
+        ('empresa', 'Da Empresa'),
+    ]
+
+    data = models.DateField(verbose_name="Data")
+    nome = models.CharField(max_length=100, verbose_name="Nome")
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, default='nacional', verbose_name="Tipo")
+    recorrente = models.BooleanField(default=False, verbose_name="Repete todo ano",
+                                     help_text="Mesmo dia e mês em todos os anos a partir desta data (ex: Natal, aniversário da cidade)")
+
+    class Meta:
+        ordering = ['data']
+        verbose_name = "Feriado"
+        verbose_name_plural = "Feriados"
+        indexes = [models.Index(fields=['data'])]
+
+    def __str__(self):
+        return f"{self.data.strftime('%d/%m/%Y')} - {self.nome}"
+
+class LocalPonto(models.Model):
+    """Área (polígono) onde os funcionários da empresa podem bater ponto."""
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='locais_ponto', verbose_name="Empresa")
+    nome = models.CharField(max_length=100, verbose_name="Nome", help_text="Ex: Fábrica, Escritório")
+    poligono = models.JSONField(verbose_name="Polígono",
+                                help_text='Vértices em ordem, como [[latitude, longitude], ...]. Ex: [[-23.5501, -46.6341], [-23.5501, -46.6330], [-23.5510, -46.6330]]')
+    tolerancia_metros = models.PositiveIntegerField(default=30, verbose_name="Tolerância (metros)",
+                                                    help_text="Distância além da borda ainda aceita")
+    ativo = models.BooleanField(default=True, verbose_name="Ativo")
+
+    class Meta:
+        ordering = ['empresa', 'nome']
+        verbose_name = "Local de Ponto"
+        verbose_name_plural = "Locais de Ponto"
+
+    def __str__(self):
+        return f"{self.empresa.nome} - {self.nome}"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        vertices = self.poligono if isinstance(self.poligono, list) else []
+        validos = [
+            v for v in vertices
+            if isinstance(v, (list, tuple)) and len(v) == 2
+            and all(isinstance(c, (int, float)) for c in v)
+            and -90 <= v[0] <= 90 and -180 <= v[1] <= 180
+        ]
+        if len(validos) < 3 or len(validos) != len(vertices):
+            raise ValidationError({'poligono': 'Informe pelo menos 3 vértices no formato [latitude, longitude].'})
 
 class RegistroPonto(models.Model):
     TIPO_CHOICES = [
@@ -737,6 +839,10 @@ class RegistroPonto(models.Model):
     tipo = models.CharField(max_length=15, choices=TIPO_CHOICES)
     data_hora = models.DateTimeField(default=timezone.now)
     localizacao = models.CharField(max_length=200, blank=True, null=True, verbose_name="Localização")
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    precisao = models.PositiveIntegerField(null=True, blank=True, verbose_name="Precisão (metros)")
+    local = models.ForeignKey(LocalPonto, on_delete=models.SET_NULL, null=True, blank=True, related_name='registros', verbose_name="Local")
     observacao = models.TextField(blank=True, null=True)
 
     # Campos de Abono
@@ -749,6 +855,7 @@ class RegistroPonto(models.Model):
         ordering = ['-data_hora']
         verbose_name = "Registro de Ponto"
         verbose_name_plural = "Registros de Ponto"
+        indexes = [models.Index(fields=['usuario', 'data_hora'])]
 
     def __str__(self):
         return f"{self.usuario.username} - {self.get_tipo_display()} em {self.data_hora.strftime('%d/%m/%Y %H:%M')}"
@@ -781,14 +888,23 @@ class AbonoDia(models.Model):
         return f"{self.usuario.username} - {self.data.strftime('%d/%m/%Y')} - {self.get_tipo_abono_display()}"
 
 class ResumoMensal(models.Model):
+    """
+    Totais de um período de apuração (mes/ano = mês em que o período
+    termina). Atualizado a cada ponto ou abono; depois de fechado não muda.
+    """
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resumos_mensais')
     mes = models.IntegerField()
     ano = models.IntegerField()
+    data_inicio = models.DateField(null=True, blank=True, verbose_name="Início do Período")
+    data_fim = models.DateField(null=True, blank=True, verbose_name="Fim do Período")
     horas_trabalhadas = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    horas_abonadas = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     horas_esperadas = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     saldo_horas = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     dias_presentes = models.IntegerField(default=0)
     dias_ausentes = models.IntegerField(default=0)
+    fechado = models.BooleanField(default=False, verbose_name="Período Fechado")
+    fechado_em = models.DateTimeField(null=True, blank=True, verbose_name="Fechado em")
 
     class Meta:
         ordering = ['-ano', '-mes']
@@ -799,6 +915,67 @@ class ResumoMensal(models.Model):
     def __str__(self):
         return f"{self.usuario.username} - {self.mes}/{self.ano}"
 
+class ResumoDiario(models.Model):
+    """Totais de um dia com ponto ou abono, base incremental do ResumoMensal."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resumos_diarios')
+    data = models.DateField()
+    horas_trabalhadas = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    horas_abonadas = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    horas_esperadas = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    dia_util = models.BooleanField(default=False)
+    presente = models.BooleanField(default=False, help_text="Tem registro de ponto")
+    abonado = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-data']
+        unique_together = ['usuario', 'data']
+        verbose_name = "Resumo Diário"
+        verbose_name_plural = "Resumos Diários"
+
+    def __str__(self):
+        return f"{self.usuario.username} - {self.data.strftime('%d/%m/%Y')}"
+
+
+class LancamentoBancoHoras(models.Model):
+    """
+    Lançamento do banco de horas. `saldo` é o saldo acumulado logo depois do
+    lançamento: o banco atual é o saldo do último lançamento do usuário.
+    Lançamentos positivos são créditos que vencem em `vence_em`;
+    `horas_restantes` é a parte ainda não compensada.
+    """
+    TIPO_CHOICES = [
+        ('periodo', 'Fechamento de Período'),
+        ('ajuste', 'Ajuste Manual'),
+        ('pagamento', 'Pagamento em Folha'),
+        ('expiracao', 'Expiração'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lancamentos_banco_horas')
+    data = models.DateField(verbose_name="Data de Referência")
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    horas = models.DecimalField(max_digits=7, decimal_places=2)
+    saldo = models.DecimalField(max_digits=8, decimal_places=2, help_text="Saldo do banco após este lançamento")
+    horas_restantes = models.DecimalField(max_digits=7, decimal_places=2, default=0,
+                                          help_text="Parte do crédito ainda não compensada")
+    vence_em = models.DateField(null=True, blank=True, verbose_name="Vence em")
+    resumo = models.OneToOneField(ResumoMensal, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='lancamento_banco_horas')
+    descricao = models.CharField(max_length=200, blank=True, verbose_name="Descrição")
+    criado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='lancamentos_banco_horas_criados')
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = "Lançamento do Banco de Horas"
+        verbose_name_plural = "Banco de Horas"
+        indexes = [
+            models.Index(fields=['usuario', 'id']),
+            models.Index(fields=['vence_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario.username} - {self.get_tipo_display()} {self.horas:+}h em {self.data.strftime('%d/%m/%Y')}"
 
 class RequisicaoCompra(models.Model):
     STATUS_CHOICES = [
@@ -830,7 +1007,7 @@ class RequisicaoCompra(models.Model):
     aprovado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='aprovacoes_compra', verbose_name="Aprovado Por")
     data_aprovacao = models.DateTimeField(null=True, blank=True, verbose_name="Data de Aprovação")
     observacao_aprovacao = models.TextField(blank=True, null=True, verbose_name="Observação da Aprovação")
-    documento_aprovacao = models.FileField(upload_to='requisicoes/aprovacao/', blank=True, null=True, verbose_name="Documento/Imagem de Aprovação")
+    documento_aprovacao = models.FileField(upload_to='requisicoes/aprovacao/', storage=armazenamento_protegido, blank=True, null=True, verbose_name="Documento/Imagem de Aprovação")
 
     # Compra
     comprado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='compras_realizadas', verbose_name="Comprado Por")
@@ -863,11 +1040,11 @@ class RequisicaoCompra(models.Model):
     tipo_dias_pagamento = models.CharField(max_length=20, choices=TIPO_DIAS_CHOICES, blank=True, null=True, verbose_name="Tipo de Dias de Pagamento")
     dias_pagamento = models.TextField(blank=True, null=True, verbose_name="Dias de Pagamento", help_text="Exemplo: '15, 30, 45' ou '29 de fevereiro'")
 
-    documento_boleto = models.FileField(upload_to='requisicoes/boletos/', blank=True, null=True, verbose_name="Documento do Boleto")
+    documento_boleto = models.FileField(upload_to='requisicoes/boletos/', storage=armazenamento_protegido, blank=True, null=True, verbose_name="Documento do Boleto")
     dias_aviso_pagamento = models.IntegerField(blank=True, null=True, default=3, verbose_name="Dias de Antecedência para Aviso", help_text="Quantos dias antes do vencimento enviar alerta")
 
     # Documento da nota fiscal
-    documento_nota_fiscal = models.FileField(upload_to='requisicoes/notas_fiscais/', blank=True, null=True, verbose_name="Documento da Nota Fiscal")
+    documento_nota_fiscal = models.FileField(upload_to='requisicoes/notas_fiscais/', storage=armazenamento_protegido, blank=True, null=True, verbose_name="Documento da Nota Fiscal")
 
     # Recebimento
     recebido_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='recebimentos_compra', verbose_name="Recebido Por")
@@ -933,6 +1110,7 @@ class ParcelaBoleto(models.Model):
     )
     comprovante = models.FileField(
         upload_to='comprovantes_boleto/',
+        storage=armazenamento_protegido,
         null=True,
         blank=True,
         verbose_name="Comprovante"
@@ -972,6 +1150,7 @@ class GastoViagem(models.Model):
     valor = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor (R$)")
     descricao = models.TextField(verbose_name="Descrição")
     imagem = models.ImageField(upload_to='gastos_viagem/', blank=True, null=True, verbose_name="Comprovante/Foto")
+    placeholders = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Prévias das Imagens")
     data_gasto = models.DateTimeField(auto_now_add=True, verbose_name="Data do Gasto")
     data_viagem = models.DateField(null=True, blank=True, verbose_name="Data da Viagem")
     destino = models.CharField(max_length=200, blank=True, null=True, verbose_name="Destino")
@@ -994,6 +1173,7 @@ class GastoCaixaInterno(models.Model):
     valor = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor (R$)")
     descricao = models.TextField(verbose_name="Descrição")
     imagem = models.ImageField(upload_to='gastos_caixa/', blank=True, null=True, verbose_name="Comprovante/Foto")
+    placeholders = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Prévias das Imagens")
     data_gasto = models.DateTimeField(auto_now_add=True, verbose_name="Data do Gasto")
     categoria = models.CharField(max_length=100, blank=True, null=True, verbose_name="Categoria")
     nota_fiscal = models.CharField(max_length=100, blank=True, null=True, verbose_name="Número da Nota Fiscal")
@@ -1006,3 +1186,32 @@ class GastoCaixaInterno(models.Model):
 
     def __str__(self):
         return f"{self.usuario} - R$ {self.valor} - {self.data_gasto.strftime('%d/%m/%Y')}"
+
+
+class UploadParcial(models.Model):
+    """
+    Upload enviado em partes (Content-Range) e montado num arquivo
+    temporário. Depois de concluído e conferido pelo SHA-256, o formulário
+    referencia o upload pelo id em vez de reenviar o arquivo.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads_parciais', verbose_name="Usuário")
+    nome_arquivo = models.CharField(max_length=255, verbose_name="Nome do Arquivo")
+    tamanho = models.BigIntegerField(verbose_name="Tamanho (bytes)")
+    sha256 = models.CharField(max_length=64, verbose_name="SHA-256 esperado")
+    recebido = models.BigIntegerField(default=0, verbose_name="Bytes Recebidos")
+    concluido = models.BooleanField(default=False, verbose_name="Concluído")
+    # Reserva da parte em gravação: o corpo é lido fora da transação
+    gravando_desde = models.DateTimeField(null=True, blank=True, editable=False)
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        verbose_name = "Upload Parcial"
+        verbose_name_plural = "Uploads Parciais"
+        indexes = [
+            models.Index(fields=['atualizado_em'], name='upload_parcial_atualiz_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.recebido}/{self.tamanho})"
@@ -0,0 +1,239 @@
+# core/nfe.py
+"""
+Importação de NF-e (XML) para Recebimentos.
+
+O XML é lido em streaming com iterparse: cada <det> é convertido em um dict
+e removido da árvore logo em seguida, então o consumo de memória depende do
+tamanho de uma nota e não do arquivo enviado. Arquivos .zip são percorridos
+membro a membro, sem extrair nada para o disco.
+
+As notas lidas são gravadas em lotes: para cada lote são feitas apenas uma
+consulta de chaves já importadas, uma de fornecedores por CNPJ, uma do mapa
+de códigos de produto (ItemFornecedor) e dois bulk_create.
+"""
+import zipfile
+import zlib
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse, ParseError
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Fornecedor, ItemFornecedor, Recebimento, ItemRecebido
+
+TAMANHO_LOTE = 200
+
+
+class NotaFiscalInvalida(Exception):
+    """O arquivo não é um XML de NF-e reconhecível."""
+
+
+def _tag(elem):
+    """Nome da tag sem o namespace do portal fiscal."""
+    return elem.tag.rsplit('}', 1)[-1]
+
+
+def _decimal(valor):
+    try:
+        return Decimal(valor) if valor else Decimal('0')
+    except InvalidOperation:
+        return Decimal('0')
+
+
+def _filhos(elem):
+    """Converte os filhos diretos de um elemento em dict {tag: texto}."""
+    return {_tag(filho): (filho.text or '').strip() for filho in elem}
+
+
+def somente_digitos(valor):
+    return ''.join(c for c in (valor or '') if c.isdigit())
+
+
+def ler_nfe(arquivo):
+    """
+    Lê um XML de NF-e (nfeProc ou NFe) e retorna um dict com o cabeçalho
+    da nota e a lista de itens.
+    """
+    nota = {
+        'chave': '', 'numero': '', 'serie': '', 'data_emissao': None,
+        'cnpj_emitente': '', 'nome_emitente': '', 'valor_total': None,
+        'itens': [],
+    }
+    pilha = []
+
+    try:
+        for evento, elem in iterparse(arquivo, events=('start', 'end')):
+            if evento == 'start':
+                pilha.append(elem)
+                continue
+
+            pilha.pop()
+            tag = _tag(elem)
+            pai = _tag(pilha[-1]) if pilha else ''
+
+            if tag == 'infNFe':
+                nota['chave'] = nota['chave'] or somente_digitos(elem.get('Id'))
+            elif tag == 'chNFe':
+                nota['chave'] = somente_digitos(elem.text)
+            elif tag == 'ide':
+                ide = _filhos(elem)
+                nota['numero'] = ide.get('nNF', '')
+                nota['serie'] = ide.get('serie', '')
+                nota['data_emissao'] = parse_datetime(ide.get('dhEmi', '')) if ide.get('dhEmi') else None
+            elif tag == 'emit':
+                emit = _filhos(elem)
+                nota['cnpj_emitente'] = somente_digitos(emit.get('CNPJ') or emit.get('CPF'))
+                nota['nome_emitente'] = emit.get('xNome', '')
+            elif tag == 'prod' and pai == 'det':
+                prod = _filhos(elem)
+                nota['itens'].append({
+                    'codigo': prod.get('cProd', '')[:60],
+                    'descricao': prod.get('xProd', '')[:255],
+                    'unidade': prod.get('uCom', '')[:10],
+                    'quantidade': _decimal(prod.get('qCom')),
+                    'valor_unitario': _decimal(prod.get('vUnCom')),
+                    'valor_total': _decimal(prod.get('vProd')),
+                })
+            elif tag == 'vNF' and pai == 'ICMSTot':
+                nota['valor_total'] = _decimal(elem.text)
+            elif tag == 'det' and pilha:
+                # Item já lido: tira da árvore para não acumular os <det>
+                pilha[-1].remove(elem)
+            else:
+                continue
+
+            elem.clear()
+    except ParseError as e:
+        raise NotaFiscalInvalida(f"XML inválido: {e}")
+
+    if not nota['chave'] or not nota['numero']:
+        raise NotaFiscalInvalida("Arquivo não contém uma NF-e reconhecível.")
+    return nota
+
+
+def iterar_notas(arquivo, nome='arquivo'):
+    """
+    Gera (nome, nota, erro) para um XML avulso ou para cada XML dentro de
+    um .zip. Notas inválidas não interrompem a importação das demais.
+    """
+    if zipfile.is_zipfile(arquivo):
+        arquivo.seek(0)
+        with zipfile.ZipFile(arquivo) as pacote:
+            for info in pacote.infolist():
+                if info.is_dir() or not info.filename.lower().endswith('.xml'):
+                    continue
+                try:
+                    with pacote.open(info) as membro:
+                        nota = ler_nfe(membro)
+                except NotaFiscalInvalida as e:
+                    yield info.filename, None, str(e)
+                    continue
+                except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                    # Membro corrompido (CRC, compressão): só ele fica de fora
+                    yield info.filename, None, f"Arquivo corrompido no .zip: {e}"
+                    continue
+                yield info.filename, nota, None
+    else:
+        arquivo.seek(0)
+        try:
+            yield nome, ler_nfe(arquivo), None
+        except NotaFiscalInvalida as e:
+            yield nome, None, str(e)
+
+
+def _gravar_lote(lote, empresa, setor, usuario, resumo):
+    chaves = [nota['chave'] for nota in lote]
+    ja_importadas = set(
+        Recebimento.objects.filter(chave_acesso__in=chaves).values_list('chave_acesso', flat=True)
+    )
+
+    novas, vistas = [], set()
+    for nota in lote:
+        if nota['chave'] in ja_importadas or nota['chave'] in vistas:
+            resumo['duplicadas'] += 1
+            continue
+        vistas.add(nota['chave'])
+        novas.append(nota)
+    if not novas:
+        return
+
+    cnpjs = {nota['cnpj_emitente'] for nota in novas if nota['cnpj_emitente']}
+    fornecedores = {
+        f.cnpj: f for f in Fornecedor.objects.filter(cnpj__in=cnpjs).only('id', 'nome', 'cnpj')
+    }
+
+    # Mapa (fornecedor, código do produto) -> item do estoque
+    codigos = {item['codigo'] for nota in novas for item in nota['itens'] if item['codigo']}
+    mapa_codigos = {}
+    if fornecedores and codigos:
+        vinculos = ItemFornecedor.objects.filter(
+            fornecedor_id__in=[f.pk for f in fornecedores.values()],
+            codigo_produto__in=codigos,
+        ).values_list('fornecedor_id', 'codigo_produto', 'item_estoque_id')
+        for fornecedor_id, codigo, item_id in vinculos:
+            mapa_codigos.setdefault((fornecedor_id, codigo), item_id)
+
+    recebimentos = []
+    for nota in novas:
+        fornecedor = fornecedores.get(nota['cnpj_emitente'])
+        if not fornecedor:
+            resumo['sem_fornecedor'] += 1
+        emissao = nota['data_emissao'].strftime('%d/%m/%Y') if nota['data_emissao'] else '-'
+        recebimentos.append(Recebimento(
+            empresa=empresa,
+            usuario=usuario,
+            setor=setor,
+            numero_nota_fiscal=nota['numero'],
+            fornecedor=fornecedor,
+            fornecedor_nome=None if fornecedor else nota['nome_emitente'],
+            valor_total=nota['valor_total'],
+            chave_acesso=nota['chave'],
+            observacoes=f"Importado de NF-e (série {nota['serie'] or '-'}, emitida em {emissao}).",
+        ))
+
+    with transaction.atomic():
+        Recebimento.objects.bulk_create(recebimentos)
+
+        linhas = []
+        for recebimento, nota in zip(recebimentos, novas):
+            for item in nota['itens']:
+                item_id = mapa_codigos.get((recebimento.fornecedor_id, item['codigo']))
+                if item_id:
+                    resumo['itens_vinculados'] += 1
+                linhas.append(ItemRecebido(
+                    recebimento=recebimento,
+                    item_estoque_id=item_id,
+                    codigo_produto=item['codigo'],
+                    descricao=item['descricao'],
+                    unidade=item['unidade'],
+                    quantidade=item['quantidade'],
+                    valor_unitario=item['valor_unitario'],
+                    valor_total=item['valor_total'],
+                ))
+        ItemRecebido.objects.bulk_create(linhas, batch_size=500)
+
+    resumo['importadas'] += len(recebimentos)
+    resumo['itens'] += len(linhas)
+
+
+def importar_nfe(arquivo, empresa, setor, usuario, nome='arquivo', tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa um XML de NF-e ou um .zip com vários XMLs como Recebimentos.
+    Retorna um resumo com contadores e a lista de erros por arquivo.
+    """
+    resumo = {
+        'importadas': 0, 'duplicadas': 0, 'sem_fornecedor': 0,
+        'itens': 0, 'itens_vinculados': 0, 'erros': [],
+    }
+    lote = []
+    for nome_arquivo, nota, erro in iterar_notas(arquivo, nome):
+        if erro:
+            resumo['erros'].append(f"{nome_arquivo}: {erro}")
+            continue
+        lote.append(nota)
+        if len(lote) >= tamanho_lote:
+            _gravar_lote(lote, empresa, setor, usuario, resumo)
+            lote = []
+    if lote:
+        _gravar_lote(lote, empresa, setor, usuario, resumo)
+    return resumo
@@ -0,0 +1,555 @@
+# core/ponto.py
+"""
+Cálculo da folha de ponto.
+
+carregar_folha() busca os RegistroPonto e AbonoDia de um usuário num
+intervalo de datas com duas consultas por faixa (data_hora e data) e agrupa
+tudo por dia local. A partir da folha carregada, resumo_periodo() e
+presenca_diaria() calculam horas, faltas, abonos e as cores do gráfico sem
+voltar ao banco, para qualquer usuário e qualquer período contido nela.
+
+Os totais também são mantidos de forma incremental: cada ponto ou abono
+chama atualizar_dia(), que recalcula só aquele dia (ResumoDiario) e soma a
+diferença no ResumoMensal do período. Assim os saldos do mês e do ano são
+leituras diretas. Períodos encerrados são congelados pelo comando
+fechar_periodo, que também lança o saldo do período no banco de horas
+(core/banco_horas.py).
+
+Dias úteis, feriados e horas esperadas vêm de core/calendario.py.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .banco_horas import lancar_fechamento
+from .calendario import dias_uteis, eh_dia_util, feriados_entre, horas_esperadas
+from .models import AbonoDia, JornadaTrabalho, RegistroPonto, ResumoDiario, ResumoMensal
+
+TIPOS_PONTO = ('entrada', 'saida', 'inicio_almoco', 'fim_almoco')
+
+
+def intervalo_local(inicio, fim):
+    """
+    Datas locais [inicio, fim] -> (início, fim exclusivo) em UTC, para
+    filtrar data_hora por faixa (data_hora__gte / data_hora__lt).
+
+    Nunca use data_hora__date: no PostgreSQL ele vira
+    (data_hora AT TIME ZONE ...)::date, que não usa o índice
+    (usuario, data_hora). A faixa é convertida uma vez e o banco faz um
+    range scan no índice.
+    """
+    return (
+        timezone.make_aware(datetime.combine(inicio, time.min)).astimezone(dt_timezone.utc),
+        timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min)).astimezone(dt_timezone.utc),
+    )
+
+
+def pontos_no_periodo(inicio, fim, **filtros):
+    """RegistroPonto com data_hora nos dias locais [inicio, fim], mais os filtros dados (ex: usuario=...)."""
+    desde, ate = intervalo_local(inicio, fim)
+    return RegistroPonto.objects.filter(data_hora__gte=desde, data_hora__lt=ate, **filtros)
+
+
+def pontos_do_dia(data, **filtros):
+    """RegistroPonto do dia local `data`."""
+    return pontos_no_periodo(data, data, **filtros)
+
+
+def periodo_da_data(jornada, data):
+    """
+    Primeiro e último dia do período de apuração que contém `data`,
+    respeitando dia_inicio_mes e dia_fim_mes da jornada (0 = último dia do
+    mês). Ex: início 26 e fim 25 -> de 26/03 a 25/04.
+    """
+    dia_inicio = jornada.dia_inicio_mes
+    dia_fim = jornada.dia_fim_mes
+
+    ano, mes = data.year, data.month
+    if data.day < dia_inicio:
+        ano, mes = (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+    primeiro = date(ano, mes, min(dia_inicio, calendar.monthrange(ano, mes)[1]))
+
+    if dia_fim != 0 and dia_fim < dia_inicio:
+        # Termina no mês seguinte
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    ultimo_do_mes = calendar.monthrange(ano, mes)[1]
+    ultimo = date(ano, mes, min(dia_fim, ultimo_do_mes) if dia_fim else ultimo_do_mes)
+    return primeiro, ultimo
+
+
+def carregar_folha(usuario, inicio, fim):
+    """
+    Registros e abonos do usuário entre as datas locais inicio e fim, em
+    duas consultas.
+
+    Returns:
+        dict: data -> {'pontos': [RegistroPonto em ordem], 'registros':
+            {tipo: data_hora}, 'abono': AbonoDia ou None}
+    """
+    folha = {}
+
+    def dia(data):
+        if data not in folha:
+            folha[data] = {'pontos': [], 'registros': dict.fromkeys(TIPOS_PONTO), 'abono': None}
+        return folha[data]
+
+    pontos = pontos_no_periodo(inicio, fim, usuario=usuario).order_by('data_hora')
+    for ponto in pontos:
+        registros_dia = dia(timezone.localtime(ponto.data_hora).date())
+        registros_dia['pontos'].append(ponto)
+        registros = registros_dia['registros']
+        # Entrada e início do almoço: o primeiro do dia; saída e fim do almoço: o último
+        if ponto.tipo in ('entrada', 'inicio_almoco'):
+            registros[ponto.tipo] = registros[ponto.tipo] or ponto.data_hora
+        elif ponto.tipo in ('saida', 'fim_almoco'):
+            registros[ponto.tipo] = ponto.data_hora
+
+    for abono in AbonoDia.objects.filter(usuario=usuario, data__gte=inicio, data__lte=fim):
+        dia(abono.data)['abono'] = abono
+    return folha
+
+
+def horas_do_dia(registros):
+    """(horas líquidas, horas de almoço) a partir de {tipo: data_hora}; almoço None se não registrado."""
+    if not (registros['entrada'] and registros['saida']):
+        return 0, None
+    horas = (registros['saida'] - registros['entrada']).total_seconds() / 3600
+    almoco = None
+    if registros['inicio_almoco'] and registros['fim_almoco']:
+        almoco = (registros['fim_almoco'] - registros['inicio_almoco']).total_seconds() / 3600
+        horas -= almoco
+    return horas, almoco
+
+
+def _dias(inicio, fim):
+    dia = inicio
+    while dia <= fim:
+        yield dia
+        dia += timedelta(days=1)
+
+
+def resumo_periodo(folha, jornada, inicio, fim, hoje):
+    """
+    Totais do período [inicio, fim]. Horas esperadas e dias úteis vêm do
+    calendário; da folha só se percorrem os dias com ponto ou abono. Faltas
+    e horas esperadas contam só até `hoje`; a meta é o período inteiro.
+    """
+    limite = min(fim, hoje)
+    resumo = {
+        'horas_trabalhadas': 0, 'horas_abonadas': 0, 'dias_trabalhados': 0,
+        'horas_esperadas': horas_esperadas(jornada, inicio, limite),
+        'horas_meta': horas_esperadas(jornada, inicio, fim),
+    }
+    dias_cobertos = 0
+    for dia, registros_dia in folha.items():
+        if not inicio <= dia <= fim:
+            continue
+        registros = registros_dia['registros']
+        if registros['entrada'] and registros['saida']:
+            resumo['horas_trabalhadas'] += horas_do_dia(registros)[0]
+            resumo['dias_trabalhados'] += 1
+        if registros_dia['abono']:
+            resumo['horas_abonadas'] += float(registros_dia['abono'].horas_abonadas)
+        # Todo dia da folha tem ponto ou abono: não é falta
+        if dia <= limite and eh_dia_util(jornada, dia):
+            dias_cobertos += 1
+
+    resumo['dias_falta'] = dias_uteis(jornada, inicio, limite) - dias_cobertos
+    resumo['saldo_horas'] = resumo['horas_trabalhadas'] + resumo['horas_abonadas'] - resumo['horas_esperadas']
+    return resumo
+
+
+def cor_presenca(horas, esperado, abonado, dia_util):
+    """(classe de cor, percentual) do quadradinho do gráfico de presença."""
+    if abonado:
+        return 'bg-yellow-500/50', 100  # Amarelo: dia abonado
+    if not dia_util:
+        return 'bg-gray-300', 0  # Cinza: dia não útil
+    if horas == 0:
+        return 'bg-red-500/50', 0  # Vermelho: falta
+    percentual = (horas / esperado) * 100 if esperado else 100
+    if percentual >= 100:
+        return 'bg-green-500', percentual
+    if percentual >= 75:
+        return 'bg-green-500/75', percentual
+    if percentual >= 50:
+        return 'bg-green-500/55', percentual
+    if percentual >= 25:
+        return 'bg-green-500/35', percentual
+    return 'bg-green-500/15', percentual
+
+
+def presenca_diaria(folha, jornada, inicio, fim):
+    """Um item por dia de [inicio, fim] para o gráfico de presença."""
+    feriados = feriados_entre(inicio, fim)
+    presenca = []
+    for dia in _dias(inicio, fim):
+        registros_dia = folha.get(dia)
+        abono = registros_dia['abono'] if registros_dia else None
+        horas = horas_do_dia(registros_dia['registros'])[0] if registros_dia else 0
+        if abono:
+            horas = float(abono.horas_abonadas)
+        dia_util = dia.weekday() in jornada.dias_trabalho and dia not in feriados
+        cor, percentual = cor_presenca(horas, jornada.horas_esperadas_dia(dia), abono is not None, dia_util)
+        presenca.append({
+            'dia': dia.strftime('%d/%m'),
+            'presente': horas > 0 or abono is not None,
+            'horas': round(horas, 2),
+            'cor': cor,
+            'percentual': round(percentual, 0),
+            'abonado': abono is not None,
+            'tipo_abono': abono.get_tipo_abono_display() if abono else None,
+            'dia_util': dia_util,
+            'feriado': feriados.get(dia),
+        })
+    return presenca
+
+
+# --- Inconsistências ---
+
+# Estado -> {tipo de ponto esperado: próximo estado}
+TRANSICOES_PONTO = {
+    'fora': {'entrada': 'trabalhando'},
+    'trabalhando': {'inicio_almoco': 'almoco', 'saida': 'fora'},
+    'almoco': {'fim_almoco': 'trabalhando'},
+}
+PROBLEMAS_PONTO = {
+    ('fora', 'saida'): 'saída sem entrada',
+    ('fora', 'inicio_almoco'): 'início do almoço sem entrada',
+    ('fora', 'fim_almoco'): 'fim do almoço sem entrada',
+    ('trabalhando', 'entrada'): 'entrada repetida sem saída',
+    ('trabalhando', 'fim_almoco'): 'fim do almoço sem início',
+    ('almoco', 'entrada'): 'entrada durante o almoço',
+    ('almoco', 'saida'): 'saída sem fim do almoço',
+    ('almoco', 'inicio_almoco'): 'início do almoço repetido',
+}
+PROBLEMAS_FIM_DO_DIA = {
+    'trabalhando': 'entrada sem saída',
+    'almoco': 'início do almoço sem fim',
+}
+
+
+def inconsistencias(pontos):
+    """
+    Percorre os pontos de um dia (em ordem) numa máquina de estados
+    fora -> trabalhando -> almoço -> trabalhando -> fora.
+
+    Args:
+        pontos: iterável de (tipo, data_hora) em ordem de data_hora
+
+    Returns:
+        list[str]: descrição de cada sequência inválida, vazia se o dia está certo
+    """
+    estado = 'fora'
+    problemas = []
+    for tipo, data_hora in pontos:
+        proximo = TRANSICOES_PONTO[estado].get(tipo)
+        if proximo is None:
+            problemas.append(f"{PROBLEMAS_PONTO[(estado, tipo)]} às {timezone.localtime(data_hora):%H:%M}")
+            # Segue a partir do que o ponto indica, para não repetir o mesmo erro nos seguintes
+            proximo = {'entrada': 'trabalhando', 'fim_almoco': 'trabalhando',
+                       'inicio_almoco': 'almoco', 'saida': 'fora'}[tipo]
+        estado = proximo
+    if estado in PROBLEMAS_FIM_DO_DIA:
+        problemas.append(PROBLEMAS_FIM_DO_DIA[estado])
+    return problemas
+
+
+# --- Resumos incrementais ---
+
+def _horas(valor):
+    return Decimal(str(round(valor, 2)))
+
+
+def valores_do_dia(registros_dia, jornada, data):
+    """Campos do ResumoDiario de um dia da folha; None se o dia não tem ponto nem abono."""
+    if not registros_dia or not (registros_dia['pontos'] or registros_dia['abono']):
+        return None
+    dia_util = eh_dia_util(jornada, data)
+    abono = registros_dia['abono']
+    return {
+        'horas_trabalhadas': _horas(horas_do_dia(registros_dia['registros'])[0]),
+        'horas_abonadas': abono.horas_abonadas if abono else Decimal('0'),
+        'horas_esperadas': _horas(jornada.horas_esperadas_dia(data)) if dia_util else Decimal('0'),
+        'dia_util': dia_util,
+        'presente': bool(registros_dia['pontos']),
+        'abonado': abono is not None,
+    }
+
+
+def recalcular_periodo(resumo, jornada):
+    """
+    Refaz do zero os resumos diários e os totais de um período a partir dos
+    registros (usado ao criar o período e antes de fechá-lo).
+    """
+    folha = carregar_folha(resumo.usuario, resumo.data_inicio, resumo.data_fim)
+    dias = []
+    for data, registros_dia in folha.items():
+        valores = valores_do_dia(registros_dia, jornada, data)
+        if valores:
+            dias.append(ResumoDiario(usuario=resumo.usuario, data=data, **valores))
+
+    with transaction.atomic():
+        ResumoDiario.objects.filter(
+            usuario=resumo.usuario, data__gte=resumo.data_inicio, data__lte=resumo.data_fim,
+        ).delete()
+        ResumoDiario.objects.bulk_create(dias)
+        resumo.horas_trabalhadas = sum((d.horas_trabalhadas for d in dias), Decimal('0'))
+        resumo.horas_abonadas = sum((d.horas_abonadas for d in dias), Decimal('0'))
+        resumo.horas_esperadas = _horas(horas_esperadas(jornada, resumo.data_inicio, resumo.data_fim))
+        resumo.saldo_horas = resumo.horas_trabalhadas + resumo.horas_abonadas - resumo.horas_esperadas
+        resumo.dias_presentes = sum(1 for d in dias if d.presente)
+        resumo.save()
+    return resumo
+
+
+def resumo_do_periodo(usuario, jornada, data):
+    """
+    ResumoMensal do período que contém `data`. É criado (e calculado a
+    partir dos registros) na primeira vez; se a configuração de período do
+    funcionário mudou, um período ainda aberto é recalculado com as novas datas.
+    """
+    inicio, fim = periodo_da_data(jornada, data)
+    resumo, criado = ResumoMensal.objects.get_or_create(
+        usuario=usuario, mes=fim.month, ano=fim.year,
+        defaults={'data_inicio': inicio, 'data_fim': fim},
+    )
+    if not resumo.fechado and (criado or (resumo.data_inicio, resumo.data_fim) != (inicio, fim)):
+        resumo.data_inicio, resumo.data_fim = inicio, fim
+        recalcular_periodo(resumo, jornada)
+    return resumo
+
+
+def recalcular_periodos_abertos(usuario=None):
+    """
+    Recalcula todos os períodos ainda abertos (só os de `usuario`, se
+    informado). Usado quando um Feriado é criado, alterado ou excluído, já
+    que muda dias úteis e horas esperadas, e quando um funcionário passa a
+    controlar ponto.
+    """
+    resumos = ResumoMensal.objects.filter(fechado=False).select_related('usuario')
+    if usuario is not None:
+        resumos = resumos.filter(usuario=usuario)
+    resumos = list(resumos)
+    jornadas = {
+        j.usuario_id: j
+        for j in JornadaTrabalho.objects.filter(usuario_id__in=[r.usuario_id for r in resumos])
+    }
+    for resumo in resumos:
+        jornada = jornadas.get(resumo.usuario_id) or JornadaTrabalho(usuario=resumo.usuario)
+        recalcular_periodo(resumo, jornada)
+    return len(resumos)
+
+
+def periodo_fechado(usuario, data):
+    """True se `data` pertence a um período já fechado do usuário."""
+    return ResumoMensal.objects.filter(
+        usuario=usuario, fechado=True, data_inicio__lte=data, data_fim__gte=data,
+    ).exists()
+
+
+def atualizar_dia(usuario, data, jornada):
+    """
+    Recalcula o ResumoDiario de `data` e aplica a diferença no ResumoMensal
+    do período. Chamado depois de registrar um ponto ou criar/remover um
+    abono; não faz nada em períodos fechados.
+    """
+    with transaction.atomic():
+        resumo = resumo_do_periodo(usuario, jornada, data)
+        resumo = ResumoMensal.objects.select_for_update().get(pk=resumo.pk)
+        if resumo.fechado:
+            return resumo
+
+        novo = valores_do_dia(carregar_folha(usuario, data, data).get(data), jornada, data)
+        antigo = ResumoDiario.objects.filter(usuario=usuario, data=data).first()
+        zero = {'horas_trabalhadas': Decimal('0'), 'horas_abonadas': Decimal('0'), 'presente': False}
+        antes = {campo: getattr(antigo, campo) for campo in zero} if antigo else zero
+        depois = novo or zero
+
+        if novo is None:
+            if antigo:
+                antigo.delete()
+        else:
+            ResumoDiario.objects.update_or_create(usuario=usuario, data=data, defaults=novo)
+
+        delta_trabalhadas = depois['horas_trabalhadas'] - antes['horas_trabalhadas']
+        delta_abonadas = depois['horas_abonadas'] - antes['horas_abonadas']
+        ResumoMensal.objects.filter(pk=resumo.pk).update(
+            horas_trabalhadas=F('horas_trabalhadas') + delta_trabalhadas,
+            horas_abonadas=F('horas_abonadas') + delta_abonadas,
+            saldo_horas=F('saldo_horas') + delta_trabalhadas + delta_abonadas,
+            dias_presentes=F('dias_presentes') + (int(depois['presente']) - int(antes['presente'])),
+        )
+    resumo.refresh_from_db()
+    return resumo
+
+
+def fechar_periodo(resumo, jornada):
+    """Recalcula o período a partir dos registros, conta as faltas, o congela e lança o saldo no banco de horas."""
+    with transaction.atomic():
+        recalcular_periodo(resumo, jornada)
+        cobertos = ResumoDiario.objects.filter(
+            usuario=resumo.usuario, data__gte=resumo.data_inicio, data__lte=resumo.data_fim, dia_util=True,
+        ).count()
+        resumo.dias_ausentes = dias_uteis(jornada, resumo.data_inicio, resumo.data_fim) - cobertos
+        resumo.fechado = True
+        resumo.fechado_em = timezone.now()
+        resumo.save(update_fields=['dias_ausentes', 'fechado', 'fechado_em'])
+        lancar_fechamento(resumo)
+    return resumo
+
+
+def saldos(usuario, jornada, hoje):
+    """
+    Saldo do período atual (até hoje) e do ano, lidos dos resumos.
+
+    Returns:
+        (saldo do período, saldo do ano) em horas
+    """
+    resumo = resumo_do_periodo(usuario, jornada, hoje)
+    esperadas_ate_hoje = horas_esperadas(jornada, resumo.data_inicio, min(hoje, resumo.data_fim))
+    saldo_periodo = float(resumo.horas_trabalhadas + resumo.horas_abonadas) - esperadas_ate_hoje
+    anteriores = ResumoMensal.objects.filter(
+        usuario=usuario, ano=resumo.ano, data_fim__lt=resumo.data_inicio,
+    ).aggregate(total=Sum('saldo_horas'))['total'] or 0
+    return saldo_periodo, float(anteriores) + saldo_periodo
+
+
+# --- Relatório da equipe ---
+
+def relatorio_equipe(usuarios, inicio, fim, hoje):
+    """
+    Totais do período [inicio, fim] para vários usuários, com uma consulta
+    agrupada por usuário e dia em RegistroPonto e uma em AbonoDia.
+
+    O banco devolve uma linha por usuário-dia já com a primeira entrada, a
+    última saída e o almoço; as horas saem dessas quatro colunas numa única
+    passada, sem carregar os registros individuais.
+
+    Returns:
+        list[dict]: uma linha por usuário, na ordem de `usuarios`
+    """
+    usuarios = list(usuarios)
+    ids = [u.pk for u in usuarios]
+    jornadas = {j.usuario_id: j for j in JornadaTrabalho.objects.filter(usuario_id__in=ids)}
+    limite = min(fim, hoje)
+
+    linhas = {}
+    for usuario in usuarios:
+        jornada = jornadas.get(usuario.pk) or JornadaTrabalho(usuario=usuario)
+        linhas[usuario.pk] = {
+            'usuario': usuario,
+            'jornada': jornada,
+            'horas_trabalhadas': 0.0,
+            'horas_abonadas': 0.0,
+            'horas_esperadas': horas_esperadas(jornada, inicio, limite),
+            'dias_trabalhados': 0,
+            'dias_abonados': 0,
+            'dias_cobertos': set(),
+        }
+
+    dias_com_ponto = (
+        pontos_no_periodo(inicio, fim, usuario_id__in=ids)
+        .annotate(dia=TruncDate('data_hora'))
+        .values('usuario_id', 'dia')
+        .annotate(
+            entrada=Min('data_hora', filter=Q(tipo='entrada')),
+            saida=Max('data_hora', filter=Q(tipo='saida')),
+            inicio_almoco=Min('data_hora', filter=Q(tipo='inicio_almoco')),
+            fim_almoco=Max('data_hora', filter=Q(tipo='fim_almoco')),
+        )
+        .order_by()
+        .values_list('usuario_id', 'dia', 'entrada', 'saida', 'inicio_almoco', 'fim_almoco')
+    )
+    for usuario_id, dia, entrada, saida, inicio_almoco, fim_almoco in dias_com_ponto:
+        linha = linhas[usuario_id]
+        linha['dias_cobertos'].add(dia)
+        if entrada and saida:
+            horas = (saida - entrada).total_seconds()
+            if inicio_almoco and fim_almoco:
+                horas -= (fim_almoco - inicio_almoco).total_seconds()
+            linha['horas_trabalhadas'] += horas / 3600
+            linha['dias_trabalhados'] += 1
+
+    abonos = AbonoDia.objects.filter(
+        usuario_id__in=ids, data__gte=inicio, data__lte=fim,
+    ).values_list('usuario_id', 'data', 'horas_abonadas')
+    for usuario_id, dia, horas in abonos:
+        linha = linhas[usuario_id]
+        linha['dias_cobertos'].add(dia)
+        linha['horas_abonadas'] += float(horas)
+        linha['dias_abonados'] += 1
+
+    resultado = []
+    for usuario in usuarios:
+        linha = linhas[usuario.pk]
+        jornada, cobertos = linha.pop('jornada'), linha.pop('dias_cobertos')
+        # Faltas: dias úteis até hoje sem ponto nem abono
+        linha['dias_falta'] = dias_uteis(jornada, inicio, limite) - sum(
+            1 for dia in cobertos if dia <= limite and eh_dia_util(jornada, dia)
+        )
+        linha['saldo_horas'] = linha['horas_trabalhadas'] + linha['horas_abonadas'] - linha['horas_esperadas']
+        for campo in ('horas_trabalhadas', 'horas_abonadas', 'horas_esperadas', 'saldo_horas'):
+            linha[campo] = round(linha[campo], 2)
+        resultado.append(linha)
+    return resultado
+
+
+# --- Exportação para a folha de pagamento ---
+
+COLUNAS_FOLHA = [
+    'Usuário', 'Nome', 'Início do Período', 'Fim do Período',
+    'Horas Esperadas', 'Horas Trabalhadas', 'Horas Abonadas', 'Horas Extras', 'Horas Faltantes',
+    'Dias Presentes', 'Faltas',
+] + [f'Dias {rotulo}' for _, rotulo in AbonoDia.TIPO_ABONO_CHOICES] + ['Banco de Horas']
+
+
+def linhas_folha_pagamento(mes, ano):
+    """
+    Linhas no layout COLUNAS_FOLHA dos períodos fechados que terminam em
+    mes/ano, com duas consultas: os ResumoMensal (já com o lançamento do
+    banco de horas) e os abonos do intervalo, contados por tipo em memória.
+
+    Returns:
+        list[list]: uma linha por funcionário, em ordem de nome
+    """
+    resumos = list(
+        ResumoMensal.objects.filter(mes=mes, ano=ano, fechado=True)
+        .select_related('usuario', 'lancamento_banco_horas')
+        .order_by('usuario__first_name', 'usuario__username')
+    )
+    if not resumos:
+        return []
+
+    abonos = defaultdict(list)
+    for usuario_id, data, tipo in AbonoDia.objects.filter(
+        usuario_id__in=[r.usuario_id for r in resumos],
+        data__gte=min(r.data_inicio for r in resumos),
+        data__lte=max(r.data_fim for r in resumos),
+    ).values_list('usuario_id', 'data', 'tipo_abono'):
+        abonos[usuario_id].append((data, tipo))
+
+    tipos = [tipo for tipo, _ in AbonoDia.TIPO_ABONO_CHOICES]
+    linhas = []
+    for resumo in resumos:
+        dias_por_tipo = dict.fromkeys(tipos, 0)
+        for data, tipo in abonos[resumo.usuario_id]:
+            if resumo.data_inicio <= data <= resumo.data_fim and tipo in dias_por_tipo:
+                dias_por_tipo[tipo] += 1
+        banco = getattr(resumo, 'lancamento_banco_horas', None)
+        usuario = resumo.usuario
+        linhas.append([
+            usuario.username, usuario.get_full_name(), resumo.data_inicio, resumo.data_fim,
+            resumo.horas_esperadas, resumo.horas_trabalhadas, resumo.horas_abonadas,
+            max(resumo.saldo_horas, Decimal('0')), max(-resumo.saldo_horas, Decimal('0')),
+            resumo.dias_presentes, resumo.dias_ausentes,
+            *dias_por_tipo.values(),
+            banco.saldo if banco else None,
+        ])
+    return linhas
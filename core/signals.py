@@ -0,0 +1,53 @@
+# core/signals.py
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .imagens import CAMPOS_IMAGEM, agendar_renditions
+
+# Modelo -> campos de imagem, preenchido em conectar_sinais()
+_campos_por_modelo = {}
+
+
+def _gerar_renditions_apos_salvar(sender, instance, raw=False, **kwargs):
+    """Agenda as renditions das imagens novas ou trocadas no registro salvo."""
+    if raw:
+        return
+    for campo in _campos_por_modelo[sender]:
+        agendar_renditions(getattr(instance, campo))
+
+
+def _feriado_alterado(sender, instance, raw=False, **kwargs):
+    """Feriados mudam dias úteis e horas esperadas: limpa o cache e recalcula os períodos abertos."""
+    if raw:
+        return
+    from .calendario import limpar_cache_feriados
+    from .ponto import recalcular_periodos_abertos
+
+    limpar_cache_feriados()
+    transaction.on_commit(recalcular_periodos_abertos)
+
+
+def _local_ponto_alterado(sender, instance, raw=False, **kwargs):
+    """Os polígonos ficam em memória: recarrega no próximo ponto."""
+    from .geolocalizacao import limpar_cache_locais
+    limpar_cache_locais()
+
+
+def conectar_sinais():
+    for nome_modelo, campos in CAMPOS_IMAGEM:
+        modelo = apps.get_model('core', nome_modelo)
+        _campos_por_modelo[modelo] = campos
+        post_save.connect(
+            _gerar_renditions_apos_salvar,
+            sender=modelo,
+            dispatch_uid=f'renditions_{nome_modelo}',
+        )
+
+    feriado = apps.get_model('core', 'Feriado')
+    post_save.connect(_feriado_alterado, sender=feriado, dispatch_uid='feriado_salvo')
+    post_delete.connect(_feriado_alterado, sender=feriado, dispatch_uid='feriado_excluido')
+
+    local_ponto = apps.get_model('core', 'LocalPonto')
+    post_save.connect(_local_ponto_alterado, sender=local_ponto, dispatch_uid='local_ponto_salvo')
+    post_delete.connect(_local_ponto_alterado, sender=local_ponto, dispatch_uid='local_ponto_excluido')
@@ -225,36 +225,6 @@ class GeolocationManager {
         }
     }
 
-    // Obter endereço a partir de coordenadas (requer API externa)
-    async getAddressFromCoordinates(lat, lon) {
-        try {
-            // Usando Nominatim (OpenStreetMap) - gratuito mas com rate limit
-            const response = await fetch(
-                `https://nominatim.openstreetmap.org/reverse?format=json&lat=${lat}&lon=${lon}&zoom=18&addressdetails=1`,
-                {
-                    headers: {
-                        'User-Agent': 'Blockline-PWA'
-                    }
-                }
-            );
-
-            const data = await response.json();
-
-            return {
-                street: data.address.road || '',
-                number: data.address.house_number || '',
-                neighborhood: data.address.suburb || data.address.neighbourhood || '',
-                city: data.address.city || data.address.town || '',
-                state: data.address.state || '',
-                country: data.address.country || '',
-                formatted: data.display_name
-            };
-        } catch (error) {
-            console.error('Erro ao obter endereço:', error);
-            return null;
-        }
-    }
-
     // Abrir localização no Google Maps
     openInMaps(lat = null, lon = null) {
         const latitude = lat || this.currentPosition?.latitude;
@@ -368,8 +338,18 @@ class PontoGeolocation {
                 formElement.appendChild(lonInput);
             }
 
+            // Precisão em metros: o servidor recusa leituras imprecisas
+            let precisaoInput = formElement.querySelector('input[name="precisao"]');
+            if (!precisaoInput) {
+                precisaoInput = document.createElement('input');
+                precisaoInput.type = 'hidden';
+                precisaoInput.name = 'precisao';
+                formElement.appendChild(precisaoInput);
+            }
+
             latInput.value = position.latitude;
             lonInput.value = position.longitude;
+            precisaoInput.value = Math.round(position.accuracy);
 
             console.log('📍 Localização adicionada ao formulário:', position);
             return true;
@@ -0,0 +1,26 @@
+// 🖼️ Worker de redução de imagens - Blockline PWA
+// Redimensiona e recodifica em JPEG fora da thread principal (OffscreenCanvas)
+
+self.onmessage = async (event) => {
+    const { id, file, maxWidth, maxHeight, quality } = event.data;
+    try {
+        // imageOrientation aplica a rotação EXIF antes de desenhar
+        const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+        const escala = Math.min(1, maxWidth / bitmap.width, maxHeight / bitmap.height);
+        const largura = Math.round(bitmap.width * escala);
+        const altura = Math.round(bitmap.height * escala);
+
+        const canvas = new OffscreenCanvas(largura, altura);
+        const ctx = canvas.getContext('2d');
+        // Fundo branco para PNGs transparentes (igual ao servidor)
+        ctx.fillStyle = '#FFFFFF';
+        ctx.fillRect(0, 0, largura, altura);
+        ctx.drawImage(bitmap, 0, 0, largura, altura);
+        bitmap.close();
+
+        const blob = await canvas.convertToBlob({ type: 'image/jpeg', quality });
+        self.postMessage({ id, blob });
+    } catch (error) {
+        self.postMessage({ id, error: error.message });
+    }
+};
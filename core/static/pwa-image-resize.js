@@ -0,0 +1,149 @@
+// 🖼️ Redução de imagens antes do upload - Blockline PWA
+// Fotos do celular são redimensionadas e recodificadas em JPEG no aparelho
+// (até 1920x1080, qualidade 0.85) antes do envio. O servidor não recomprime:
+// guarda o arquivo como chegou e gera dele só as versões reduzidas
+// (renditions), então esta é a única redução do original.
+//
+// Uso: <form method="post" enctype="multipart/form-data" data-reduzir-imagens>
+// Opcional: data-max-largura, data-max-altura e data-qualidade no <form>.
+
+// Endereço do worker, ao lado deste script (document.currentScript só existe durante o carregamento)
+const IMAGE_RESIZE_WORKER_URL = (document.currentScript ? document.currentScript.src : '/static/pwa-image-resize.js')
+    .replace('pwa-image-resize.js', 'pwa-image-resize-worker.js');
+
+class ImageResizer {
+    constructor(options = {}) {
+        this.maxWidth = options.maxWidth || 1920;
+        this.maxHeight = options.maxHeight || 1080;
+        this.quality = options.quality || 0.85;
+        this.worker = null;
+        this.pending = new Map();
+        this.nextId = 0;
+    }
+
+    // Worker com OffscreenCanvas quando o navegador suporta
+    supportsWorker() {
+        return typeof OffscreenCanvas !== 'undefined' && typeof Worker !== 'undefined' && 'createImageBitmap' in window;
+    }
+
+    getWorker() {
+        if (!this.worker) {
+            this.worker = new Worker(IMAGE_RESIZE_WORKER_URL);
+            this.worker.onmessage = (event) => {
+                const { id, blob, error } = event.data;
+                const callbacks = this.pending.get(id);
+                this.pending.delete(id);
+                if (!callbacks) return;
+                error ? callbacks.reject(new Error(error)) : callbacks.resolve(blob);
+            };
+        }
+        return this.worker;
+    }
+
+    resizeInWorker(file, options) {
+        return new Promise((resolve, reject) => {
+            const id = this.nextId++;
+            this.pending.set(id, { resolve, reject });
+            this.getWorker().postMessage({ id, file, ...options });
+        });
+    }
+
+    // Fallback na thread principal com <canvas>
+    async resizeInPage(file, { maxWidth, maxHeight, quality }) {
+        const url = URL.createObjectURL(file);
+        try {
+            const img = new Image();
+            img.src = url;
+            await img.decode();
+            const escala = Math.min(1, maxWidth / img.naturalWidth, maxHeight / img.naturalHeight);
+            const canvas = document.createElement('canvas');
+            canvas.width = Math.round(img.naturalWidth * escala);
+            canvas.height = Math.round(img.naturalHeight * escala);
+            const ctx = canvas.getContext('2d');
+            ctx.fillStyle = '#FFFFFF';
+            ctx.fillRect(0, 0, canvas.width, canvas.height);
+            ctx.drawImage(img, 0, 0, canvas.width, canvas.height);
+            return await new Promise((resolve) => canvas.toBlob(resolve, 'image/jpeg', quality));
+        } finally {
+            URL.revokeObjectURL(url);
+        }
+    }
+
+    // Retorna um File reduzido, ou o original se não for imagem ou não ficar menor
+    async resize(file, options = {}) {
+        if (!file.type.startsWith('image/') || file.type === 'image/gif' || file.type === 'image/svg+xml') {
+            return file;
+        }
+        const opts = {
+            maxWidth: options.maxWidth || this.maxWidth,
+            maxHeight: options.maxHeight || this.maxHeight,
+            quality: options.quality || this.quality,
+        };
+
+        let blob;
+        try {
+            blob = this.supportsWorker() ? await this.resizeInWorker(file, opts) : await this.resizeInPage(file, opts);
+        } catch (error) {
+            console.warn('⚠️ Não foi possível reduzir a imagem, enviando original:', error);
+            return file;
+        }
+        if (!blob || blob.size >= file.size) {
+            return file;
+        }
+        const nome = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+        return new File([blob], nome, { type: 'image/jpeg', lastModified: file.lastModified });
+    }
+
+    // Substitui os arquivos de todos os inputs de arquivo do formulário
+    async processForm(form) {
+        const options = {
+            maxWidth: parseInt(form.dataset.maxLargura, 10) || undefined,
+            maxHeight: parseInt(form.dataset.maxAltura, 10) || undefined,
+            quality: parseFloat(form.dataset.qualidade) || undefined,
+        };
+        const inputs = form.querySelectorAll('input[type="file"]');
+        for (const input of inputs) {
+            if (!input.files || input.files.length === 0) continue;
+            const transfer = new DataTransfer();
+            let alterado = false;
+            for (const file of input.files) {
+                const reduzido = await this.resize(file, options);
+                alterado = alterado || reduzido !== file;
+                transfer.items.add(reduzido);
+            }
+            if (alterado) {
+                input.files = transfer.files;
+            }
+        }
+    }
+}
+
+window.imageResizer = new ImageResizer();
+
+// Intercepta o envio dos formulários marcados, reduz as imagens e reenvia.
+// Registrado no <html> (captura): roda depois dos listeners de captura do
+// document, como a trava de uploads retomáveis pela metade, que podem
+// cancelar o envio antes da redução.
+document.documentElement.addEventListener('submit', async (event) => {
+    const form = event.target;
+    if (event.defaultPrevented || !form.hasAttribute('data-reduzir-imagens') || form.dataset.imagensReduzidas === '1') {
+        return;
+    }
+    if (typeof DataTransfer === 'undefined') {
+        return;
+    }
+    event.preventDefault();
+    event.stopImmediatePropagation();
+
+    const submitter = event.submitter;
+    if (submitter) submitter.disabled = true;
+    try {
+        await window.imageResizer.processForm(form);
+    } finally {
+        if (submitter) submitter.disabled = false;
+        form.dataset.imagensReduzidas = '1';
+        form.requestSubmit ? form.requestSubmit(submitter || undefined) : form.submit();
+    }
+}, true);
+
+console.log('🖼️ Redução de imagens carregada');
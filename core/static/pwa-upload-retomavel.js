@@ -0,0 +1,160 @@
+// 📤 Upload retomável - Blockline PWA
+// Arquivos de inputs com data-upload-retomavel são enviados em partes assim
+// que escolhidos. Se a conexão cair, o envio continua de onde parou (inclusive
+// depois de recarregar a página); ao terminar, o formulário envia só o id do
+// upload no campo oculto <nome>_upload, sem reenviar o arquivo.
+
+const UPLOAD_TAMANHO_PARTE = 1024 * 1024;
+const UPLOAD_TENTATIVAS = 8;
+
+class ResumableUploader {
+    constructor() {
+        this.emAndamento = new Set();
+    }
+
+    baseUrl() {
+        const meta = document.querySelector('meta[name="upload-retomavel-url"]');
+        return meta ? meta.content : '/uploads/';
+    }
+
+    csrfToken(form) {
+        const campo = form && form.querySelector('input[name="csrfmiddlewaretoken"]');
+        if (campo) return campo.value;
+        const cookie = document.cookie.split('; ').find((c) => c.startsWith('csrftoken='));
+        return cookie ? cookie.split('=')[1] : '';
+    }
+
+    isSupported() {
+        return !!(window.crypto && crypto.subtle && window.fetch && window.localStorage);
+    }
+
+    async sha256(file) {
+        const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    statusElement(input) {
+        let status = input.parentElement.querySelector('.upload-retomavel-status');
+        if (!status) {
+            status = document.createElement('p');
+            status.className = 'upload-retomavel-status text-xs text-gray-500 mt-1';
+            input.insertAdjacentElement('afterend', status);
+        }
+        return status;
+    }
+
+    hiddenInput(input) {
+        const nome = `${input.name}_upload`;
+        let oculto = input.form.querySelector(`input[name="${nome}"]`);
+        if (!oculto) {
+            oculto = document.createElement('input');
+            oculto.type = 'hidden';
+            oculto.name = nome;
+            input.insertAdjacentElement('afterend', oculto);
+        }
+        return oculto;
+    }
+
+    async request(url, options, form) {
+        const headers = { 'X-CSRFToken': this.csrfToken(form), ...(options.headers || {}) };
+        const resposta = await fetch(url, { credentials: 'same-origin', ...options, headers });
+        let dados = {};
+        try { dados = await resposta.json(); } catch (e) { /* corpo vazio */ }
+        return { status: resposta.status, dados };
+    }
+
+    // Procura um upload anterior do mesmo arquivo para retomar
+    async retomarOuCriar(file, sha, form) {
+        const chave = `upload-retomavel:${sha}:${file.size}`;
+        const salvo = localStorage.getItem(chave);
+        if (salvo) {
+            const { status, dados } = await this.request(`${this.baseUrl()}${salvo}/`, { method: 'GET' }, form);
+            if (status === 200) return { chave, estado: dados };
+            localStorage.removeItem(chave);
+        }
+        const { status, dados } = await this.request(this.baseUrl(), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ nome: file.name, tamanho: file.size, sha256: sha }),
+        }, form);
+        if (status !== 201) throw new Error(dados.erro || 'Não foi possível iniciar o upload');
+        localStorage.setItem(chave, dados.id);
+        return { chave, estado: dados };
+    }
+
+    async enviar(input) {
+        const file = input.files[0];
+        const form = input.form;
+        const status = this.statusElement(input);
+        const oculto = this.hiddenInput(input);
+        oculto.value = '';
+        this.emAndamento.add(input);
+
+        try {
+            status.textContent = '⏳ Preparando envio...';
+            const sha = await this.sha256(file);
+            let { chave, estado } = await this.retomarOuCriar(file, sha, form);
+            let falhas = 0;
+
+            while (!estado.concluido) {
+                const inicio = estado.recebido;
+                const fim = Math.min(inicio + UPLOAD_TAMANHO_PARTE, file.size) - 1;
+                status.textContent = `📤 Enviando ${Math.round((inicio / file.size) * 100)}%`;
+                try {
+                    const { status: codigo, dados } = await this.request(`${this.baseUrl()}${estado.id}/`, {
+                        method: 'PUT',
+                        headers: { 'Content-Range': `bytes ${inicio}-${fim}/${file.size}` },
+                        body: file.slice(inicio, fim + 1),
+                    }, form);
+                    if (codigo === 200 || codigo === 409) {
+                        // 409: o servidor informa de onde continuar
+                        estado = { ...estado, ...dados };
+                        falhas = 0;
+                        continue;
+                    }
+                    throw new Error(dados.erro || `Erro ${codigo}`);
+                } catch (error) {
+                    falhas += 1;
+                    if (falhas > UPLOAD_TENTATIVAS) throw error;
+                    status.textContent = `⚠️ Conexão instável, tentando novamente (${falhas}/${UPLOAD_TENTATIVAS})...`;
+                    await new Promise((r) => setTimeout(r, Math.min(30000, 1000 * 2 ** falhas)));
+                    // Confirma quanto o servidor já recebeu antes de continuar
+                    const atual = await this.request(`${this.baseUrl()}${estado.id}/`, { method: 'GET' }, form).catch(() => null);
+                    if (atual && atual.status === 200) estado = atual.dados;
+                }
+            }
+
+            localStorage.removeItem(chave);
+            oculto.value = estado.id;
+            input.value = '';  // o formulário não reenvia o arquivo
+            status.textContent = `✅ ${file.name} enviado`;
+        } catch (error) {
+            console.error('❌ Erro no upload retomável:', error);
+            status.textContent = `❌ ${error.message}. O arquivo será enviado junto com o formulário.`;
+        } finally {
+            this.emAndamento.delete(input);
+        }
+    }
+}
+
+window.resumableUploader = new ResumableUploader();
+
+document.addEventListener('change', (event) => {
+    const input = event.target;
+    if (!input.matches || !input.matches('input[type="file"][data-upload-retomavel]')) return;
+    if (!input.files || input.files.length === 0 || !input.form) return;
+    if (!window.resumableUploader.isSupported()) return;
+    window.resumableUploader.enviar(input);
+});
+
+// Não deixa enviar o formulário com upload pela metade
+document.addEventListener('submit', (event) => {
+    const pendente = Array.from(window.resumableUploader.emAndamento).some((input) => input.form === event.target);
+    if (pendente) {
+        event.preventDefault();
+        event.stopImmediatePropagation();
+        alert('⏳ Aguarde o envio dos arquivos terminar.');
+    }
+}, true);
+
+console.log('📤 Upload retomável carregado');
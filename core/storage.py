@@ -0,0 +1,197 @@
+# core/storage.py
+"""
+Armazenamento de mídia com deduplicação por conteúdo.
+
+Cada arquivo enviado é gravado uma única vez em
+<blobs>/<2 primeiros caracteres do hash>/<sha256> e o nome usado pelo
+modelo (ex: fotos_documentos/nf.jpg) é um hardlink para esse blob. Assim a
+mesma foto de NF enviada no Recebimento e na Requisição de Compra ocupa o
+disco uma vez só, os nomes e URLs continuam os de sempre (o nginx segue
+servindo MEDIA_ROOT) e o número de links do blob (st_nlink - 1) é a contagem
+de referências: quando o último nome é apagado, o blob também é.
+
+Em sistemas de arquivos sem hardlink (ou com os blobs em outro volume) o
+arquivo é copiado, sem deduplicação, mas tudo continua funcionando.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+def hash_arquivo(caminho):
+    """SHA-256 de um arquivo em disco, lido em blocos."""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+class ArmazenamentoDeduplicado(FileSystemStorage):
+    """FileSystemStorage que guarda o conteúdo endereçado por SHA-256."""
+
+    @cached_property
+    def blobs_root(self):
+        return os.fspath(getattr(settings, 'MEDIA_BLOBS_ROOT', None) or os.path.join(self.location, '.blobs'))
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting in ('MEDIA_ROOT', 'MEDIA_BLOBS_ROOT'):
+            self.__dict__.pop('blobs_root', None)
+
+    def caminho_blob(self, sha256):
+        return os.path.join(self.blobs_root, sha256[:2], sha256)
+
+    def referencias(self, name):
+        """Quantos nomes apontam para o mesmo conteúdo deste arquivo."""
+        return max(os.stat(self.path(name)).st_nlink - 1, 1)
+
+    def _gravar_blob(self, content):
+        """Grava o conteúdo num temporário calculando o hash e move para o blob (se ainda não existir)."""
+        os.makedirs(self.blobs_root, exist_ok=True)
+        sha = hashlib.sha256()
+        descritor, temporario = tempfile.mkstemp(dir=self.blobs_root, prefix='.upload-')
+        try:
+            with os.fdopen(descritor, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for bloco in content.chunks():
+                    sha.update(bloco)
+                    destino.write(bloco)
+            blob = self.caminho_blob(sha.hexdigest())
+            if os.path.exists(blob):
+                os.remove(temporario)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporario, self.file_permissions_mode)
+                os.replace(temporario, blob)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return blob
+
+    def _vincular(self, origem, name):
+        """
+        Cria o nome apontando para o arquivo de origem (hardlink). Se o nome
+        já estiver em uso, escolhe outro, como o FileSystemStorage faz.
+        """
+        while True:
+            caminho = self.path(name)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            try:
+                os.link(origem, caminho)
+                return name
+            except FileExistsError:
+                name = self.get_available_name(name)
+            except OSError:
+                # Sem suporte a hardlink: cópia comum
+                if os.path.exists(caminho):
+                    name = self.get_available_name(name)
+                    continue
+                shutil.copyfile(origem, caminho)
+                return name
+
+    def _adotar_blob(self, caminho_local, sha256):
+        """
+        Usa como blob um arquivo local cujo hash já é conhecido (upload
+        retomável montado e conferido), por hardlink e sem reler o conteúdo.
+        """
+        blob = self.caminho_blob(sha256)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(caminho_local, blob)
+            except FileExistsError:
+                pass
+            except OSError:
+                temporario = f'{blob}.tmp{os.getpid()}'
+                shutil.copyfile(caminho_local, temporario)
+                os.replace(temporario, blob)
+        return blob
+
+    def _save(self, name, content):
+        sha256 = getattr(content, 'sha256', None)
+        caminho_local = getattr(content, 'caminho_local', None)
+        if sha256 and caminho_local:
+            blob = self._adotar_blob(caminho_local, sha256)
+            # O conteúdo não foi lido; fecha o arquivo que o ArquivoDeUpload abriu
+            content.close()
+        else:
+            blob = self._gravar_blob(content)
+        return self._vincular(blob, name).replace('\\', '/')
+
+    def duplicar(self, name, novo_name=None):
+        """
+        Cria outro nome para o mesmo conteúdo sem ler nem copiar os bytes.
+        Retorna o novo nome.
+        """
+        origem = self.path(name)
+        novo_name = self.get_available_name(novo_name or name)
+        return self._vincular(origem, novo_name).replace('\\', '/')
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        caminho = self.path(name)
+        blob = None
+        try:
+            # Último nome do conteúdo (o outro link é o próprio blob): o blob sai junto
+            if os.stat(caminho).st_nlink == 2:
+                blob = self.caminho_blob(hash_arquivo(caminho))
+                if not (os.path.exists(blob) and os.path.samefile(blob, caminho)):
+                    blob = None
+        except FileNotFoundError:
+            return
+        super().delete(name)
+        if blob:
+            try:
+                os.remove(blob)
+            except FileNotFoundError:
+                pass
+
+    def blobs_orfaos(self):
+        """Gera os caminhos de blobs que não têm mais nenhuma referência."""
+        if not os.path.isdir(self.blobs_root):
+            return
+        for prefixo in os.scandir(self.blobs_root):
+            if not prefixo.is_dir():
+                continue
+            for blob in os.scandir(prefixo.path):
+                if blob.is_file() and blob.stat().st_nlink == 1:
+                    yield blob.path
+
+    def limpar_blobs_orfaos(self):
+        """Apaga os blobs sem referência e retorna (quantidade, bytes liberados)."""
+        quantidade = liberados = 0
+        for caminho in self.blobs_orfaos():
+            liberados += os.path.getsize(caminho)
+            os.remove(caminho)
+            quantidade += 1
+        return quantidade, liberados
+
+
+class ArmazenamentoProtegido(ArmazenamentoDeduplicado):
+    """
+    Para documentos sensíveis (boletos, notas fiscais, comprovantes): os
+    arquivos ficam no mesmo MEDIA_ROOT, mas a URL aponta para a view
+    midia_protegida, que confere o acesso antes de entregar o arquivo.
+    """
+
+    def url(self, name):
+        from django.urls import reverse
+
+        return reverse('midia_protegida', args=[name])
+
+
+def armazenamento_protegido():
+    """Storage dos FileFields protegidos (callable, para não congelar a instância nas migrations)."""
+    return ArmazenamentoProtegido()
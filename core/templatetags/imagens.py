@@ -0,0 +1,47 @@
+from django import template
+from django.utils.html import format_html
+
+from core.imagens import placeholder_atual, url_miniatura, url_rendition
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(field_file, tamanho='thumb', formato='webp'):
+    """
+    URL de uma versão reduzida da imagem.
+
+    Uso: <img src="{% rendition item.foto_principal 'thumb' %}">
+    Tamanhos: thumb, medium, large. Formatos: webp (padrão), jpeg.
+    """
+    return url_rendition(field_file, tamanho, formato)
+
+
+@register.simple_tag
+def miniatura(field_file, tamanho='thumb', formato='webp'):
+    """
+    URL da miniatura servida pelo endpoint com cache em disco e cabeçalhos
+    de cache imutável. Ideal para galerias vistas repetidamente.
+
+    Uso: <img src="{% miniatura imagem.imagem 'medium' %}">
+    """
+    return url_miniatura(field_file, tamanho, formato)
+
+
+@register.simple_tag
+def placeholder(field_file):
+    """
+    Atributos de carregamento preguiçoso para um <img>: loading="lazy",
+    largura e altura do original e a prévia borrada como fundo enquanto a
+    imagem não chega. Sem prévia calculada, só loading e decoding.
+
+    Uso: <img src="{% rendition produto.foto_principal 'thumb' %}" {% placeholder produto.foto_principal %}>
+    """
+    atributos = format_html('loading="lazy" decoding="async"')
+    previa = placeholder_atual(field_file)
+    if previa is None:
+        return atributos
+    return format_html(
+        '{} width="{}" height="{}" style="background-image: url({}); background-size: cover; background-position: center;"',
+        atributos, previa['largura'], previa['altura'], previa['lqip'],
+    )
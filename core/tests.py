@@ -1,3 +1,893 @@
-from django.test import TestCase
-
-# Create your tests here.
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .banco_horas import (
+    SaldoInsuficiente, creditos_a_vencer, expirar_creditos, lancar, lancar_fechamento, saldo_atual, somar_meses,
+)
+from .calendario import (
+    contagem_dias_semana, dias_uteis, feriados_do_ano, horas_esperadas, limpar_cache_feriados,
+)
+from .estoque import EstoqueInsuficiente, aplicar_deltas_estoque, reconciliar_estoque, somar_por_item
+from .forms import DocumentoExpedicaoForm
+from .geolocalizacao import areas_do_usuario, limpar_cache_locais, localizar, validar_localizacao
+from .imagens import obter_miniatura
+from .models import (
+    AbonoDia, Cliente, Empresa, Expedicao, Feriado, Fornecedor, ItemEstoque, ItemExpedido, ItemFornecedor,
+    ItemRecebido, JornadaTrabalho, LancamentoBancoHoras, LocalPonto, MovimentacaoEstoque, Notificacao, PerfilUsuario,
+    ProdutoFabricado, Recebimento, RegistroPonto, ResumoDiario, ResumoMensal, Setor, UploadParcial,
+)
+from .nfe import importar_nfe, ler_nfe
+from .ponto import atualizar_dia, fechar_periodo, recalcular_periodo, resumo_do_periodo
+from .uploads import UploadInvalido, caminho_temporario, gravar_parte, iniciar_upload, obter_arquivo_de_upload
+
+
+def _url(nome, *args):
+    # O cliente de teste chama as views sem o prefixo de FORCE_SCRIPT_NAME;
+    # os redirecionamentos gerados pelas views continuam com ele
+    return reverse(nome, args=args).replace('/blockline', '', 1)
+
+
+class BaixaEstoqueTests(TestCase):
+    def setUp(self):
+        self.parafuso = ItemEstoque.objects.create(nome='Parafuso', quantidade=10)
+        self.porca = ItemEstoque.objects.create(nome='Porca', quantidade=5)
+
+    def test_soma_linhas_por_item(self):
+        linhas = [(self.parafuso.pk, 2), (self.porca.pk, 1), (self.parafuso.pk, 3), (None, 7)]
+        self.assertEqual(somar_por_item(linhas), {self.parafuso.pk: 5, self.porca.pk: 1})
+
+    def test_baixa_e_devolucao_em_lote(self):
+        aplicar_deltas_estoque({self.parafuso.pk: 4, self.porca.pk: -2}, observacoes='teste')
+
+        self.parafuso.refresh_from_db()
+        self.porca.refresh_from_db()
+        self.assertEqual(self.parafuso.quantidade, 6)
+        self.assertEqual(self.porca.quantidade, 7)
+        movimentacoes = dict(MovimentacaoEstoque.objects.values_list('item_id', 'tipo'))
+        self.assertEqual(movimentacoes, {self.parafuso.pk: 'saida', self.porca.pk: 'entrada'})
+
+    def test_baixa_do_estoque_inteiro(self):
+        aplicar_deltas_estoque({self.parafuso.pk: 10})
+        self.parafuso.refresh_from_db()
+        self.assertEqual(self.parafuso.quantidade, 0)
+
+    def test_estoque_insuficiente_nao_altera_nada(self):
+        with self.assertRaises(EstoqueInsuficiente) as erro:
+            aplicar_deltas_estoque({self.parafuso.pk: 3, self.porca.pk: 6})
+
+        self.assertEqual(erro.exception.faltas, [('Porca', 5, 6)])
+        self.parafuso.refresh_from_db()
+        self.porca.refresh_from_db()
+        self.assertEqual((self.parafuso.quantidade, self.porca.quantidade), (10, 5))
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+    def test_update_condicional_barra_baixa_concorrente(self):
+        # Quantidade lida antes de outra baixa ser gravada (como se a trava não valesse)
+        lidos = list(ItemEstoque.objects.filter(pk=self.porca.pk).only('id', 'nome', 'quantidade'))
+        ItemEstoque.objects.filter(pk=self.porca.pk).update(quantidade=1)
+
+        with mock.patch('core.estoque.ItemEstoque.objects.select_for_update') as travar:
+            travar.return_value.filter.return_value.order_by.return_value.only.return_value = lidos
+            with self.assertRaises(EstoqueInsuficiente):
+                aplicar_deltas_estoque({self.porca.pk: 3})
+
+        self.porca.refresh_from_db()
+        self.assertEqual(self.porca.quantidade, 1)
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+    def test_reconciliar_aplica_so_a_diferenca(self):
+        antigas = {self.parafuso.pk: 4, self.porca.pk: 2}
+        novas = {self.parafuso.pk: 6}
+        reconciliar_estoque(antigas, novas)
+
+        self.parafuso.refresh_from_db()
+        self.porca.refresh_from_db()
+        # +2 parafusos saem; as 2 porcas removidas voltam
+        self.assertEqual((self.parafuso.quantidade, self.porca.quantidade), (8, 7))
+
+    def test_reconciliar_sem_mudanca_nao_movimenta(self):
+        reconciliar_estoque({self.parafuso.pk: 4}, {self.parafuso.pk: 4})
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+
+NFE_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">
+  <NFe>
+    <infNFe Id="NFe{chave}" versao="4.00">
+      <ide><serie>1</serie><nNF>{numero}</nNF><dhEmi>2026-09-01T10:00:00-03:00</dhEmi></ide>
+      <emit><CNPJ>12.345.678/0001-90</CNPJ><xNome>Parafusos Ltda</xNome></emit>
+      <det nItem="1">
+        <prod><cProd>P-10</cProd><xProd>Parafuso M10</xProd><uCom>UN</uCom>
+          <qCom>100.0000</qCom><vUnCom>0.50</vUnCom><vProd>50.00</vProd></prod>
+      </det>
+      <det nItem="2">
+        <prod><cProd>P-12</cProd><xProd>Porca M12</xProd><uCom>UN</uCom>
+          <qCom>20.0000</qCom><vUnCom>1.00</vUnCom><vProd>20.00</vProd></prod>
+      </det>
+      <total><ICMSTot><vProd>70.00</vProd><vNF>70.00</vNF></ICMSTot></total>
+    </infNFe>
+  </NFe>
+  <protNFe versao="4.00"><infProt><chNFe>{chave}</chNFe></infProt></protNFe>
+</nfeProc>
+'''
+
+
+def _nfe(numero):
+    chave = f'3526091234567800019055001{numero:09d}1000000000'[:44]
+    return NFE_XML.format(chave=chave, numero=numero).encode(), chave
+
+
+class ImportacaoNfeTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('almoxarife')
+        self.empresa = Empresa.objects.create(nome='Blockline')
+        self.setor = Setor.objects.create(empresa=self.empresa, nome='Almoxarifado')
+        fornecedor = Fornecedor.objects.create(empresa=self.empresa, nome='Parafusos Ltda', cnpj='12345678000190')
+        self.parafuso = ItemEstoque.objects.create(nome='Parafuso M10', quantidade=0)
+        ItemFornecedor.objects.create(
+            item_estoque=self.parafuso, fornecedor=fornecedor, codigo_produto='P-10',
+            valor_pago=Decimal('0.50'), data_cotacao=date(2026, 9, 1),
+        )
+
+    def _importar(self, conteudo, nome='nota.xml'):
+        return importar_nfe(io.BytesIO(conteudo), self.empresa, self.setor, self.usuario, nome=nome)
+
+    def test_le_cabecalho_e_itens(self):
+        conteudo, chave = _nfe(101)
+        nota = ler_nfe(io.BytesIO(conteudo))
+        self.assertEqual((nota['chave'], nota['numero'], nota['serie']), (chave, '101', '1'))
+        self.assertEqual((nota['cnpj_emitente'], nota['valor_total']), ('12345678000190', Decimal('70.00')))
+        self.assertEqual(
+            [(item['codigo'], item['quantidade'], item['valor_total']) for item in nota['itens']],
+            [('P-10', Decimal('100'), Decimal('50.00')), ('P-12', Decimal('20'), Decimal('20.00'))],
+        )
+
+    def test_xml_avulso_e_reimportacao(self):
+        conteudo, chave = _nfe(101)
+        resumo = self._importar(conteudo)
+        self.assertEqual((resumo['importadas'], resumo['itens'], resumo['itens_vinculados']), (1, 2, 1))
+
+        recebimento = Recebimento.objects.get(chave_acesso=chave)
+        self.assertEqual(recebimento.fornecedor.cnpj, '12345678000190')
+        self.assertEqual(
+            ItemRecebido.objects.get(recebimento=recebimento, codigo_produto='P-10').item_estoque, self.parafuso,
+        )
+
+        resumo = self._importar(conteudo)
+        self.assertEqual((resumo['importadas'], resumo['duplicadas']), (0, 1))
+        self.assertEqual(Recebimento.objects.count(), 1)
+
+    def test_zip_com_membro_corrompido(self):
+        pacote = io.BytesIO()
+        with zipfile.ZipFile(pacote, 'w', zipfile.ZIP_STORED) as zip_saida:
+            zip_saida.writestr('notas/101.xml', _nfe(101)[0])
+            zip_saida.writestr('notas/102.xml', _nfe(102)[0])
+            zip_saida.writestr('notas/103.xml', _nfe(103)[0])
+            zip_saida.writestr('notas/invalida.xml', b'<nfeProc><NFe>')
+            zip_saida.writestr('leia-me.txt', b'ignorado')
+        conteudo = bytearray(pacote.getvalue())
+        # Estraga um byte do conteúdo da 102: o CRC deixa de conferir
+        posicao = conteudo.index(b'Parafuso M10', conteudo.index(b'<nNF>102</nNF>'))
+        conteudo[posicao] ^= 0xFF
+
+        resumo = self._importar(bytes(conteudo), nome='notas.zip')
+
+        self.assertEqual(resumo['importadas'], 2)
+        self.assertEqual(
+            sorted(erro.split(':', 1)[0] for erro in resumo['erros']), ['notas/102.xml', 'notas/invalida.xml'],
+        )
+        self.assertEqual(
+            sorted(Recebimento.objects.values_list('numero_nota_fiscal', flat=True)), ['101', '103'],
+        )
+
+
+class ExpedicaoEstoqueTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('expedidor', password='x')
+        self.client.force_login(self.usuario)
+        self.empresa = Empresa.objects.create(nome='Blockline')
+        self.item = ItemEstoque.objects.create(nome='Bloco', tipo='produto_acabado', quantidade=10)
+        self.produto = ProdutoFabricado.objects.create(nome='Bloco', item_associado=self.item)
+
+    def _dados(self, linhas, iniciais=0, **extra):
+        dados = {
+            'cliente_nome': 'Obra Centro',
+            'itens-TOTAL_FORMS': str(len(linhas)),
+            'itens-INITIAL_FORMS': str(iniciais),
+            'documentos-TOTAL_FORMS': '0',
+            'documentos-INITIAL_FORMS': '0',
+            'imagens-TOTAL_FORMS': '0',
+            'imagens-INITIAL_FORMS': '0',
+            **extra,
+        }
+        for i, linha in enumerate(linhas):
+            for campo, valor in linha.items():
+                dados[f'itens-{i}-{campo}'] = valor
+        return dados
+
+    def _estoque(self):
+        self.item.refresh_from_db()
+        return self.item.quantidade
+
+    def _expedir(self, quantidade):
+        expedicao = Expedicao.objects.create(empresa=self.empresa, cliente_nome='Obra Centro', usuario=self.usuario)
+        linha = ItemExpedido.objects.create(expedicao=expedicao, produto=self.produto, quantidade=quantidade)
+        aplicar_deltas_estoque({self.item.pk: quantidade})
+        return expedicao, linha
+
+    def test_registrar_baixa_estoque(self):
+        resposta = self.client.post(_url('registrar_expedicao'), self._dados([
+            {'produto': self.produto.pk, 'quantidade': 3},
+            {'produto': self.produto.pk, 'quantidade': 2},
+        ]))
+
+        self.assertRedirects(resposta, reverse('lista_expedicoes'), fetch_redirect_response=False)
+        self.assertEqual(self._estoque(), 5)
+        self.assertEqual(ItemExpedido.objects.count(), 2)
+
+    def test_registrar_vincula_cliente_pelo_nome_digitado(self):
+        cliente = Cliente.objects.create(empresa=self.empresa, nome='Padaria São João')
+
+        self.client.post(_url('registrar_expedicao'), self._dados(
+            [{'produto': self.produto.pk, 'quantidade': 1}], cliente_nome='  padaria  SAO joão ',
+        ))
+
+        self.assertEqual(Expedicao.objects.get().cliente, cliente)
+
+    def test_registrar_sem_estoque_nao_grava_a_expedicao(self):
+        resposta = self.client.post(_url('registrar_expedicao'), self._dados([
+            {'produto': self.produto.pk, 'quantidade': 11},
+        ]))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self._estoque(), 10)
+        self.assertFalse(Expedicao.objects.exists())
+
+    def test_editar_reconcilia_o_estoque(self):
+        expedicao, linha = self._expedir(4)
+
+        resposta = self.client.post(_url('editar_expedicao', expedicao.pk), self._dados(
+            [{'id': linha.pk, 'expedicao': expedicao.pk, 'produto': self.produto.pk, 'quantidade': 7}],
+            iniciais=1, empresa=self.empresa.pk,
+        ))
+
+        self.assertRedirects(resposta, reverse('detalhe_expedicao', args=[expedicao.pk]), fetch_redirect_response=False)
+        self.assertEqual(self._estoque(), 3)
+
+    def test_editar_removendo_linha_devolve_ao_estoque(self):
+        expedicao, linha = self._expedir(4)
+
+        self.client.post(_url('editar_expedicao', expedicao.pk), self._dados(
+            [{'id': linha.pk, 'expedicao': expedicao.pk, 'produto': self.produto.pk, 'quantidade': 4, 'DELETE': 'on'}],
+            iniciais=1, empresa=self.empresa.pk,
+        ))
+
+        self.assertEqual(self._estoque(), 10)
+        self.assertFalse(ItemExpedido.objects.exists())
+
+    def test_editar_alem_do_estoque_nao_altera_nada(self):
+        expedicao, linha = self._expedir(4)
+
+        resposta = self.client.post(_url('editar_expedicao', expedicao.pk), self._dados(
+            [{'id': linha.pk, 'expedicao': expedicao.pk, 'produto': self.produto.pk, 'quantidade': 11}],
+            iniciais=1, empresa=self.empresa.pk,
+        ))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self._estoque(), 6)
+        linha.refresh_from_db()
+        self.assertEqual(linha.quantidade, 4)
+
+    def test_excluir_devolve_o_estoque_uma_vez(self):
+        expedicao, _ = self._expedir(4)
+
+        self.client.post(_url('excluir_expedicao', expedicao.pk))
+        # Envio repetido (clique duplo) não devolve de novo
+        resposta = self.client.post(_url('excluir_expedicao', expedicao.pk))
+
+        self.assertRedirects(resposta, reverse('lista_expedicoes'), fetch_redirect_response=False)
+        self.assertEqual(self._estoque(), 10)
+        self.assertFalse(Expedicao.objects.exists())
+
+
+class UploadRetomavelTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        configuracao = self.settings(UPLOADS_PARCIAIS_ROOT=pasta)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.dono = User.objects.create_user('dono')
+        self.outro = User.objects.create_user('outro')
+
+    def _upload_concluido(self, conteudo=b'%PDF-1.4 nota fiscal'):
+        upload = self._iniciar(conteudo)
+        return gravar_parte(upload.pk, self.dono, f'bytes 0-{len(conteudo) - 1}/{len(conteudo)}', io.BytesIO(conteudo))
+
+    def test_formulario_so_aceita_upload_do_proprio_usuario(self):
+        upload = self._upload_concluido()
+        dados = {'tipo': 'nota_fiscal', 'documento_upload': str(upload.pk)}
+
+        alheio = DocumentoExpedicaoForm(data=dados, usuario=self.outro)
+        self.assertFalse(alheio.is_valid())
+        self.assertIn('documento', alheio.errors)
+
+        sem_usuario = DocumentoExpedicaoForm(data=dados)
+        self.assertFalse(sem_usuario.is_valid())
+
+        proprio = DocumentoExpedicaoForm(data=dados, usuario=self.dono)
+        self.assertTrue(proprio.is_valid())
+        proprio.cleaned_data['documento'].close()
+
+    def _iniciar(self, conteudo):
+        return iniciar_upload(self.dono, 'nf.pdf', len(conteudo), hashlib.sha256(conteudo).hexdigest())
+
+    def test_partes_e_reenvio_sobreposto(self):
+        conteudo = bytes(range(256)) * 10
+        upload = self._iniciar(conteudo)
+
+        upload = gravar_parte(upload.pk, self.dono, 'bytes 0-999/2560', io.BytesIO(conteudo[:1000]))
+        self.assertEqual(upload.recebido, 1000)
+        # Reenvio a partir de 500 (resposta anterior perdida): só os bytes novos são gravados
+        upload = gravar_parte(upload.pk, self.dono, 'bytes 500-2559/2560', io.BytesIO(conteudo[500:]))
+
+        self.assertTrue(upload.concluido)
+        self.assertIsNone(upload.gravando_desde)
+        with open(caminho_temporario(upload), 'rb') as f:
+            self.assertEqual(f.read(), conteudo)
+
+    def test_parte_incompleta_guarda_o_que_chegou(self):
+        upload = self._iniciar(b'x' * 100)
+
+        with self.assertRaises(UploadInvalido) as erro:
+            gravar_parte(upload.pk, self.dono, 'bytes 0-99/100', io.BytesIO(b'x' * 40))
+
+        self.assertEqual(erro.exception.status, 409)
+        upload.refresh_from_db()
+        self.assertEqual((upload.recebido, upload.gravando_desde), (40, None))
+
+    def test_hash_diferente_recomeca_o_upload(self):
+        upload = self._iniciar(b'original')
+
+        with self.assertRaises(UploadInvalido) as erro:
+            gravar_parte(upload.pk, self.dono, 'bytes 0-7/8', io.BytesIO(b'alterado'))
+
+        self.assertEqual(erro.exception.status, 422)
+        upload.refresh_from_db()
+        self.assertEqual((upload.recebido, upload.concluido), (0, False))
+
+    def test_uma_parte_por_vez(self):
+        upload = self._iniciar(b'abcdef')
+        UploadParcial.objects.filter(pk=upload.pk).update(gravando_desde=timezone.now())
+
+        with self.assertRaises(UploadInvalido) as erro:
+            gravar_parte(upload.pk, self.dono, 'bytes 0-5/6', io.BytesIO(b'abcdef'))
+        self.assertEqual(erro.exception.status, 409)
+
+        # Reserva esquecida por uma requisição que morreu expira
+        UploadParcial.objects.filter(pk=upload.pk).update(gravando_desde=timezone.now() - timedelta(hours=1))
+        self.assertTrue(gravar_parte(upload.pk, self.dono, 'bytes 0-5/6', io.BytesIO(b'abcdef')).concluido)
+
+    def test_erro_na_leitura_libera_a_reserva(self):
+        upload = self._iniciar(b'abcdef')
+        corpo = mock.Mock()
+        corpo.read.side_effect = OSError('conexão perdida')
+
+        with self.assertRaises(OSError):
+            gravar_parte(upload.pk, self.dono, 'bytes 0-5/6', corpo)
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.recebido, upload.gravando_desde), (0, None))
+
+    def test_arquivo_montado_e_fechado_depois_de_salvo(self):
+        upload = self._upload_concluido()
+        arquivo = obter_arquivo_de_upload(upload.pk, self.dono)
+        with self.settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            self.addCleanup(shutil.rmtree, default_storage.location, ignore_errors=True)
+            nome = default_storage.save('documentos_expedicao/nf.pdf', arquivo)
+            self.assertTrue(arquivo.closed)
+            with default_storage.open(nome) as salvo:
+                self.assertEqual(salvo.read(), b'%PDF-1.4 nota fiscal')
+
+    def test_deduplicacao_no_meio_do_upload_nao_altera_outro_arquivo(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        # Temporários dentro do MEDIA_ROOT, como antes de UPLOADS_PARCIAIS_ROOT existir
+        with self.settings(MEDIA_ROOT=media, UPLOADS_PARCIAIS_ROOT=os.path.join(media, '.uploads')):
+            os.makedirs(os.path.join(media, 'fotos_itens'))
+            existente = os.path.join(media, 'fotos_itens', 'a.bin')
+            with open(existente, 'wb') as f:
+                f.write(b'A' * 100)
+            conteudo = b'A' * 100 + b'B' * 100
+            upload = self._iniciar(conteudo)
+            gravar_parte(upload.pk, self.dono, 'bytes 0-99/200', io.BytesIO(conteudo[:100]))
+
+            call_command('deduplicar_midia', stdout=io.StringIO())
+            upload = gravar_parte(upload.pk, self.dono, 'bytes 100-199/200', io.BytesIO(conteudo[100:]))
+
+            self.assertTrue(upload.concluido)
+            with open(existente, 'rb') as f:
+                self.assertEqual(f.read(), b'A' * 100)
+
+
+class DeduplicarMidiaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = self.settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def _criar(self, nome, conteudo=b'A' * 100):
+        caminho = os.path.join(self.media, nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, 'wb') as f:
+            f.write(conteudo)
+        return caminho
+
+    def test_pastas_ocultas_ficam_de_fora(self):
+        fotos = [self._criar('fotos_itens/a.bin'), self._criar('fotos_documentos/b.bin')]
+        ocultos = [self._criar('.uploads/parcial'), self._criar('.miniaturas/ab/cd/chave.webp')]
+
+        call_command('deduplicar_midia', stdout=io.StringIO())
+
+        self.assertTrue(os.path.samefile(*fotos))
+        for caminho in ocultos:
+            self.assertEqual(os.stat(caminho).st_nlink, 1)
+
+
+class LimparMiniaturasTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = self.settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def _antigo(self, relativo, horas=48):
+        momento = time.time() - horas * 3600
+        os.utime(os.path.join(self.media, relativo), (momento, momento))
+
+    def test_remove_miniaturas_de_originais_trocados_ou_apagados(self):
+        saida = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(saida, 'PNG')
+        nome = default_storage.save('fotos_itens/bloco.png', ContentFile(saida.getvalue()))
+        ItemEstoque.objects.create(nome='Bloco', quantidade=1, foto_principal=nome)
+
+        self._antigo(nome, horas=72)
+        anterior, _ = obter_miniatura(nome, 'thumb', 'webp')
+        # Original substituído: a miniatura anterior deixa de corresponder a ele
+        self._antigo(nome, horas=60)
+        atual, _ = obter_miniatura(nome, 'thumb', 'webp')
+        os.makedirs(os.path.join(self.media, '.uploads'))
+        with open(os.path.join(self.media, '.uploads', 'parcial'), 'wb') as f:
+            f.write(b'em andamento')
+        for relativo in (anterior, atual, '.uploads/parcial'):
+            self._antigo(relativo)
+
+        call_command('limpar_midia_orfa', apagar=True, stdout=io.StringIO())
+
+        self.assertFalse(os.path.exists(os.path.join(self.media, anterior)))
+        self.assertTrue(os.path.exists(os.path.join(self.media, atual)))
+        self.assertTrue(os.path.exists(os.path.join(self.media, nome)))
+        self.assertTrue(os.path.exists(os.path.join(self.media, '.uploads', 'parcial')))
+
+        # Original apagado: a miniatura vai junto
+        ItemEstoque.objects.all().delete()
+        call_command('limpar_midia_orfa', apagar=True, stdout=io.StringIO())
+        self.assertFalse(os.path.exists(os.path.join(self.media, atual)))
+
+
+class MiniaturaTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        configuracao = self.settings(MEDIA_ROOT=pasta, MINIATURAS_X_ACCEL=True)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.client.force_login(User.objects.create_user('leitor'))
+        for nome in ('fotos_itens/bloco.png', 'requisicoes/aprovacao/boleto.png'):
+            default_storage.save(nome, ContentFile(self._png()))
+
+    def _png(self):
+        saida = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(saida, 'PNG')
+        return saida.getvalue()
+
+    def test_miniatura_de_imagem_publica(self):
+        resposta = self.client.get(_url('miniatura', 'thumb', 'webp', 'fotos_itens/bloco.png'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('X-Accel-Redirect', resposta)
+
+    def test_documento_protegido_nao_tem_miniatura(self):
+        resposta = self.client.get(_url('miniatura', 'large', 'jpeg', 'requisicoes/aprovacao/boleto.png'))
+        self.assertEqual(resposta.status_code, 404)
+
+
+class CalendarioTests(TestCase):
+    def setUp(self):
+        limpar_cache_feriados()
+        self.addCleanup(limpar_cache_feriados)
+
+    def _dias(self, inicio, fim):
+        return [inicio + timedelta(days=n) for n in range((fim - inicio).days + 1)]
+
+    def _feriados(self):
+        Feriado.objects.create(data=date(2020, 12, 25), nome='Natal', recorrente=True)
+        # Mesmo dia duas vezes (nacional e da empresa): desconta uma vez só
+        Feriado.objects.create(data=date(2024, 12, 25), nome='Confraternização', tipo='empresa')
+        Feriado.objects.create(data=date(2024, 2, 29), nome='Aniversário da empresa', recorrente=True)
+        # Domingo e sábado: só contam nas jornadas que trabalham nesses dias
+        Feriado.objects.create(data=date(2025, 1, 5), nome='Festa do padroeiro')
+        Feriado.objects.create(data=date(2024, 12, 28), nome='Inventário', tipo='empresa')
+        # Recorrente só a partir de 2025
+        Feriado.objects.create(data=date(2025, 7, 9), nome='Revolução', recorrente=True)
+        limpar_cache_feriados()
+        return {
+            date(2023, 12, 25), date(2024, 12, 25), date(2025, 12, 25), date(2024, 2, 29),
+            date(2024, 12, 28), date(2025, 1, 5), date(2025, 7, 9),
+        }
+
+    def test_contagem_de_dias_da_semana(self):
+        inicio = date(2023, 12, 27)
+        for duracao in (-1, 0, 1, 6, 7, 8, 13, 400):
+            fim = inicio + timedelta(days=duracao)
+            esperado = [0] * 7
+            for dia in self._dias(inicio, fim):
+                esperado[dia.weekday()] += 1
+            self.assertEqual(contagem_dias_semana(inicio, fim), esperado, duracao)
+
+    def test_feriados_recorrentes(self):
+        self._feriados()
+        self.assertEqual(set(feriados_do_ano(2024)), {date(2024, 12, 25), date(2024, 2, 29), date(2024, 12, 28)})
+        # 29/02 não existe em 2025; o de 09/07 passa a valer
+        self.assertEqual(set(feriados_do_ano(2025)), {date(2025, 12, 25), date(2025, 1, 5), date(2025, 7, 9)})
+        self.assertIn(date(2028, 2, 29), feriados_do_ano(2028))
+        self.assertNotIn(date(2024, 7, 9), feriados_do_ano(2024))
+
+    def test_horas_e_dias_uteis_iguais_a_contagem_dia_a_dia(self):
+        feriados = self._feriados()
+        padrao = JornadaTrabalho(usuario=User.objects.create_user('padrao'))
+        # Segunda, quarta e sábado; sábado com as horas do dia padrão
+        escala = JornadaTrabalho(usuario=User.objects.create_user('escala'), dias_semana='0, 2,5', horas_diarias=6)
+
+        for jornada in (padrao, escala):
+            for inicio, fim in (
+                (date(2023, 12, 20), date(2025, 1, 10)),
+                (date(2024, 12, 23), date(2025, 1, 6)),
+                (date(2025, 1, 5), date(2025, 1, 5)),
+                (date(2025, 3, 1), date(2025, 2, 1)),
+            ):
+                uteis = [
+                    dia for dia in self._dias(inicio, fim)
+                    if dia.weekday() in jornada.dias_trabalho and dia not in feriados
+                ]
+                horas = sum(jornada.horas_por_dia_semana[dia.weekday()] for dia in uteis)
+                self.assertEqual(dias_uteis(jornada, inicio, fim), len(uteis), (jornada.dias_semana, inicio))
+                self.assertAlmostEqual(horas_esperadas(jornada, inicio, fim), horas)
+
+    def test_dias_antes_do_inicio_do_controle_nao_contam(self):
+        jornada = JornadaTrabalho(usuario=User.objects.create_user('novo'), inicio_controle=date(2025, 1, 8))
+        # Quarta a sexta
+        self.assertEqual(dias_uteis(jornada, date(2025, 1, 1), date(2025, 1, 10)), 3)
+        self.assertEqual(horas_esperadas(jornada, date(2025, 1, 1), date(2025, 1, 10)), 26)
+
+
+class ResumoIncrementalTests(TestCase):
+    CAMPOS = ('horas_trabalhadas', 'horas_abonadas', 'horas_esperadas', 'saldo_horas', 'dias_presentes')
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('operador')
+        self.jornada = JornadaTrabalho.objects.create(usuario=self.usuario)
+        # Terça-feira: período de 01/09 a 30/09/2026
+        self.dia = date(2026, 9, 1)
+
+    def _bater(self, data, tipo, hora):
+        momento = timezone.make_aware(datetime.combine(data, datetime.min.time()).replace(hour=hora))
+        RegistroPonto.objects.create(usuario=self.usuario, tipo=tipo, data_hora=momento)
+        return atualizar_dia(self.usuario, data, self.jornada)
+
+    def _abonar(self, data, horas=8):
+        AbonoDia.objects.create(
+            usuario=self.usuario, data=data, tipo_abono='atestado', motivo='Consulta', horas_abonadas=horas,
+        )
+        return atualizar_dia(self.usuario, data, self.jornada)
+
+    def _totais(self, resumo):
+        return {campo: getattr(resumo, campo) for campo in self.CAMPOS}
+
+    def _dias(self):
+        return list(ResumoDiario.objects.filter(usuario=self.usuario).order_by('data').values(
+            'data', 'horas_trabalhadas', 'horas_abonadas', 'horas_esperadas', 'dia_util', 'presente', 'abonado',
+        ))
+
+    def assertIgualAoRecalculo(self, resumo):
+        incremental, dias = self._totais(resumo), self._dias()
+        completo = recalcular_periodo(ResumoMensal.objects.get(pk=resumo.pk), self.jornada)
+        self.assertEqual(incremental, self._totais(completo))
+        self.assertEqual(dias, self._dias())
+
+    def test_pontos_acumulam_como_o_recalculo(self):
+        self._bater(self.dia, 'entrada', 8)
+        self._bater(self.dia, 'inicio_almoco', 12)
+        self._bater(self.dia, 'fim_almoco', 13)
+        resumo = self._bater(self.dia, 'saida', 17)
+        self._bater(self.dia + timedelta(days=1), 'entrada', 9)
+
+        self.assertEqual(resumo.horas_trabalhadas, Decimal('8'))
+        resumo = ResumoMensal.objects.get(pk=resumo.pk)
+        self.assertEqual(resumo.dias_presentes, 2)
+        self.assertIgualAoRecalculo(resumo)
+
+    def test_abono_e_remocao_de_abono(self):
+        self._abonar(self.dia)
+        self._bater(self.dia + timedelta(days=1), 'entrada', 8)
+        self._bater(self.dia + timedelta(days=1), 'saida', 12)
+        resumo = self._abonar(self.dia + timedelta(days=1), horas=4)
+        self.assertEqual(resumo.horas_abonadas, Decimal('12'))
+        self.assertIgualAoRecalculo(resumo)
+
+        AbonoDia.objects.filter(usuario=self.usuario).delete()
+        atualizar_dia(self.usuario, self.dia, self.jornada)
+        resumo = atualizar_dia(self.usuario, self.dia + timedelta(days=1), self.jornada)
+        self.assertEqual(resumo.horas_abonadas, Decimal('0'))
+        self.assertFalse(ResumoDiario.objects.filter(usuario=self.usuario, data=self.dia).exists())
+        self.assertIgualAoRecalculo(resumo)
+
+    def test_periodo_fechado_nao_muda(self):
+        self._bater(self.dia, 'entrada', 8)
+        self._bater(self.dia, 'saida', 17)
+        resumo = fechar_periodo(resumo_do_periodo(self.usuario, self.jornada, self.dia), self.jornada)
+        congelado, dias = self._totais(resumo), self._dias()
+
+        self._bater(self.dia, 'saida', 20)
+        self._bater(self.dia + timedelta(days=2), 'entrada', 8)
+        resumo = self._abonar(self.dia + timedelta(days=3))
+
+        self.assertTrue(resumo.fechado)
+        self.assertEqual(self._totais(ResumoMensal.objects.get(pk=resumo.pk)), congelado)
+        self.assertEqual(self._dias(), dias)
+
+    def test_fechamento_so_de_quem_controla_ponto(self):
+        # setUp: jornada criada ao abrir a tela de ponto, sem nenhum ponto registrado
+        User.objects.create_superuser('admin')
+        contratado = User.objects.create_user('contratado')
+        JornadaTrabalho.objects.create(usuario=contratado, controla_ponto=True, inicio_controle=date(2026, 9, 15))
+
+        call_command('fechar_periodo', ate='2026-10-01', stdout=io.StringIO())
+
+        self.assertEqual(list(ResumoMensal.objects.values_list('usuario__username', flat=True)), ['contratado'])
+        resumo = ResumoMensal.objects.get()
+        # Só os dias úteis a partir de 15/09: 12 dias, duas sextas de 8h
+        self.assertEqual((resumo.horas_esperadas, resumo.dias_ausentes), (Decimal('106'), 12))
+        self.assertEqual(
+            list(LancamentoBancoHoras.objects.values_list('usuario__username', 'horas')),
+            [('contratado', Decimal('-106'))],
+        )
+
+    def test_primeiro_ponto_inicia_o_controle(self):
+        self.client.force_login(self.usuario)
+        self.client.post(_url('bater_ponto'), {'tipo': 'entrada'})
+
+        self.jornada.refresh_from_db()
+        self.assertTrue(self.jornada.controla_ponto)
+        self.assertEqual(self.jornada.inicio_controle, timezone.localdate())
+        self.assertEqual(RegistroPonto.objects.filter(usuario=self.usuario).count(), 1)
+        # Não recomeça num ponto seguinte
+        self.assertFalse(self.jornada.iniciar_controle(timezone.localdate() + timedelta(days=1)))
+
+class VerificarPontoTests(TestCase):
+    def setUp(self):
+        self.supervisor = User.objects.create_superuser('supervisor')
+        self.operador = User.objects.create_user('operador')
+        JornadaTrabalho.objects.create(usuario=self.operador, controla_ponto=True, inicio_controle=date(2026, 9, 1))
+        # Abriu a tela de ponto uma vez, mas não controla ponto
+        JornadaTrabalho.objects.create(usuario=User.objects.create_user('visitante'))
+
+    def _verificar(self):
+        call_command('verificar_ponto', data='2026-09-01', stdout=io.StringIO())
+        return list(Notificacao.objects.order_by('id').values_list('usuario__username', 'titulo'))
+
+    def test_so_quem_controla_ponto_e_resumo_nao_se_repete(self):
+        self.assertEqual(self._verificar(), [
+            ('operador', 'Sem registro de ponto em 01/09/2026'),
+            ('supervisor', 'Ponto da equipe em 01/09/2026'),
+        ])
+
+        # Ponto lançado depois (só a entrada): o funcionário é avisado, o supervisor não recebe outro resumo
+        RegistroPonto.objects.create(
+            usuario=self.operador, tipo='entrada', data_hora=timezone.make_aware(datetime(2026, 9, 1, 8)),
+        )
+        notificacoes = self._verificar()
+        self.assertEqual(len(notificacoes), 3)
+        self.assertEqual(notificacoes[-1], ('operador', 'Ponto inconsistente em 01/09/2026'))
+
+class GeolocalizacaoTests(TestCase):
+    # Quadrado de ~110 m x ~100 m
+    FABRICA = [[-23.5500, -46.6340], [-23.5500, -46.6330], [-23.5510, -46.6330], [-23.5510, -46.6340]]
+
+    def setUp(self):
+        configuracao = self.settings(
+            PONTO_PRECISAO_MAXIMA=100,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        limpar_cache_locais()
+        self.addCleanup(limpar_cache_locais)
+        self.blockline = Empresa.objects.create(nome='Blockline')
+        self.filial = Empresa.objects.create(nome='Filial')
+        LocalPonto.objects.create(empresa=self.blockline, nome='Fábrica', poligono=self.FABRICA, tolerancia_metros=30)
+        deposito = [[-22.9000, -43.2000], [-22.9000, -43.1990], [-22.9010, -43.1995]]
+        LocalPonto.objects.create(empresa=self.filial, nome='Depósito', poligono=deposito)
+        self.operador = User.objects.create_user('operador')
+        perfil = PerfilUsuario.objects.create(usuario=self.operador)
+        perfil.empresas_permitidas.add(self.blockline)
+        urlopen = mock.patch('core.geolocalizacao.urllib.request.urlopen')
+        self.urlopen = urlopen.start()
+        self.addCleanup(urlopen.stop)
+
+    def _dados(self, lat, lon, precisao=10):
+        return {'latitude': str(lat), 'longitude': str(lon), 'precisao': str(precisao)}
+
+    def test_areas_da_empresa_do_usuario(self):
+        self.assertEqual([a['nome'] for a in areas_do_usuario(self.operador)], ['Fábrica'])
+        sem_empresa = User.objects.create_user('sem_empresa')
+        self.assertEqual(len(areas_do_usuario(sem_empresa)), 2)
+        self.assertEqual(len(areas_do_usuario(User.objects.create_superuser('admin'))), 2)
+
+    def test_dentro_da_area(self):
+        erro, campos = validar_localizacao(self.operador, self._dados(-23.5505, -46.6335))
+        self.assertIsNone(erro)
+        self.assertEqual(campos['localizacao'], 'Fábrica')
+        self.urlopen.assert_not_called()
+
+    def test_fora_da_area(self):
+        erro, campos = validar_localizacao(self.operador, self._dados(-23.5600, -46.6335))
+        self.assertIn('fora da área permitida', erro)
+        self.assertIn('Fábrica', erro)
+        self.assertEqual(campos, {})
+
+    def test_tolerancia_mais_margem_do_gps(self):
+        area = areas_do_usuario(self.operador)
+        # ~50 m ao sul da borda: tolerância de 30 m + precisão do GPS
+        lat, lon = -23.55145, -46.6335
+        self.assertIsNone(localizar(lat, lon, 10, area)[0])
+        self.assertEqual(localizar(lat, lon, 25, area)[0]['nome'], 'Fábrica')
+        # A margem do GPS é limitada a PONTO_PRECISAO_MAXIMA
+        self.assertIsNone(localizar(-23.5530, lon, 1000, area)[0])
+        self.assertIsNotNone(localizar(-23.5520, lon, 1000, area)[0])
+
+    def test_precisao_acima_do_maximo(self):
+        erro, _ = validar_localizacao(self.operador, self._dados(-23.5505, -46.6335, precisao=150))
+        self.assertIn('imprecisa', erro)
+
+    def test_sem_coordenadas(self):
+        erro, campos = validar_localizacao(self.operador, {})
+        self.assertIn('localização', erro)
+        self.assertEqual(campos, {})
+
+        LocalPonto.objects.all().delete()
+        limpar_cache_locais()
+        self.assertEqual(validar_localizacao(self.operador, {}), (None, {}))
+
+    def test_sem_areas_guarda_o_endereco(self):
+        LocalPonto.objects.all().delete()
+        limpar_cache_locais()
+        self.urlopen.return_value.__enter__.return_value = io.BytesIO(b'{"display_name": "Rua A, 10"}')
+
+        for _ in range(2):
+            erro, campos = validar_localizacao(self.operador, self._dados(-23.5600, -46.6335))
+            self.assertIsNone(erro)
+            self.assertEqual(campos['localizacao'], 'Rua A, 10')
+        # A segunda vez vem do cache
+        self.assertEqual(self.urlopen.call_count, 1)
+
+
+class BancoHorasTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('operador')
+        JornadaTrabalho.objects.create(
+            usuario=self.usuario, validade_banco_horas=6, controla_ponto=True, inicio_controle=date(2026, 1, 1),
+        )
+
+    def test_soma_de_meses_limita_o_dia(self):
+        self.assertEqual(somar_meses(date(2026, 1, 31), 1), date(2026, 2, 28))
+        self.assertEqual(somar_meses(date(2026, 8, 15), 6), date(2027, 2, 15))
+
+    def test_saldo_acumulado(self):
+        saldos = [
+            lancar(self.usuario, horas, 'ajuste', date(2026, 1, dia)).saldo
+            for dia, horas in ((5, 5), (6, -2), (7, '3.5'))
+        ]
+        self.assertEqual(saldos, [Decimal('5'), Decimal('3'), Decimal('6.5')])
+        self.assertEqual(saldo_atual(self.usuario), Decimal('6.5'))
+
+    def test_debito_compensa_o_credito_que_vence_antes(self):
+        janeiro = lancar(self.usuario, 4, 'periodo', date(2026, 1, 31))
+        fevereiro = lancar(self.usuario, 3, 'periodo', date(2026, 2, 28))
+        lancar(self.usuario, -5, 'pagamento', date(2026, 3, 10))
+
+        janeiro.refresh_from_db()
+        fevereiro.refresh_from_db()
+        self.assertEqual(janeiro.horas_restantes, Decimal('0'))
+        self.assertEqual(fevereiro.horas_restantes, Decimal('2'))
+        self.assertEqual(creditos_a_vencer(self.usuario), [(date(2026, 8, 28), Decimal('2'))])
+
+    def test_parte_que_cobre_a_divida_nao_vira_credito(self):
+        lancar(self.usuario, -3, 'periodo', date(2026, 1, 31))
+        credito = lancar(self.usuario, 5, 'periodo', date(2026, 2, 28))
+        self.assertEqual(credito.saldo, Decimal('2'))
+        self.assertEqual(credito.horas_restantes, Decimal('2'))
+        self.assertEqual(credito.vence_em, date(2026, 8, 28))
+
+    def test_expiracao_do_credito_nao_compensado(self):
+        credito = lancar(self.usuario, 4, 'periodo', date(2026, 1, 10))
+        lancar(self.usuario, -1, 'pagamento', date(2026, 2, 10))
+
+        self.assertEqual(expirar_creditos(self.usuario, date(2026, 7, 9)), [])
+        expiradas = expirar_creditos(self.usuario, date(2026, 7, 10))
+        self.assertEqual(
+            [(e.tipo, e.horas, e.data) for e in expiradas], [('expiracao', Decimal('-3'), date(2026, 7, 10))],
+        )
+        self.assertEqual(saldo_atual(self.usuario), Decimal('0'))
+        credito.refresh_from_db()
+        self.assertEqual(credito.horas_restantes, Decimal('0'))
+        # Rodar de novo não expira o mesmo crédito duas vezes
+        self.assertEqual(expirar_creditos(self.usuario, date(2026, 7, 20)), [])
+
+    def test_credito_vencido_nao_compensa_debito_posterior(self):
+        lancar(self.usuario, 4, 'periodo', date(2026, 1, 10))
+        debito = lancar(self.usuario, -2, 'pagamento', date(2026, 8, 1))
+        self.assertEqual(debito.saldo, Decimal('-2'))
+        self.assertTrue(LancamentoBancoHoras.objects.filter(usuario=self.usuario, tipo='expiracao').exists())
+
+    def test_fechamento_lancado_uma_vez(self):
+        resumo = ResumoMensal.objects.create(
+            usuario=self.usuario, mes=1, ano=2026, data_inicio=date(2026, 1, 1), data_fim=date(2026, 1, 31),
+            saldo_horas=Decimal('3'), fechado=True,
+        )
+        lancamento = lancar_fechamento(resumo)
+        self.assertEqual((lancamento.tipo, lancamento.saldo), ('periodo', Decimal('3')))
+        self.assertIsNone(lancar_fechamento(resumo))
+        self.assertEqual(LancamentoBancoHoras.objects.filter(usuario=self.usuario).count(), 1)
+
+    def test_fechamento_de_quem_nao_controla_ponto_nao_lanca(self):
+        outro = User.objects.create_user('visitante')
+        JornadaTrabalho.objects.create(usuario=outro)
+        periodo = {'mes': 1, 'ano': 2026, 'data_inicio': date(2026, 1, 1), 'data_fim': date(2026, 1, 31)}
+        resumo = ResumoMensal.objects.create(usuario=outro, saldo_horas=Decimal('-176'), fechado=True, **periodo)
+        self.assertIsNone(lancar_fechamento(resumo))
+
+        # Período que terminou antes do início do controle
+        JornadaTrabalho.objects.filter(usuario=self.usuario).update(inicio_controle=date(2026, 2, 1))
+        resumo = ResumoMensal.objects.create(usuario=self.usuario, saldo_horas=Decimal('-176'), fechado=True, **periodo)
+        self.assertIsNone(lancar_fechamento(resumo))
+        self.assertFalse(LancamentoBancoHoras.objects.exists())
+
+    def test_pagamento_maior_que_o_saldo_e_recusado(self):
+        lancar(self.usuario, 5, 'periodo', date(2026, 1, 31))
+
+        with self.assertRaises(SaldoInsuficiente) as erro:
+            lancar(self.usuario, -6, 'pagamento', date(2026, 2, 5), exigir_saldo=True)
+        self.assertEqual(erro.exception.saldo, Decimal('5'))
+        self.assertEqual(saldo_atual(self.usuario), Decimal('5'))
+
+        self.assertEqual(lancar(self.usuario, -5, 'pagamento', date(2026, 2, 5), exigir_saldo=True).saldo, Decimal('0'))
@@ -0,0 +1,325 @@
+# core/uploads.py
+"""
+Uploads retomáveis em partes.
+
+O cliente cria o upload informando nome, tamanho e SHA-256 do arquivo e
+envia o conteúdo em partes com o cabeçalho Content-Range
+("bytes início-fim/total"). As partes são gravadas direto na posição certa
+de um arquivo temporário, então uma conexão que cai no meio só precisa
+reenviar a partir de `recebido`. Quando o último byte chega o arquivo é
+conferido pelo hash e o upload fica concluído; o formulário passa a enviar
+apenas o id (campo <nome>_upload) e o arquivo montado é usado no lugar do
+arquivo do POST. Com o ArmazenamentoDeduplicado o arquivo montado vira o
+blob por hardlink, sem copiar os bytes de novo.
+
+Os temporários ficam em UPLOADS_PARCIAIS_ROOT, fora do MEDIA_ROOT (que o
+deduplicar_midia e o limpar_midia_orfa percorrem). Como um temporário pode
+ainda assim estar ligado a outro arquivo, ele é separado antes de cada
+gravação: escrever pelo link alteraria o outro arquivo também.
+"""
+import hashlib
+import os
+import re
+import shutil
+from datetime import timedelta
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadParcial
+
+TAMANHO_BLOCO = 1024 * 1024
+RE_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+# Depois disso a reserva de uma parte (requisição que morreu sem liberar) pode ser assumida
+TEMPO_RESERVA_PARTE = timedelta(minutes=10)
+
+
+class UploadInvalido(Exception):
+    """Parte ou upload recusado. status é o código HTTP sugerido."""
+
+    def __init__(self, mensagem, status=400):
+        self.status = status
+        super().__init__(mensagem)
+
+
+def pasta_uploads():
+    return os.fspath(settings.UPLOADS_PARCIAIS_ROOT)
+
+
+def caminho_temporario(upload):
+    return os.path.join(pasta_uploads(), str(upload.pk))
+
+
+def iniciar_upload(usuario, nome_arquivo, tamanho, sha256):
+    """Cria o upload e o arquivo temporário vazio."""
+    nome_arquivo = os.path.basename(nome_arquivo or '').strip()
+    sha256 = (sha256 or '').lower()
+    if not nome_arquivo:
+        raise UploadInvalido("Informe o nome do arquivo.")
+    if not re.fullmatch(r'[0-9a-f]{64}', sha256):
+        raise UploadInvalido("SHA-256 inválido.")
+    try:
+        tamanho = int(tamanho)
+    except (TypeError, ValueError):
+        raise UploadInvalido("Tamanho inválido.")
+    maximo = settings.UPLOAD_RETOMAVEL_TAMANHO_MAXIMO
+    if tamanho <= 0 or tamanho > maximo:
+        raise UploadInvalido(f"O arquivo deve ter até {maximo // (1024 * 1024)} MB.", status=413)
+
+    upload = UploadParcial.objects.create(
+        usuario=usuario, nome_arquivo=nome_arquivo[:255], tamanho=tamanho, sha256=sha256,
+    )
+    os.makedirs(pasta_uploads(), exist_ok=True)
+    open(caminho_temporario(upload), 'wb').close()
+    return upload
+
+
+def _hash_temporario(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _separar(caminho):
+    """
+    Garante que o temporário não compartilha o conteúdo com outro arquivo
+    (hardlink para um blob, criado pelo storage ou pelo deduplicar_midia):
+    copia para um arquivo próprio e troca o nome.
+    """
+    if os.stat(caminho).st_nlink > 1:
+        copia = f'{caminho}.copia'
+        shutil.copyfile(caminho, copia)
+        os.replace(copia, caminho)
+
+
+def _zerar(caminho):
+    """Recomeça o temporário vazio sem truncar um conteúdo que outro nome ainda usa."""
+    vazio = f'{caminho}.vazio'
+    open(vazio, 'wb').close()
+    os.replace(vazio, caminho)
+
+
+def _gravar_corpo(caminho, posicao, inicio, fim, corpo):
+    """
+    Grava no temporário, a partir de `posicao`, os bytes da parte
+    inicio-fim lidos de `corpo`. Bytes que o servidor já tem (parte
+    reenviada) são descartados.
+
+    Returns:
+        (bytes gravados até agora no arquivo, bytes da parte que não chegaram)
+    """
+    pular = posicao - inicio
+    restante = fim - inicio + 1
+    _separar(caminho)
+    with open(caminho, 'r+b') as destino:
+        destino.seek(posicao)
+        while restante > 0:
+            bloco = corpo.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            if pular >= len(bloco):
+                pular -= len(bloco)
+                continue
+            destino.write(bloco[pular:])
+            pular = 0
+        destino.truncate()
+        return destino.tell(), restante
+
+
+def _liberar(upload_id, reservado_em):
+    UploadParcial.objects.filter(pk=upload_id, gravando_desde=reservado_em).update(gravando_desde=None)
+
+
+def gravar_parte(upload_id, usuario, content_range, corpo):
+    """
+    Grava uma parte do upload.
+
+    A parte é reservada com o registro travado, o corpo (que pode chegar
+    devagar) é gravado fora da transação e o registro é travado de novo só
+    para avançar `recebido`.
+
+    Args:
+        upload_id: id do UploadParcial
+        usuario: dono do upload
+        content_range: valor do cabeçalho Content-Range
+        corpo: objeto com read(n) (o próprio request), lido em blocos
+
+    Returns:
+        UploadParcial atualizado
+
+    Raises:
+        UploadInvalido: Content-Range inválido (400), parte fora de ordem
+            ou outra parte do mesmo upload em gravação (409, o cliente deve
+            retomar de upload.recebido) ou hash diferente do informado
+            (422, o upload recomeça do zero)
+    """
+    encontrado = RE_CONTENT_RANGE.match(content_range or '')
+    if not encontrado:
+        raise UploadInvalido("Cabeçalho Content-Range ausente ou inválido.")
+    inicio, fim, total = (int(v) for v in encontrado.groups())
+
+    with transaction.atomic():
+        upload = UploadParcial.objects.select_for_update().filter(pk=upload_id, usuario=usuario).first()
+        if upload is None:
+            raise UploadInvalido("Upload não encontrado.", status=404)
+        if upload.concluido:
+            return upload
+        if total != upload.tamanho or fim < inicio or fim >= total:
+            raise UploadInvalido("Content-Range não corresponde ao upload.")
+        if inicio > upload.recebido:
+            raise UploadInvalido("Parte fora de ordem.", status=409)
+        # Uma parte por vez; a reserva de uma requisição que morreu sem liberar expira
+        if upload.gravando_desde and timezone.now() - upload.gravando_desde < TEMPO_RESERVA_PARTE:
+            raise UploadInvalido("Outra parte deste upload está sendo enviada.", status=409)
+        upload.gravando_desde = reservado_em = timezone.now()
+        upload.save(update_fields=['gravando_desde', 'atualizado_em'])
+
+    caminho = caminho_temporario(upload)
+    try:
+        recebido, restante = _gravar_corpo(caminho, upload.recebido, inicio, fim, corpo)
+        # Ainda com a reserva, ninguém mais grava no arquivo: o hash é conferido fora da trava
+        completo = restante == 0 and recebido == upload.tamanho
+        confere = completo and _hash_temporario(caminho) == upload.sha256
+    except BaseException:
+        # Conexão perdida no meio: o que não foi confirmado é regravado quando o cliente retomar
+        _liberar(upload.pk, reservado_em)
+        raise
+
+    with transaction.atomic():
+        upload = UploadParcial.objects.select_for_update().get(pk=upload.pk)
+        if upload.gravando_desde != reservado_em:
+            # A reserva expirou e outra requisição assumiu o upload: esta parte é descartada
+            raise UploadInvalido("Parte fora de ordem.", status=409)
+        upload.gravando_desde = None
+        upload.recebido = recebido
+
+        erro = None
+        if restante > 0:
+            # Conexão caiu no meio da parte: o que chegou fica, o cliente retoma dali
+            erro = UploadInvalido("Parte incompleta.", status=409)
+        elif completo:
+            if confere:
+                upload.concluido = True
+            else:
+                upload.recebido = 0
+                _zerar(caminho)
+                erro = UploadInvalido("O arquivo recebido não confere com o SHA-256 informado.", status=422)
+        upload.save(update_fields=['recebido', 'concluido', 'gravando_desde', 'atualizado_em'])
+
+    if erro:
+        raise erro
+    return upload
+
+
+def estado_upload(upload):
+    return {
+        'id': str(upload.pk),
+        'nome': upload.nome_arquivo,
+        'tamanho': upload.tamanho,
+        'recebido': upload.recebido,
+        'concluido': upload.concluido,
+    }
+
+
+class ArquivoDeUpload(File):
+    """
+    Arquivo montado de um upload concluído. Os atributos sha256 e
+    caminho_local permitem ao storage deduplicado adotar o arquivo sem lê-lo.
+    """
+
+    def __init__(self, upload):
+        self.caminho_local = caminho_temporario(upload)
+        self.sha256 = upload.sha256
+        super().__init__(open(self.caminho_local, 'rb'), name=upload.nome_arquivo)
+
+    def open(self, mode='rb'):
+        # Fechado pelo storage depois de salvo; reabre do arquivo montado se for lido de novo
+        if self.closed:
+            self.file = open(self.caminho_local, mode)
+            return self
+        return super().open(mode)
+
+
+def obter_arquivo_de_upload(upload_id, usuario):
+    """ArquivoDeUpload de um upload concluído do usuário, ou None se o id não for válido."""
+    upload = UploadParcial.objects.filter(pk=upload_id, usuario=usuario, concluido=True).first()
+    if upload is None or not os.path.exists(caminho_temporario(upload)):
+        return None
+    return ArquivoDeUpload(upload)
+
+
+def arquivo_enviado(request, campo):
+    """
+    Arquivo de um campo do POST: o enviado normalmente em request.FILES ou,
+    se o formulário mandou <campo>_upload, o upload retomável concluído.
+    """
+    if request.FILES.get(campo):
+        return request.FILES[campo]
+    upload_id = request.POST.get(f'{campo}_upload')
+    if not upload_id:
+        return None
+    try:
+        return obter_arquivo_de_upload(upload_id, request.user)
+    except ValidationError:
+        # id que não é um UUID
+        return None
+
+
+class UploadRetomavelMixin:
+    """
+    Para ModelForms: cada campo de arquivo listado em campos_upload_retomavel
+    ganha um campo oculto <campo>_upload. Quando ele traz o id de um upload
+    concluído, o arquivo montado é usado como se tivesse vindo no POST.
+    Só uploads do usuário passado em `usuario` (form_kwargs nos formsets)
+    são aceitos.
+    """
+    campos_upload_retomavel = ()
+
+    def __init__(self, *args, usuario=None, **kwargs):
+        self.usuario_upload = usuario
+        super().__init__(*args, **kwargs)
+        self._obrigatorios_upload = []
+        for campo in self.campos_upload_retomavel:
+            self.fields[f'{campo}_upload'] = forms.UUIDField(required=False, widget=forms.HiddenInput)
+            if self.fields[campo].required:
+                # A obrigatoriedade passa a ser conferida em clean(): arquivo OU upload
+                self.fields[campo].required = False
+                self._obrigatorios_upload.append(campo)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for campo in self.campos_upload_retomavel:
+            upload_id = cleaned_data.get(f'{campo}_upload')
+            if upload_id and not cleaned_data.get(campo):
+                arquivo = obter_arquivo_de_upload(upload_id, self.usuario_upload) if self.usuario_upload else None
+                if arquivo is None:
+                    self.add_error(campo, "O upload não foi concluído ou expirou. Envie o arquivo novamente.")
+                    continue
+                cleaned_data[campo] = arquivo
+            if campo in self._obrigatorios_upload and not cleaned_data.get(campo) and not getattr(self.instance, campo):
+                self.add_error(campo, forms.Field.default_error_messages['required'])
+        return cleaned_data
+
+
+def limpar_uploads_expirados(horas=48):
+    """
+    Remove uploads (concluídos ou não) sem atividade há mais de `horas`.
+    Retorna (quantidade, bytes liberados).
+    """
+    limite = timezone.now() - timedelta(hours=horas)
+    quantidade = liberados = 0
+    for upload in UploadParcial.objects.filter(atualizado_em__lt=limite).iterator():
+        caminho = caminho_temporario(upload)
+        if os.path.exists(caminho):
+            liberados += os.path.getsize(caminho)
+            os.remove(caminho)
+        quantidade += 1
+    UploadParcial.objects.filter(atualizado_em__lt=limite).delete()
+    return quantidade, liberados
@@ -4,6 +4,12 @@ from . import views
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     
+    # --- Mídia ---
+    path('midia/miniatura/<str:tamanho>/<str:formato>/<path:nome>', views.miniatura, name='miniatura'),
+    path('midia/protegida/<path:nome>', views.midia_protegida, name='midia_protegida'),
+    path('uploads/', views.iniciar_upload_retomavel, name='iniciar_upload_retomavel'),
+    path('uploads/<uuid:upload_id>/', views.upload_retomavel, name='upload_retomavel'),
+
     # --- Rotas de Estoque ---
     path('estoque/', views.lista_estoque, name='lista_estoque'),
     path('estoque/adicionar/', views.adicionar_item, name='adicionar_item'),
@@ -18,6 +24,7 @@ urlpatterns = [
     # --- Rotas de Recebimento ---
     path('recebimento/', views.lista_recebimentos, name='lista_recebimentos'),
     path('recebimento/registrar/', views.registrar_recebimento, name='registrar_recebimento'),
+    path('recebimento/importar-nfe/', views.importar_nfe, name='importar_nfe'),
     path('recebimento/<int:pk>/', views.detalhe_recebimento, name='detalhe_recebimento'),
     path('recebimento/<int:pk>/editar/', views.editar_recebimento, name='editar_recebimento'),
     path('recebimento/<int:pk>/excluir/', views.excluir_recebimento, name='excluir_recebimento'),
@@ -109,6 +116,10 @@ urlpatterns = [
     path('ponto/bater/', views.bater_ponto, name='bater_ponto'),
     path('ponto/abonar-dia/', views.abonar_dia, name='abonar_dia'),
     path('ponto/remover-abono/<int:abono_id>/', views.remover_abono_dia, name='remover_abono_dia'),
+    path('ponto/equipe/', views.relatorio_ponto_equipe, name='relatorio_ponto_equipe'),
+    path('ponto/folha-pagamento/', views.exportar_folha_pagamento, name='exportar_folha_pagamento'),
+    path('ponto/banco-horas/', views.banco_horas, name='banco_horas'),
+    path('ponto/banco-horas/lancar/', views.lancar_banco_horas, name='lancar_banco_horas'),
     path('ponto/configurar-periodo/', views.configurar_periodo_mes, name='configurar_periodo_mes'),
 
     # --- Rotas de Clientes ---
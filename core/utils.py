@@ -1,54 +1,71 @@
-from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
-import sys
+from decimal import Decimal
+from django.core import signing
+from django.db.models import Q
+import unicodedata
 
 
-def compress_image(image_field, quality=85, max_width=1920, max_height=1080):
+def normalizar_nome(nome):
     """
-    Comprime uma imagem mantendo a proporção e qualidade.
+    Normaliza um nome para comparação: sem acentos, minúsculo e com os
+    espaços colapsados. "  Padaria  São João " -> "padaria sao joao".
+    """
+    sem_acento = unicodedata.normalize('NFKD', nome or '')
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
+
+
+def _valor_cursor(valor):
+    """Serializa um valor de ordenação sem perder precisão (datas com microssegundos)."""
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def paginar_por_cursor(queryset, ordenacao, cursor=None, por_pagina=30, salt='cursor'):
+    """
+    Paginação por cursor (keyset): em vez de OFFSET, filtra a partir dos
+    valores de ordenação do último registro da página anterior, então o
+    custo de cada página não cresce com a profundidade da navegação.
 
     Args:
-        image_field: Campo ImageField do Django
-        quality: Qualidade JPEG (0-100), padrão 85
-        max_width: Largura máxima em pixels, padrão 1920
-        max_height: Altura máxima em pixels, padrão 1080
+        queryset: QuerySet já filtrado (pode conter anotações usadas na ordenação)
+        ordenacao: Campos no formato do order_by, terminando em 'pk' ou '-pk'
+            para desempate, ex: ['-data_recebimento', '-pk']
+        cursor: Cursor assinado recebido da página anterior
+        por_pagina: Quantidade de registros por página
+        salt: Salt da assinatura, para um cursor não valer em outra listagem
 
     Returns:
-        InMemoryUploadedFile: Imagem comprimida pronta para salvar
+        tuple: (lista de registros da página, cursor da próxima página ou None)
     """
-    if not image_field:
-        return None
-
-    # Abre a imagem
-    img = Image.open(image_field)
-
-    # Converte para RGB se for PNG com transparência ou outro formato
-    if img.mode in ('RGBA', 'LA', 'P'):
-        # Cria fundo branco para PNGs transparentes
-        background = Image.new('RGB', img.size, (255, 255, 255))
-        if img.mode == 'P':
-            img = img.convert('RGBA')
-        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-        img = background
-    elif img.mode != 'RGB':
-        img = img.convert('RGB')
-
-    # Redimensiona mantendo proporção se necessário
-    if img.width > max_width or img.height > max_height:
-        img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-
-    # Salva em buffer
-    output = BytesIO()
-    img.save(output, format='JPEG', quality=quality, optimize=True)
-    output.seek(0)
-
-    # Cria novo arquivo Django
-    return InMemoryUploadedFile(
-        output,
-        'ImageField',
-        f"{image_field.name.split('.')[0]}.jpg",
-        'image/jpeg',
-        sys.getsizeof(output),
-        None
-    )
+    campos = [campo.lstrip('-') for campo in ordenacao]
+
+    valores = None
+    if cursor:
+        try:
+            valores = signing.loads(cursor, salt=salt)
+        except signing.BadSignature:
+            valores = None
+
+    if valores and len(valores) == len(campos):
+        condicao = Q()
+        for i, campo in enumerate(campos):
+            operador = 'lt' if ordenacao[i].startswith('-') else 'gt'
+            parcial = Q(**{f'{campo}__{operador}': valores[i]})
+            for campo_anterior, valor_anterior in zip(campos[:i], valores[:i]):
+                parcial &= Q(**{campo_anterior: valor_anterior})
+            condicao |= parcial
+        queryset = queryset.filter(condicao)
+
+    # Busca um registro a mais só para saber se existe próxima página
+    registros = list(queryset.order_by(*ordenacao)[:por_pagina + 1])
+    proximo_cursor = None
+    if len(registros) > por_pagina:
+        registros = registros[:por_pagina]
+        ultimo = registros[-1]
+        proximo_cursor = signing.dumps(
+            [_valor_cursor(getattr(ultimo, campo)) for campo in campos], salt=salt
+        )
+    return registros, proximo_cursor
@@ -16,7 +16,7 @@ from .models import (
     ImagemProdutoFabricado, ImagemItemEstoque, ItemFornecedor, Expedicao, ItemExpedido, DocumentoExpedicao, ImagemExpedicao,
     Empresa, PerfilUsuario,
     TaskQuantidadeFeita, TaskHistorico,
-    JornadaTrabalho, RegistroPonto, ResumoMensal, AbonoDia,
+    JornadaTrabalho, RegistroPonto, ResumoMensal, AbonoDia, LancamentoBancoHoras,
     MovimentacaoEstoque, Cliente,
     EmprestimoItem, Notificacao, ProjectTask,
 )
@@ -24,9 +24,10 @@ from .forms import (
     ItemEstoqueForm, RetiradaItemForm, AdicaoItemForm, RecebimentoForm,
     ProdutoFabricadoForm, DocumentoProdutoForm, ComponenteForm, ProducaoForm,
     ImagemProdutoForm, ItemFornecedorForm, ExpedicaoForm, ItemExpedidoForm, DocumentoExpedicaoForm, ImagemExpedicaoForm,
-    ClienteForm, FornecedorForm
+    ClienteForm, FornecedorForm, ImportarNFeForm
 )
 from .decorators import superuser_required, filter_by_empresa, get_user_empresa
+from .uploads import arquivo_enviado
 
 def get_empresas_permitidas(user):
     if user.is_superuser:
@@ -55,7 +56,7 @@ def dashboard(request):
 
     # Atividades recentes
     ultimos_recebimentos = Recebimento.objects.order_by('-data_recebimento')[:5]
-    ultimas_expedicoes = Expedicao.objects.order_by('-data_expedicao')[:5]
+    ultimas_expedicoes = Expedicao.objects.select_related('cliente', 'usuario').order_by('-data_expedicao')[:5]
 
     # Combinar e ordenar atividades por data
     atividades = []
@@ -88,6 +89,136 @@ def dashboard(request):
     }
     return render(request, 'core/dashboard.html', contexto)
 
+# --- Mídia ---
+@login_required
+def miniatura(request, tamanho, formato, nome):
+    """
+    Miniatura de uma imagem dos campos de CAMPOS_IMAGEM, gerada uma única
+    vez e guardada no cache em disco. A URL muda quando o original muda
+    (?v=), por isso a resposta pode ser marcada como imutável; em produção o
+    nginx entrega o arquivo (X-Accel-Redirect) e o Django só responde os
+    cabeçalhos.
+    """
+    import os
+    from django.conf import settings
+    from django.core.exceptions import SuspiciousFileOperation
+    from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+    from django.utils._os import safe_join
+    from .imagens import FORMATOS, RENDITIONS, obter_miniatura, pastas_com_miniatura
+
+    if tamanho not in RENDITIONS or formato not in FORMATOS:
+        raise Http404
+    # Só imagens dos campos públicos; documentos protegidos passam pela midia_protegida
+    if not nome.startswith(pastas_com_miniatura()):
+        raise Http404
+    try:
+        safe_join(settings.MEDIA_ROOT, nome)
+    except SuspiciousFileOperation:
+        raise Http404
+    if any(parte.startswith('.') for parte in nome.split('/')):
+        raise Http404
+
+    try:
+        relativo, chave = obter_miniatura(nome, tamanho, formato)
+    except (OSError, ValueError):
+        # Original inexistente ou que não é uma imagem
+        raise Http404
+
+    etag = f'"{chave}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        resposta = HttpResponseNotModified()
+    elif settings.MINIATURAS_X_ACCEL:
+        resposta = HttpResponse()
+        resposta['X-Accel-Redirect'] = f"{settings.MEDIA_URL}{relativo}"
+    else:
+        resposta = FileResponse(open(os.path.join(settings.MEDIA_ROOT, relativo), 'rb'))
+    resposta['Content-Type'] = f"image/{formato}"
+    resposta['ETag'] = etag
+    resposta['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return resposta
+
+
+@login_required
+def midia_protegida(request, nome):
+    """
+    Documentos sensíveis (boletos, notas fiscais, comprovantes). O acesso é
+    conferido aqui e, em produção, o nginx entrega o arquivo via
+    X-Accel-Redirect, com Range e sem ocupar o worker.
+    """
+    import os
+    from django.conf import settings
+    from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+    from django.http import Http404
+    from django.utils._os import safe_join
+    from django.utils.encoding import escape_uri_path
+    from .midia_protegida import localizar_registro, pode_acessar, resposta_arquivo
+
+    try:
+        caminho = safe_join(settings.MEDIA_ROOT, nome)
+    except SuspiciousFileOperation:
+        raise Http404
+    if any(parte.startswith('.') for parte in nome.split('/')):
+        raise Http404
+
+    registro = localizar_registro(nome)
+    if registro is None or not os.path.isfile(caminho):
+        raise Http404
+    if not pode_acessar(request.user, registro):
+        raise PermissionDenied
+
+    x_accel = None
+    if settings.MIDIA_PROTEGIDA_X_ACCEL:
+        x_accel = f"{settings.MIDIA_PROTEGIDA_X_ACCEL_PREFIXO}{escape_uri_path(nome)}"
+    return resposta_arquivo(request, caminho, nome, x_accel)
+
+
+@login_required
+@require_POST
+def iniciar_upload_retomavel(request):
+    """
+    Cria um upload em partes. Corpo JSON: {"nome", "tamanho", "sha256"}.
+    Responde com o id e o estado; as partes são enviadas com PUT em
+    upload_retomavel.
+    """
+    from .uploads import UploadInvalido, estado_upload, iniciar_upload
+
+    try:
+        dados = json.loads(request.body or b'{}')
+        upload = iniciar_upload(request.user, dados.get('nome'), dados.get('tamanho'), dados.get('sha256'))
+    except ValueError:
+        return JsonResponse({'erro': 'JSON inválido.'}, status=400)
+    except UploadInvalido as e:
+        return JsonResponse({'erro': str(e)}, status=e.status)
+    return JsonResponse(estado_upload(upload), status=201)
+
+
+@login_required
+def upload_retomavel(request, upload_id):
+    """
+    GET: estado do upload (quantos bytes o servidor já tem, para retomar).
+    PUT: grava uma parte; o corpo é o conteúdo e o cabeçalho Content-Range
+    indica a posição ("bytes 0-1048575/5242880").
+    """
+    from .models import UploadParcial
+    from .uploads import UploadInvalido, estado_upload, gravar_parte
+
+    if request.method == 'GET':
+        upload = get_object_or_404(UploadParcial, pk=upload_id, usuario=request.user)
+        return JsonResponse(estado_upload(upload))
+    if request.method != 'PUT':
+        return JsonResponse({'erro': 'Método não permitido.'}, status=405)
+
+    try:
+        upload = gravar_parte(upload_id, request.user, request.headers.get('Content-Range'), request)
+    except UploadInvalido as e:
+        resposta = {'erro': str(e)}
+        atual = UploadParcial.objects.filter(pk=upload_id, usuario=request.user).first()
+        if atual:
+            resposta.update(estado_upload(atual))
+        return JsonResponse(resposta, status=e.status)
+    return JsonResponse(estado_upload(upload))
+
+
 # --- Views de Estoque ---
 @login_required
 def lista_estoque(request):
@@ -328,9 +459,6 @@ def excluir_item(request, pk):
 
 @login_required
 def duplicar_item(request, pk):
-    from django.core.files.base import ContentFile
-    import os
-
     item_original = get_object_or_404(ItemEstoque, pk=pk)
 
     # Gerar nome único para a cópia
@@ -352,23 +480,20 @@ def duplicar_item(request, pk):
         is_produto_fabricado=item_original.is_produto_fabricado
     )
 
-    # Copiar foto principal se existir
-    if item_original.foto_principal and os.path.exists(item_original.foto_principal.path):
-        with open(item_original.foto_principal.path, 'rb') as f:
-            item_duplicado.foto_principal.save(
-                os.path.basename(item_original.foto_principal.name),
-                ContentFile(f.read()),
-                save=True
-            )
-
-    # Copiar documentação se existir
-    if item_original.documentacao and os.path.exists(item_original.documentacao.path):
-        with open(item_original.documentacao.path, 'rb') as f:
-            item_duplicado.documentacao.save(
-                os.path.basename(item_original.documentacao.name),
-                ContentFile(f.read()),
-                save=True
-            )
+    # Foto e documentação: novo nome para o mesmo conteúdo, sem copiar os bytes
+    campos_arquivo = []
+    for campo in ('foto_principal', 'documentacao'):
+        arquivo = getattr(item_original, campo)
+        if arquivo and arquivo.storage.exists(arquivo.name):
+            if hasattr(arquivo.storage, 'duplicar'):
+                novo_nome = arquivo.storage.duplicar(arquivo.name)
+            else:
+                with arquivo.open('rb') as origem:
+                    novo_nome = arquivo.storage.save(arquivo.name, origem)
+            setattr(item_duplicado, campo, novo_nome)
+            campos_arquivo.append(campo)
+    if campos_arquivo:
+        item_duplicado.save(update_fields=campos_arquivo)
 
     # Copiar fornecedores associados
     for item_fornecedor in item_original.itemfornecedor_set.all():
@@ -510,17 +635,42 @@ def devolver_emprestimo(request, emprestimo_pk):
 
 # --- Views de Recebimento ---
 
+# Estatísticas do topo da lista (total, valor em 30 dias, aguardando).
+# Cache curto e invalidado sempre que um recebimento é criado/alterado.
+CACHE_ESTATISTICAS_RECEBIMENTOS = 'recebimentos:estatisticas'
+
+# Ordenações da lista. Toda ordenação termina em pk para o cursor ser estável.
+ORDENACOES_RECEBIMENTOS = {
+    'data_desc': ['-data_recebimento', '-pk'],
+    'data_asc': ['data_recebimento', 'pk'],
+    'fornecedor': ['ordem_fornecedor', 'pk'],
+    'valor_desc': ['-ordem_valor', '-pk'],
+    'status': ['status', '-pk'],
+}
+
+
+def invalidar_estatisticas_recebimentos():
+    from django.core.cache import cache
+    cache.delete(CACHE_ESTATISTICAS_RECEBIMENTOS)
+
+
 @login_required
 def lista_recebimentos(request):
     from datetime import timedelta
     from decimal import Decimal
+    from django.core.cache import cache
+    from django.db.models import Count, DecimalField, Value
+    from django.db.models.functions import Coalesce
+    from .utils import paginar_por_cursor
 
     query = request.GET.get('q', '')
     status_filtro = request.GET.get('status', '')
     ordenacao = request.GET.get('ordenar', 'data_desc')
+    if ordenacao not in ORDENACOES_RECEBIMENTOS:
+        ordenacao = 'data_desc'
 
-    # Filtrar recebimentos
-    recebimentos = Recebimento.objects.all()
+    # Filtrar recebimentos (o card mostra fornecedor, setor e usuário)
+    recebimentos = Recebimento.objects.select_related('fornecedor', 'setor', 'usuario')
 
     # Aplicar filtro de busca
     if query:
@@ -535,37 +685,43 @@ def lista_recebimentos(request):
     if status_filtro:
         recebimentos = recebimentos.filter(status=status_filtro)
 
-    # Aplicar ordenação
-    if ordenacao == 'data_desc':
-        recebimentos = recebimentos.order_by('-data_recebimento')
-    elif ordenacao == 'data_asc':
-        recebimentos = recebimentos.order_by('data_recebimento')
-    elif ordenacao == 'fornecedor':
-        recebimentos = recebimentos.order_by('fornecedor__nome')
+    # Campos nulos não funcionam com o cursor, então a ordenação usa valores com Coalesce
+    if ordenacao == 'fornecedor':
+        recebimentos = recebimentos.annotate(
+            ordem_fornecedor=Coalesce('fornecedor__nome', 'fornecedor_nome', Value(''))
+        )
     elif ordenacao == 'valor_desc':
-        recebimentos = recebimentos.order_by('-valor_total')
-    elif ordenacao == 'status':
-        recebimentos = recebimentos.order_by('status')
-
-    # Estatísticas
-    total_recebimentos = Recebimento.objects.count()
+        recebimentos = recebimentos.annotate(
+            ordem_valor=Coalesce('valor_total', Value(Decimal('0')), output_field=DecimalField(max_digits=10, decimal_places=2))
+        )
 
-    # Valor total do mês atual
-    data_limite = timezone.now() - timedelta(days=30)
-    recebimentos_mes = Recebimento.objects.filter(data_recebimento__gte=data_limite)
-    valor_total_mes = recebimentos_mes.aggregate(total=Sum('valor_total'))['total'] or Decimal('0.00')
+    cursor = request.GET.get('cursor')
+    recebimentos, proximo_cursor = paginar_por_cursor(
+        recebimentos, ORDENACOES_RECEBIMENTOS[ordenacao],
+        cursor=cursor, por_pagina=30, salt=f'recebimentos:{ordenacao}',
+    )
 
-    # Recebimentos aguardando
-    aguardando_conferencia = Recebimento.objects.filter(status='aguardando').count()
+    # Estatísticas em uma única consulta
+    estatisticas = cache.get(CACHE_ESTATISTICAS_RECEBIMENTOS)
+    if estatisticas is None:
+        data_limite = timezone.now() - timedelta(days=30)
+        estatisticas = Recebimento.objects.aggregate(
+            total_recebimentos=Count('pk'),
+            valor_total_mes=Sum('valor_total', filter=Q(data_recebimento__gte=data_limite)),
+            aguardando_conferencia=Count('pk', filter=Q(status='aguardando')),
+        )
+        cache.set(CACHE_ESTATISTICAS_RECEBIMENTOS, estatisticas, 60)
 
     contexto = {
         'recebimentos': recebimentos,
         'query': query,
         'status_filtro': status_filtro,
         'ordenacao': ordenacao,
-        'total_recebimentos': total_recebimentos,
-        'valor_total_mes': valor_total_mes,
-        'aguardando_conferencia': aguardando_conferencia,
+        'cursor': cursor,
+        'proximo_cursor': proximo_cursor,
+        'total_recebimentos': estatisticas['total_recebimentos'],
+        'valor_total_mes': estatisticas['valor_total_mes'] or Decimal('0.00'),
+        'aguardando_conferencia': estatisticas['aguardando_conferencia'],
     }
     return render(request, 'core/lista_recebimentos.html', contexto)
 
@@ -591,6 +747,7 @@ def registrar_recebimento(request):
 
             recebimento.usuario = request.user
             recebimento.save()
+            invalidar_estatisticas_recebimentos()
             messages.success(request, 'Recebimento registrado com sucesso!')
             return redirect('lista_recebimentos')
         else:
@@ -622,7 +779,10 @@ def registrar_recebimento(request):
 def detalhe_recebimento(request, pk):
     empresas_permitidas = get_empresas_permitidas(request.user)
     recebimento = get_object_or_404(Recebimento, pk=pk)
-    contexto = {'recebimento': recebimento}
+    contexto = {
+        'recebimento': recebimento,
+        'itens_recebidos': recebimento.itens.select_related('item_estoque'),
+    }
 
     return render(request, 'core/detalhe_recebimento.html', contexto)
 
@@ -638,6 +798,7 @@ def editar_recebimento(request, pk):
         form = RecebimentoForm(post_data, request.FILES, instance=recebimento)
         if form.is_valid():
             form.save()
+            invalidar_estatisticas_recebimentos()
             messages.success(request, 'Recebimento atualizado com sucesso!')
             return redirect('lista_recebimentos')
     else:
@@ -651,6 +812,45 @@ def editar_recebimento(request, pk):
     }
     return render(request, 'core/registrar_recebimento.html', contexto)
 
+@login_required
+def importar_nfe(request):
+    """Importa um XML de NF-e (ou um .zip com vários) como Recebimentos."""
+    from .nfe import importar_nfe as importar_arquivo_nfe
+
+    if request.method == 'POST':
+        form = ImportarNFeForm(request.POST, request.FILES)
+        if form.is_valid():
+            empresa = Empresa.objects.first()
+            if not empresa:
+                messages.error(request, "Nenhuma empresa cadastrada no sistema.")
+                return redirect('dashboard')
+
+            arquivo = form.cleaned_data['arquivo']
+            resumo = importar_arquivo_nfe(
+                arquivo, empresa, form.cleaned_data['setor'], request.user, nome=arquivo.name
+            )
+            invalidar_estatisticas_recebimentos()
+
+            if resumo['importadas']:
+                messages.success(
+                    request,
+                    f"{resumo['importadas']} nota(s) importada(s) com {resumo['itens']} item(ns), "
+                    f"{resumo['itens_vinculados']} vinculado(s) ao estoque."
+                )
+            if resumo['duplicadas']:
+                messages.warning(request, f"{resumo['duplicadas']} nota(s) já haviam sido importadas e foram ignoradas.")
+            if resumo['sem_fornecedor']:
+                messages.warning(request, f"{resumo['sem_fornecedor']} nota(s) sem fornecedor cadastrado com o CNPJ do emitente.")
+            for erro in resumo['erros'][:10]:
+                messages.error(request, erro)
+            if len(resumo['erros']) > 10:
+                messages.error(request, f"... e mais {len(resumo['erros']) - 10} arquivo(s) com erro.")
+            return redirect('lista_recebimentos')
+    else:
+        form = ImportarNFeForm()
+
+    return render(request, 'core/importar_nfe.html', {'form': form, 'titulo': 'Importar NF-e (XML)'})
+
 # --- Views de Produtos Fabricados ---
 
 @login_required
@@ -750,7 +950,7 @@ def adicionar_produto(request):
     
     if request.method == 'POST':
         form = ProdutoFabricadoForm(request.POST, request.FILES)
-        formset = DocumentoFormSet(request.POST, request.FILES, queryset=DocumentoProdutoFabricado.objects.none())
+        formset = DocumentoFormSet(request.POST, request.FILES, queryset=DocumentoProdutoFabricado.objects.none(), form_kwargs={'usuario': request.user})
 
         if form.is_valid() and formset.is_valid():
             produto_base = form.save(commit=False)
@@ -797,7 +997,7 @@ def editar_produto(request, pk):
     if request.method == 'POST':
         form = ProdutoFabricadoForm(request.POST, request.FILES, instance=produto)
         componente_formset = ComponenteFormSet(request.POST, instance=produto, prefix='componentes')
-        documento_formset = DocumentoFormSet(request.POST, request.FILES, instance=produto, prefix='documentos')
+        documento_formset = DocumentoFormSet(request.POST, request.FILES, instance=produto, prefix='documentos', form_kwargs={'usuario': request.user})
         imagem_formset = ImagemFormSet(request.POST, request.FILES, instance=produto, prefix='imagens')
 
         if form.is_valid() and componente_formset.is_valid() and documento_formset.is_valid() and imagem_formset.is_valid():
@@ -860,21 +1060,33 @@ def lista_expedicoes(request):
     from django.db.models import Sum, Count
     from datetime import datetime, timedelta
 
+    from django.db.models.functions import Coalesce
+
     # Pega todas as expedições da empresa do usuário
-    expedicoes = Expedicao.objects.all()
+    expedicoes = Expedicao.objects.select_related('cliente', 'usuario')
+
+    # Filtro por cliente cadastrado (usa o índice cliente/data)
+    cliente_filtro = request.GET.get('cliente', '')
+    if cliente_filtro.isdigit():
+        expedicoes = expedicoes.filter(cliente_id=int(cliente_filtro))
 
     # Filtro por pesquisa (cliente ou nota fiscal)
     search_query = request.GET.get('search', '')
     if search_query:
         expedicoes = expedicoes.filter(
-            Q(cliente__icontains=search_query) |
+            Q(cliente__nome__icontains=search_query) |
+            Q(cliente_nome__icontains=search_query) |
             Q(nota_fiscal__icontains=search_query)
         )
 
-    # Ordenação
+    # Ordenação (cliente ordena pelo nome cadastrado ou, na falta, pelo digitado)
     order_by = request.GET.get('order_by', '-data_expedicao')
     valid_order_fields = ['-data_expedicao', 'data_expedicao', 'cliente', '-cliente', 'nota_fiscal', '-nota_fiscal']
-    if order_by in valid_order_fields:
+    if order_by in ('cliente', '-cliente'):
+        expedicoes = expedicoes.annotate(
+            ordem_cliente=Coalesce('cliente__nome', 'cliente_nome')
+        ).order_by(order_by.replace('cliente', 'ordem_cliente'))
+    elif order_by in valid_order_fields:
         expedicoes = expedicoes.order_by(order_by)
 
     # Estatísticas
@@ -905,8 +1117,9 @@ def detalhe_expedicao(request, pk):
     return render(request, 'core/detalhe_expedicao.html', {'expedicao': expedicao})
 
 @login_required
-@transaction.atomic
 def registrar_expedicao(request):
+    from .estoque import EstoqueInsuficiente, aplicar_deltas_estoque, somar_por_item
+
     ItemExpedidoFormSet = inlineformset_factory(Expedicao, ItemExpedido, form=ItemExpedidoForm, extra=1, can_delete=False)
     DocumentoExpedicaoFormSet = inlineformset_factory(Expedicao, DocumentoExpedicao, form=DocumentoExpedicaoForm, extra=1, can_delete=False)
     ImagemExpedicaoFormSet = inlineformset_factory(Expedicao, ImagemExpedicao, form=ImagemExpedicaoForm, extra=1, can_delete=False)
@@ -918,57 +1131,51 @@ def registrar_expedicao(request):
             del form.fields['empresa']
 
         item_formset = ItemExpedidoFormSet(request.POST, prefix='itens')
-        documento_formset = DocumentoExpedicaoFormSet(request.POST, request.FILES, prefix='documentos')
+        documento_formset = DocumentoExpedicaoFormSet(request.POST, request.FILES, prefix='documentos', form_kwargs={'usuario': request.user})
         imagem_formset = ImagemExpedicaoFormSet(request.POST, request.FILES, prefix='imagens')
 
         if form.is_valid() and item_formset.is_valid() and documento_formset.is_valid() and imagem_formset.is_valid():
-
-            # --- Verificação de Estoque ---
-            pode_prosseguir = True
-            for form_item in item_formset:
-                if form_item.cleaned_data and form_item.cleaned_data.get('produto'):
-                    produto = form_item.cleaned_data['produto']
-                    quantidade = form_item.cleaned_data['quantidade']
-                    if quantidade > produto.item_associado.quantidade:
-                        messages.error(request, f"Estoque insuficiente para {produto.nome}. Disponível: {produto.item_associado.quantidade}")
-                        pode_prosseguir = False
-
-            if not pode_prosseguir:
-                # Se não puder prosseguir, renderiza a página de novo com os erros
-                contexto = {'form': form, 'item_formset': item_formset, 'documento_formset': documento_formset, 'imagem_formset': imagem_formset}
-                return render(request, 'core/registrar_expedicao.html', contexto)
-
-            # --- Se tudo estiver OK, salva e dá baixa no estoque ---
-            expedicao = form.save(commit=False)
-
             # Atribuir primeira empresa disponível
             primeira_empresa = Empresa.objects.first()
-            if primeira_empresa:
-                expedicao.empresa = primeira_empresa
-            else:
+            if not primeira_empresa:
                 messages.error(request, "Nenhuma empresa cadastrada no sistema.")
                 return redirect('dashboard')
 
-            expedicao.usuario = request.user
-            expedicao.save()
-
-            item_formset.instance = expedicao
-            item_formset.save()
+            linhas = [
+                (form_item.cleaned_data['produto'], form_item.cleaned_data['quantidade'])
+                for form_item in item_formset
+                if form_item.cleaned_data and form_item.cleaned_data.get('produto')
+            ]
+            deltas = somar_por_item((produto.item_associado_id, quantidade) for produto, quantidade in linhas)
 
-            documento_formset.instance = expedicao
-            documento_formset.save()
-            
-            imagem_formset.instance = expedicao
-            imagem_formset.save()
-            
-            # Baixa no estoque
-            for form_item in item_formset:
-                if form_item.cleaned_data and form_item.cleaned_data.get('produto'):
-                    produto = form_item.cleaned_data['produto']
-                    quantidade = form_item.cleaned_data['quantidade']
-                    produto.item_associado.quantidade -= quantidade
-                    produto.item_associado.save()
+            try:
+                with transaction.atomic():
+                    expedicao = form.save(commit=False)
+                    expedicao.empresa = primeira_empresa
+                    expedicao.usuario = request.user
+                    expedicao.save()
+
+                    # Baixa no estoque: trava os itens, confere e atualiza tudo de uma vez.
+                    # Vem antes dos anexos para não gravar arquivos de uma expedição que será desfeita.
+                    aplicar_deltas_estoque(deltas, usuario=request.user, observacoes=f"Expedição #{expedicao.pk}")
+
+                    ItemExpedido.objects.bulk_create([
+                        ItemExpedido(expedicao=expedicao, produto=produto, quantidade=quantidade)
+                        for produto, quantidade in linhas
+                    ])
+
+                    documento_formset.instance = expedicao
+                    documento_formset.save()
+
+                    imagem_formset.instance = expedicao
+                    imagem_formset.save()
+            except EstoqueInsuficiente as e:
+                for nome, disponivel, solicitado in e.faltas:
+                    messages.error(request, f"Estoque insuficiente para {nome}. Disponível: {disponivel}, solicitado: {solicitado}.")
+                contexto = {'form': form, 'item_formset': item_formset, 'documento_formset': documento_formset, 'imagem_formset': imagem_formset}
+                return render(request, 'core/registrar_expedicao.html', contexto)
 
+            invalidar_volume_clientes(expedicao.cliente_id)
             messages.success(request, f"Expedição #{expedicao.pk} registrada com sucesso!")
             return redirect('lista_expedicoes')
     else:
@@ -988,8 +1195,11 @@ def registrar_expedicao(request):
 
 @login_required
 def editar_expedicao(request, pk):
+    from .estoque import EstoqueInsuficiente, reconciliar_estoque, somar_por_item
+
     expedicao = get_object_or_404(Expedicao, pk=pk)
-    
+    cliente_anterior_id = expedicao.cliente_id
+
     ItemExpedidoFormSet = inlineformset_factory(Expedicao, ItemExpedido, form=ItemExpedidoForm, extra=1, can_delete=True)
     DocumentoExpedicaoFormSet = inlineformset_factory(Expedicao, DocumentoExpedicao, form=DocumentoExpedicaoForm, extra=1, can_delete=True)
     ImagemExpedicaoFormSet = inlineformset_factory(Expedicao, ImagemExpedicao, form=ImagemExpedicaoForm, extra=1, can_delete=True)
@@ -997,17 +1207,38 @@ def editar_expedicao(request, pk):
     if request.method == 'POST':
         form = ExpedicaoForm(request.POST, instance=expedicao)
         item_formset = ItemExpedidoFormSet(request.POST, instance=expedicao, prefix='itens')
-        documento_formset = DocumentoExpedicaoFormSet(request.POST, request.FILES, instance=expedicao, prefix='documentos')
+        documento_formset = DocumentoExpedicaoFormSet(request.POST, request.FILES, instance=expedicao, prefix='documentos', form_kwargs={'usuario': request.user})
         imagem_formset = ImagemExpedicaoFormSet(request.POST, request.FILES, instance=expedicao, prefix='imagens')
 
         if form.is_valid() and item_formset.is_valid() and documento_formset.is_valid() and imagem_formset.is_valid():
-            form.save()
-            item_formset.save()
-            documento_formset.save()
-            imagem_formset.save()
-            
-            messages.success(request, f"Expedição #{expedicao.pk} atualizada com sucesso!")
-            return redirect('detalhe_expedicao', pk=expedicao.pk)
+            novas = somar_por_item(
+                (form_item.cleaned_data['produto'].item_associado_id, form_item.cleaned_data['quantidade'])
+                for form_item in item_formset
+                if form_item.cleaned_data and form_item.cleaned_data.get('produto') and not form_item.cleaned_data.get('DELETE')
+            )
+
+            try:
+                with transaction.atomic():
+                    # Trava a expedição: edições e exclusões simultâneas ficam em fila e
+                    # cada uma lê as linhas já gravadas pela anterior
+                    Expedicao.objects.select_for_update().get(pk=expedicao.pk)
+                    # Linhas como estão no banco, lidas dentro da transação
+                    antigas = somar_por_item(
+                        ItemExpedido.objects.filter(expedicao=expedicao).values_list('produto__item_associado_id', 'quantidade')
+                    )
+                    reconciliar_estoque(antigas, novas, usuario=request.user, observacoes=f"Edição da expedição #{expedicao.pk}")
+
+                    form.save()
+                    item_formset.save()
+                    documento_formset.save()
+                    imagem_formset.save()
+            except EstoqueInsuficiente as e:
+                for nome, disponivel, solicitado in e.faltas:
+                    messages.error(request, f"Estoque insuficiente para {nome}. Disponível: {disponivel}, a mais nesta edição: {solicitado}.")
+            else:
+                invalidar_volume_clientes(cliente_anterior_id, expedicao.cliente_id)
+                messages.success(request, f"Expedição #{expedicao.pk} atualizada com sucesso!")
+                return redirect('detalhe_expedicao', pk=expedicao.pk)
     else:
         form = ExpedicaoForm(instance=expedicao)
         item_formset = ItemExpedidoFormSet(instance=expedicao, prefix='itens')
@@ -1029,6 +1260,7 @@ def excluir_recebimento(request, pk):
     recebimento = get_object_or_404(Recebimento, pk=pk)
     if request.method == 'POST':
         recebimento.delete()
+        invalidar_estatisticas_recebimentos()
         messages.success(request, f"Registro de recebimento #{pk} foi excluído com sucesso.")
         return redirect('lista_recebimentos')
     # Se não for POST, apenas redireciona de volta para os detalhes
@@ -1051,9 +1283,26 @@ def excluir_produto(request, pk):
 
 @login_required
 def excluir_expedicao(request, pk):
-    expedicao = get_object_or_404(Expedicao, pk=pk)
+    from .estoque import aplicar_deltas_estoque, somar_por_item
+
     if request.method == 'POST':
-        expedicao.delete()
+        # Devolve ao estoque tudo o que a expedição baixou e exclui, na mesma transação
+        with transaction.atomic():
+            # Trava a expedição; um envio repetido espera este terminar e não a encontra mais,
+            # então o estoque não é devolvido duas vezes
+            expedicao = Expedicao.objects.select_for_update().filter(pk=pk).first()
+            if expedicao:
+                expedidas = somar_por_item(
+                    ItemExpedido.objects.filter(expedicao=expedicao).values_list('produto__item_associado_id', 'quantidade')
+                )
+                aplicar_deltas_estoque(
+                    {item_id: -quantidade for item_id, quantidade in expedidas.items()},
+                    usuario=request.user,
+                    observacoes=f"Exclusão da expedição #{pk}",
+                )
+                expedicao.delete()
+        if expedicao:
+            invalidar_volume_clientes(expedicao.cliente_id)
         messages.success(request, f"Expedição #{pk} foi excluída com sucesso.")
         return redirect('lista_expedicoes')
     
@@ -1068,6 +1317,7 @@ def excluir_expedicao(request, pk):
 def roadmap_timeline(request):
     """Visualização principal: Timeline/Roadmap estilo Gantt"""
     from .models import Project, Milestone, Sprint, ProjectTask
+    from django.db.models import Count
     from django.contrib.auth.models import User
 
     # Filtros
@@ -1079,6 +1329,7 @@ def roadmap_timeline(request):
         projects = Project.objects.all().order_by('ordem')
     else:
         projects = Project.objects.filter(membros=request.user).order_by('ordem')
+    projects = projects.annotate(total_tasks=Count('tasks', distinct=True))
 
     project_selecionado = None
 
@@ -1088,23 +1339,35 @@ def roadmap_timeline(request):
         else:
             project_selecionado = get_object_or_404(Project, id=project_id, membros=request.user)
 
-    # Buscar tarefas
-    tasks = ProjectTask.objects.filter(project=project_selecionado).select_related('milestone', 'project').prefetch_related('responsaveis') if project_selecionado else ProjectTask.objects.none()
+    # Buscar tarefas (uma consulta, já com o total produzido, e uma para os responsáveis)
+    tasks = []
+    if project_selecionado:
+        tasks = list(
+            ProjectTask.objects.filter(project=project_selecionado)
+            .select_related('milestone', 'project')
+            .prefetch_related('responsaveis')
+            .annotate(quantidade_produzida_total=Sum('quantidades_feitas__quantidade'))
+        )
 
     # Buscar milestones e sprints
-    milestones = Milestone.objects.filter(project=project_selecionado) if project_selecionado else []
-    sprints = Sprint.objects.filter(project=project_selecionado) if project_selecionado else []
+    milestones = list(Milestone.objects.filter(project=project_selecionado)) if project_selecionado else []
+    sprints = Sprint.objects.filter(project=project_selecionado).annotate(total_tasks=Count('tasks')) if project_selecionado else []
 
     # Buscar usuários ativos
     users = User.objects.filter(is_active=True).order_by('first_name', 'username')
 
-    # Organizar tarefas por milestone
+    # Organizar tarefas por milestone em memória
+    por_milestone = {}
+    for task in tasks:
+        por_milestone.setdefault(task.milestone_id, []).append(task)
+
     tasks_por_milestone = {}
     for milestone in milestones:
-        tasks_por_milestone[milestone] = tasks.filter(milestone=milestone)
+        milestone.total_tasks = len(por_milestone.get(milestone.id, []))
+        tasks_por_milestone[milestone] = por_milestone.get(milestone.id, [])
 
     # Tarefas sem milestone
-    tasks_por_milestone[None] = tasks.filter(milestone__isnull=True)
+    tasks_por_milestone[None] = por_milestone.get(None, [])
 
     context = {
         'projects': projects,
@@ -2284,8 +2547,8 @@ def excluir_quantidade_feita(request, quantidade_id):
 def controle_ponto(request):
     """View principal do controle de ponto"""
     from datetime import datetime, timedelta
-    from django.db.models import Sum, Count
-    import calendar
+    from .banco_horas import creditos_a_vencer, saldo_atual
+    from .ponto import carregar_folha, horas_do_dia, periodo_da_data, presenca_diaria, resumo_periodo, saldos
 
     # Verifica se é superusuário ou o próprio usuário
     usuario_id = request.GET.get('usuario_id')
@@ -2300,294 +2563,82 @@ def controle_ponto(request):
         defaults={'horas_diarias': 9.0, 'horas_sexta': 8.0, 'intervalo_almoco': 1.0}
     )
 
-    # Dados do mês atual (usando período personalizado do funcionário)
-    now = datetime.now()
-    dia_inicio = jornada.dia_inicio_mes
-    dia_fim = jornada.dia_fim_mes
+    # Período de apuração do funcionário e janela do gráfico (últimos 30 dias)
+    hoje = timezone.localdate()
+    primeiro_dia, ultimo_dia = periodo_da_data(jornada, hoje)
+    inicio_grafico = hoje - timedelta(days=29)
 
-    # Calcular primeiro e último dia do período personalizado
-    if dia_inicio == 1 and dia_fim == 0:
-        # Período padrão: do dia 1 ao último dia do mês
-        primeiro_dia = datetime(now.year, now.month, 1)
-        ultimo_dia = datetime(now.year, now.month, calendar.monthrange(now.year, now.month)[1], 23, 59, 59)
-    else:
-        # Período personalizado
-        if dia_fim == 0:
-            # 0 significa último dia do mês
-            dia_fim = calendar.monthrange(now.year, now.month)[1]
-
-        # Se estamos depois do dia de início, o período é do dia_inicio deste mês até dia_fim do próximo mês
-        # Se estamos antes do dia de início, o período é do dia_inicio do mês passado até dia_fim deste mês
-        if now.day >= dia_inicio:
-            # Período atual: dia_inicio deste mês até dia_fim do próximo mês (ou mesmo mês se dia_fim > dia_inicio)
-            primeiro_dia = datetime(now.year, now.month, dia_inicio, 0, 0, 0)
-
-            if dia_fim >= dia_inicio:
-                # Período termina no mesmo mês
-                ultimo_dia = datetime(now.year, now.month, dia_fim, 23, 59, 59)
-            else:
-                # Período termina no próximo mês
-                if now.month == 12:
-                    proximo_mes = 1
-                    proximo_ano = now.year + 1
-                else:
-                    proximo_mes = now.month + 1
-                    proximo_ano = now.year
-                ultimo_dia = datetime(proximo_ano, proximo_mes, dia_fim, 23, 59, 59)
-        else:
-            # Período anterior: dia_inicio do mês passado até dia_fim deste mês
-            if now.month == 1:
-                mes_anterior = 12
-                ano_anterior = now.year - 1
-            else:
-                mes_anterior = now.month - 1
-                ano_anterior = now.year
-
-            primeiro_dia = datetime(ano_anterior, mes_anterior, dia_inicio, 0, 0, 0)
-            ultimo_dia = datetime(now.year, now.month, dia_fim, 23, 59, 59)
-
-    # Registros de ponto do mês
-    pontos_mes = RegistroPonto.objects.filter(
-        usuario=usuario,
-        data_hora__gte=primeiro_dia,
-        data_hora__lte=ultimo_dia
-    ).order_by('-data_hora')
-
-    # Calcular horas trabalhadas no mês
-    horas_trabalhadas = 0
-    dias_trabalhados = {}
-
-    for ponto in pontos_mes:
-        dia = ponto.data_hora.date()
-        if dia not in dias_trabalhados:
-            dias_trabalhados[dia] = {'entrada': None, 'saida': None, 'inicio_almoco': None, 'fim_almoco': None}
-
-        if ponto.tipo == 'entrada':
-            dias_trabalhados[dia]['entrada'] = ponto.data_hora
-        elif ponto.tipo == 'saida':
-            dias_trabalhados[dia]['saida'] = ponto.data_hora
-        elif ponto.tipo == 'inicio_almoco':
-            dias_trabalhados[dia]['inicio_almoco'] = ponto.data_hora
-        elif ponto.tipo == 'fim_almoco':
-            dias_trabalhados[dia]['fim_almoco'] = ponto.data_hora
-
-    # Calcular horas de cada dia
-    for dia, registros in dias_trabalhados.items():
-        if registros['entrada'] and registros['saida']:
-            delta = registros['saida'] - registros['entrada']
-            horas_brutas = delta.total_seconds() / 3600
-
-            # Descontar intervalo de almoço se registrado
-            if registros['inicio_almoco'] and registros['fim_almoco']:
-                intervalo = registros['fim_almoco'] - registros['inicio_almoco']
-                horas_brutas -= intervalo.total_seconds() / 3600
-
-            horas_trabalhadas += horas_brutas
-
-    # Calcular horas abonadas separadamente
-    abonos_periodo = AbonoDia.objects.filter(
-        usuario=usuario,
-        data__gte=primeiro_dia.date(),
-        data__lte=ultimo_dia.date()
-    )
-    horas_abonadas = sum(float(abono.horas_abonadas) for abono in abonos_periodo)
-
-    # Pesquisa por dia específico
+    # Dia pesquisado: entra na mesma carga se estiver dentro da janela
     dia_pesquisa_str = request.GET.get('dia_pesquisa')
     dia_pesquisado = None
-    pontos_do_dia = []
-    entrada = None
-    saida = None
-    inicio_almoco = None
-    fim_almoco = None
-    horas_trabalhadas_dia = 0
-    tempo_almoco = None
-
     if dia_pesquisa_str:
         try:
             dia_pesquisado = datetime.strptime(dia_pesquisa_str, '%Y-%m-%d').date()
-            # Buscar todos os pontos do dia
-            pontos_do_dia = RegistroPonto.objects.filter(
-                usuario=usuario,
-                data_hora__date=dia_pesquisado
-            ).order_by('data_hora')
-
-            # Separar os registros por tipo
-            registros_dia = {'entrada': None, 'saida': None, 'inicio_almoco': None, 'fim_almoco': None}
-            for ponto in pontos_do_dia:
-                if ponto.tipo == 'entrada':
-                    entrada = registros_dia['entrada'] = ponto.data_hora
-                elif ponto.tipo == 'saida':
-                    saida = registros_dia['saida'] = ponto.data_hora
-                elif ponto.tipo == 'inicio_almoco':
-                    inicio_almoco = registros_dia['inicio_almoco'] = ponto.data_hora
-                elif ponto.tipo == 'fim_almoco':
-                    fim_almoco = registros_dia['fim_almoco'] = ponto.data_hora
-
-            # Calcular horas trabalhadas do dia
-            if registros_dia['entrada'] and registros_dia['saida']:
-                delta = registros_dia['saida'] - registros_dia['entrada']
-                horas_trabalhadas_dia = delta.total_seconds() / 3600
-
-                # Calcular tempo de almoço
-                if registros_dia['inicio_almoco'] and registros_dia['fim_almoco']:
-                    intervalo = registros_dia['fim_almoco'] - registros_dia['inicio_almoco']
-                    tempo_almoco = intervalo.total_seconds() / 3600
-                    horas_trabalhadas_dia -= tempo_almoco
         except (ValueError, TypeError):
             # Data inválida, ignora
             dia_pesquisado = None
 
-    # Calcular dias de falta (dias úteis sem ponto e sem abono, até hoje)
-    dias_falta = 0
-    dia_atual = primeiro_dia.date()
-    hoje = now.date()
-    dias_semana_trabalho = [int(d) for d in jornada.dias_semana.split(',')]
-
-    # Calcular apenas até hoje, não até o fim do período
-    data_limite = min(ultimo_dia.date(), hoje)
-
-    while dia_atual <= data_limite:
-        # Verifica se é dia de trabalho (considerando dias_semana configurados)
-        if dia_atual.weekday() in dias_semana_trabalho:
-            # Verifica se não tem registro de ponto neste dia
-            tem_ponto = RegistroPonto.objects.filter(
-                usuario=usuario,
-                data_hora__date=dia_atual
-            ).exists()
-
-            # Verifica se não tem abono neste dia
-            tem_abono = AbonoDia.objects.filter(
-                usuario=usuario,
-                data=dia_atual
-            ).exists()
-
-            # Se não tem ponto e não tem abono, é falta
-            if not tem_ponto and not tem_abono:
-                dias_falta += 1
-
-        dia_atual += timedelta(days=1)
-
-    # Último ponto do dia
-    ultimo_ponto_hoje = RegistroPonto.objects.filter(
-        usuario=usuario,
-        data_hora__date=hoje
-    ).order_by('-data_hora').first()
-
-    # Meta mensal (horas esperadas no período completo)
-    horas_meta_mensal = jornada.horas_esperadas_periodo(primeiro_dia.date(), ultimo_dia.date())
-
-    # Horas esperadas até hoje (para cálculo do saldo)
-    data_final_calculo = min(ultimo_dia.date(), hoje)
-    horas_esperadas = jornada.horas_esperadas_periodo(primeiro_dia.date(), data_final_calculo)
-
-    # Saldo de horas (inclui horas abonadas no cálculo)
-    saldo_horas = (horas_trabalhadas + horas_abonadas) - horas_esperadas
-
-    # Últimos 30 dias para gráfico com cores baseadas em horas trabalhadas
-    trinta_dias_atras = now - timedelta(days=30)
-    presenca_ultimos_30 = []
-
-    # Obter dias de trabalho configurados na jornada
-    dias_semana_trabalho = [int(d) for d in jornada.dias_semana.split(',')]
-
-    for i in range(30):
-        dia = (now - timedelta(days=29-i)).date()
-
-        # Buscar pontos do dia
-        pontos_dia = RegistroPonto.objects.filter(
-            usuario=usuario,
-            data_hora__date=dia
-        ).order_by('data_hora')
-
-        # Calcular horas trabalhadas no dia
-        horas_dia = 0
-        registros_dia = {'entrada': None, 'saida': None, 'inicio_almoco': None, 'fim_almoco': None}
-
-        for ponto in pontos_dia:
-            if ponto.tipo == 'entrada':
-                registros_dia['entrada'] = ponto.data_hora
-            elif ponto.tipo == 'saida':
-                registros_dia['saida'] = ponto.data_hora
-            elif ponto.tipo == 'inicio_almoco':
-                registros_dia['inicio_almoco'] = ponto.data_hora
-            elif ponto.tipo == 'fim_almoco':
-                registros_dia['fim_almoco'] = ponto.data_hora
-
-        # Verificar se o dia foi abonado
-        abono_dia = AbonoDia.objects.filter(usuario=usuario, data=dia).first()
-
-        # Calcular horas líquidas
-        if registros_dia['entrada'] and registros_dia['saida']:
-            delta = registros_dia['saida'] - registros_dia['entrada']
-            horas_dia = delta.total_seconds() / 3600
-
-            # Descontar intervalo de almoço
-            if registros_dia['inicio_almoco'] and registros_dia['fim_almoco']:
-                intervalo = registros_dia['fim_almoco'] - registros_dia['inicio_almoco']
-                horas_dia -= intervalo.total_seconds() / 3600
-
-        # Definir cor baseada no percentual das horas esperadas (considera sexta diferente)
-        horas_esperadas_dia = jornada.horas_esperadas_dia(dia)
-
-        # Verificar se é dia útil (está nos dias de trabalho configurados)
-        dia_util = dia.weekday() in dias_semana_trabalho
-
-        # Se o dia foi abonado, usar cor amarela
-        if abono_dia:
-            cor = 'bg-yellow-500/50'  # Amarelo com 50% transparência: dia abonado
-            percentual = 100  # Considerar como 100% por ser abonado
-            horas_dia = float(abono_dia.horas_abonadas)  # Usar horas abonadas
-        elif not dia_util:
-            cor = 'bg-gray-300'  # Cinza: dia não útil (fim de semana/feriado)
-            percentual = 0
-        elif horas_dia == 0:
-            cor = 'bg-red-500/50'  # Vermelho com 50% transparência: falta (dia útil sem registro)
-            percentual = 0
-        else:
-            percentual = (horas_dia / horas_esperadas_dia) * 100
-            if percentual >= 100:
-                cor = 'bg-green-500'  # Verde chamativo: 100%+
-            elif percentual >= 75:
-                cor = 'bg-green-500/75'  # Verde com 25% transparência: 75-99%
-            elif percentual >= 50:
-                cor = 'bg-green-500/55'  # Verde com 45% transparência: 50-74%
-            elif percentual >= 25:
-                cor = 'bg-green-500/35'  # Verde com 65% transparência: 25-49%
-            else:
-                cor = 'bg-green-500/15'  # Verde com 85% transparência: 1-24%
-
-        presenca_ultimos_30.append({
-            'dia': dia.strftime('%d/%m'),
-            'presente': horas_dia > 0 or abono_dia is not None,
-            'horas': round(horas_dia, 2),
-            'cor': cor,
-            'percentual': round(percentual, 0),
-            'abonado': abono_dia is not None,
-            'tipo_abono': abono_dia.get_tipo_abono_display() if abono_dia else None,
-            'dia_util': dia_util
-        })
+    # Todos os pontos e abonos necessários em duas consultas
+    carga_inicio = min(primeiro_dia, inicio_grafico)
+    carga_fim = max(ultimo_dia, hoje)
+    folha = carregar_folha(usuario, carga_inicio, carga_fim)
+    if dia_pesquisado and not carga_inicio <= dia_pesquisado <= carga_fim:
+        folha.update(carregar_folha(usuario, dia_pesquisado, dia_pesquisado))
+
+    resumo = resumo_periodo(folha, jornada, primeiro_dia, ultimo_dia, hoje)
+
+    # Pesquisa por dia específico
+    pontos_do_dia = []
+    entrada = saida = inicio_almoco = fim_almoco = None
+    horas_trabalhadas_dia = 0
+    tempo_almoco = None
+    if dia_pesquisado and dia_pesquisado in folha:
+        pontos_do_dia = folha[dia_pesquisado]['pontos']
+        registros_dia = folha[dia_pesquisado]['registros']
+        entrada, saida = registros_dia['entrada'], registros_dia['saida']
+        inicio_almoco, fim_almoco = registros_dia['inicio_almoco'], registros_dia['fim_almoco']
+        horas_trabalhadas_dia, tempo_almoco = horas_do_dia(registros_dia)
+
+    # Último ponto de hoje e últimos 10 registros do período
+    pontos_hoje = folha.get(hoje, {}).get('pontos', [])
+    ultimo_ponto_hoje = pontos_hoje[-1] if pontos_hoje else None
+    pontos_mes = [
+        ponto
+        for dia in sorted((d for d in folha if primeiro_dia <= d <= ultimo_dia), reverse=True)
+        for ponto in reversed(folha[dia]['pontos'])
+    ][:10]
+
+    presenca_ultimos_30 = presenca_diaria(folha, jornada, inicio_grafico, hoje)
+
+    # Saldo acumulado no ano, a partir dos resumos mensais
+    _, saldo_ano = saldos(usuario, jornada, hoje)
+
+    # Banco de horas: saldo dos períodos fechados e o próximo vencimento
+    creditos = creditos_a_vencer(usuario)
 
     # Lista de usuários (apenas para superusuário)
     usuarios = User.objects.filter(is_active=True) if request.user.is_superuser else []
 
     # Abonos do mês (para superusuário)
     abonos_mes = AbonoDia.objects.filter(
-        data__gte=primeiro_dia.date(),
-        data__lte=ultimo_dia.date()
-    ).order_by('-data') if request.user.is_superuser else []
+        data__gte=primeiro_dia,
+        data__lte=ultimo_dia
+    ).select_related('usuario').order_by('-data') if request.user.is_superuser else []
 
     contexto = {
         'usuario_selecionado': usuario,
         'jornada': jornada,
-        'pontos_mes': pontos_mes[:10],  # Últimos 10 registros
-        'horas_trabalhadas': round(horas_trabalhadas, 2),
-        'horas_abonadas': round(horas_abonadas, 2),
-        'horas_esperadas': round(horas_esperadas, 2),
-        'horas_meta_mensal': round(horas_meta_mensal, 2),
-        'saldo_horas': round(saldo_horas, 2),
-        'dias_trabalhados': len([d for d, r in dias_trabalhados.items() if r['entrada'] and r['saida']]),
-        'dias_falta': dias_falta,
+        'pontos_mes': pontos_mes,  # Últimos 10 registros
+        'horas_trabalhadas': round(resumo['horas_trabalhadas'], 2),
+        'horas_abonadas': round(resumo['horas_abonadas'], 2),
+        'horas_esperadas': round(resumo['horas_esperadas'], 2),
+        'horas_meta_mensal': round(resumo['horas_meta'], 2),
+        'saldo_horas': round(resumo['saldo_horas'], 2),
+        'saldo_ano': round(saldo_ano, 2),
+        'banco_horas': saldo_atual(usuario),
+        'proximo_vencimento': creditos[0] if creditos else None,
+        'dias_trabalhados': resumo['dias_trabalhados'],
+        'dias_falta': resumo['dias_falta'],
         'ultimo_ponto_hoje': ultimo_ponto_hoje,
         'presenca_ultimos_30': presenca_ultimos_30,
         'usuarios': usuarios,
@@ -2618,12 +2669,10 @@ def bater_ponto(request):
         messages.error(request, 'Tipo de ponto inválido.')
         return redirect('controle_ponto')
 
-    # Verifica o último ponto do dia
-    hoje = timezone.now().date()
-    ultimo_ponto = RegistroPonto.objects.filter(
-        usuario=request.user,
-        data_hora__date=hoje
-    ).order_by('-data_hora').first()
+    # Verifica o último ponto do dia (dia local, filtrado por faixa de data_hora)
+    from .ponto import atualizar_dia, pontos_do_dia, recalcular_periodos_abertos
+    hoje = timezone.localdate()
+    ultimo_ponto = pontos_do_dia(hoje, usuario=request.user).order_by('-data_hora').first()
 
     # Validações
     if tipo == 'entrada' and ultimo_ponto and ultimo_ponto.tipo in ['entrada', 'inicio_almoco']:
@@ -2642,12 +2691,26 @@ def bater_ponto(request):
         messages.error(request, 'Você precisa registrar entrada/fim de almoço antes da saída.')
         return redirect('controle_ponto')
 
-    # Registra o ponto
-    RegistroPonto.objects.create(
-        usuario=request.user,
-        tipo=tipo,
-        observacao=observacao
-    )
+    # Localização: dentro de uma área da empresa, se houver áreas cadastradas
+    from .geolocalizacao import validar_localizacao
+    erro_localizacao, localizacao = validar_localizacao(request.user, request.POST)
+    if erro_localizacao:
+        messages.error(request, erro_localizacao)
+        return redirect('controle_ponto')
+
+    # Registra o ponto e atualiza os resumos do dia e do período
+    jornada, _ = JornadaTrabalho.objects.get_or_create(usuario=request.user)
+    with transaction.atomic():
+        if jornada.iniciar_controle(hoje):
+            # Primeiro ponto: as horas esperadas do período aberto passam a contar de hoje
+            recalcular_periodos_abertos(request.user)
+        ponto = RegistroPonto.objects.create(
+            usuario=request.user,
+            tipo=tipo,
+            observacao=observacao,
+            **localizacao
+        )
+        atualizar_dia(request.user, timezone.localtime(ponto.data_hora).date(), jornada)
 
     # Mensagem de sucesso
     mensagens_tipo = {
@@ -2657,7 +2720,7 @@ def bater_ponto(request):
         'fim_almoco': 'Fim do Almoço'
     }
     tipo_texto = mensagens_tipo.get(tipo, tipo)
-    messages.success(request, f'{tipo_texto} registrado com sucesso às {timezone.now().strftime("%H:%M")}!')
+    messages.success(request, f'{tipo_texto} registrado com sucesso às {timezone.localtime(ponto.data_hora).strftime("%H:%M")}!')
 
     return redirect('controle_ponto')
 
@@ -2670,6 +2733,7 @@ def abonar_dia(request):
 
     if request.method == 'POST':
         from datetime import datetime
+        from .ponto import atualizar_dia, periodo_fechado
         usuario_id = request.POST.get('usuario_id')
         data_str = request.POST.get('data')
         tipo_abono = request.POST.get('tipo_abono')
@@ -2685,15 +2749,22 @@ def abonar_dia(request):
                 messages.warning(request, f'Já existe um abono para {usuario.username} no dia {data.strftime("%d/%m/%Y")}.')
                 return redirect('controle_ponto')
 
-            # Criar abono
-            AbonoDia.objects.create(
-                usuario=usuario,
-                data=data,
-                tipo_abono=tipo_abono,
-                motivo=motivo,
-                horas_abonadas=horas_abonadas,
-                abonado_por=request.user
-            )
+            if periodo_fechado(usuario, data):
+                messages.error(request, f'O período de {data.strftime("%d/%m/%Y")} já foi fechado e não pode ser alterado.')
+                return redirect('controle_ponto')
+
+            # Criar abono e atualizar os resumos
+            jornada, _ = JornadaTrabalho.objects.get_or_create(usuario=usuario)
+            with transaction.atomic():
+                AbonoDia.objects.create(
+                    usuario=usuario,
+                    data=data,
+                    tipo_abono=tipo_abono,
+                    motivo=motivo,
+                    horas_abonadas=horas_abonadas,
+                    abonado_por=request.user
+                )
+                atualizar_dia(usuario, data, jornada)
 
             messages.success(request, f'Dia {data.strftime("%d/%m/%Y")} abonado com sucesso para {usuario.username}!')
             return redirect('controle_ponto')
@@ -2710,12 +2781,19 @@ def abonar_dia(request):
 @superuser_required
 def remover_abono_dia(request, abono_id):
     """Permite superuser remover um abono de dia"""
+    from .ponto import atualizar_dia, periodo_fechado
 
     try:
         abono = AbonoDia.objects.get(pk=abono_id)
         usuario_nome = abono.usuario.username
         data = abono.data.strftime("%d/%m/%Y")
-        abono.delete()
+        if periodo_fechado(abono.usuario, abono.data):
+            messages.error(request, f'O período de {data} já foi fechado e não pode ser alterado.')
+            return redirect('controle_ponto')
+        jornada, _ = JornadaTrabalho.objects.get_or_create(usuario=abono.usuario)
+        with transaction.atomic():
+            abono.delete()
+            atualizar_dia(abono.usuario, abono.data, jornada)
         messages.success(request, f'Abono do dia {data} de {usuario_nome} foi removido.')
     except AbonoDia.DoesNotExist:
         messages.error(request, 'Abono não encontrado.')
@@ -2769,6 +2847,148 @@ def configurar_periodo_mes(request):
 
     return redirect('controle_ponto')
 
+@superuser_required
+def relatorio_ponto_equipe(request):
+    """Horas trabalhadas, esperadas, saldo, faltas e abonos de todos os funcionários num período"""
+    from datetime import datetime, timedelta
+    from .exportacao import resposta_csv, resposta_xlsx
+    from .ponto import relatorio_equipe
+
+    hoje = timezone.localdate()
+    try:
+        inicio = datetime.strptime(request.GET.get('inicio', ''), '%Y-%m-%d').date()
+        fim = datetime.strptime(request.GET.get('fim', ''), '%Y-%m-%d').date()
+    except ValueError:
+        # Padrão: mês atual
+        inicio = hoje.replace(day=1)
+        fim = (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    if fim < inicio:
+        inicio, fim = fim, inicio
+
+    usuarios = User.objects.filter(is_active=True).order_by('first_name', 'username')
+    linhas = relatorio_equipe(usuarios, inicio, fim, hoje)
+
+    formato = request.GET.get('formato')
+    if formato in ('csv', 'xlsx'):
+        cabecalho = [
+            'Usuário', 'Nome', 'Horas Trabalhadas', 'Horas Abonadas', 'Horas Esperadas',
+            'Saldo (h)', 'Dias Trabalhados', 'Dias Abonados', 'Faltas',
+        ]
+        dados = (
+            [
+                l['usuario'].username, l['usuario'].get_full_name(), l['horas_trabalhadas'], l['horas_abonadas'],
+                l['horas_esperadas'], l['saldo_horas'], l['dias_trabalhados'], l['dias_abonados'], l['dias_falta'],
+            ]
+            for l in linhas
+        )
+        nome = f"ponto_equipe_{inicio:%Y-%m-%d}_{fim:%Y-%m-%d}.{formato}"
+        if formato == 'csv':
+            return resposta_csv(nome, cabecalho, dados)
+        return resposta_xlsx(nome, cabecalho, dados, titulo='Ponto da Equipe')
+
+    contexto = {
+        'linhas': linhas,
+        'inicio': inicio,
+        'fim': fim,
+        'total_trabalhadas': round(sum(l['horas_trabalhadas'] for l in linhas), 2),
+        'total_abonadas': round(sum(l['horas_abonadas'] for l in linhas), 2),
+        'total_esperadas': round(sum(l['horas_esperadas'] for l in linhas), 2),
+        'total_saldo': round(sum(l['saldo_horas'] for l in linhas), 2),
+        'total_faltas': sum(l['dias_falta'] for l in linhas),
+        'mes_folha': hoje.replace(day=1) - timedelta(days=1),
+    }
+    return render(request, 'core/relatorio_ponto_equipe.html', contexto)
+
+@superuser_required
+def exportar_folha_pagamento(request):
+    """Arquivo para a folha de pagamento (CSV ou Excel) com os períodos fechados de um mês"""
+    from datetime import timedelta
+    from .exportacao import resposta_csv, resposta_xlsx
+    from .ponto import COLUNAS_FOLHA, linhas_folha_pagamento
+
+    # Padrão: períodos que terminaram no mês passado
+    mes_passado = timezone.localdate().replace(day=1) - timedelta(days=1)
+    try:
+        mes = int(request.GET.get('mes', mes_passado.month))
+        ano = int(request.GET.get('ano', mes_passado.year))
+    except (ValueError, TypeError):
+        mes, ano = mes_passado.month, mes_passado.year
+    if not 1 <= mes <= 12:
+        messages.error(request, 'Mês inválido.')
+        return redirect('relatorio_ponto_equipe')
+
+    linhas = linhas_folha_pagamento(mes, ano)
+    if not linhas:
+        messages.warning(request, f'Nenhum período fechado em {mes:02d}/{ano}. Feche os períodos antes de exportar a folha.')
+        return redirect('relatorio_ponto_equipe')
+
+    nome = f'folha_{ano}-{mes:02d}'
+    if request.GET.get('formato') == 'xlsx':
+        return resposta_xlsx(f'{nome}.xlsx', COLUNAS_FOLHA, linhas, titulo=f'Folha {mes:02d}-{ano}')
+    return resposta_csv(f'{nome}.csv', COLUNAS_FOLHA, linhas)
+
+@login_required
+def banco_horas(request):
+    """Extrato do banco de horas: lançamentos com o saldo acumulado e créditos a vencer"""
+    from .banco_horas import creditos_a_vencer, saldo_atual
+
+    usuario_id = request.GET.get('usuario_id')
+    if usuario_id and request.user.is_superuser:
+        usuario = get_object_or_404(User, id=usuario_id)
+    else:
+        usuario = request.user
+
+    contexto = {
+        'usuario_selecionado': usuario,
+        'saldo': saldo_atual(usuario),
+        'lancamentos': LancamentoBancoHoras.objects.filter(usuario=usuario).select_related('criado_por')[:100],
+        'creditos_a_vencer': creditos_a_vencer(usuario),
+        'usuarios': User.objects.filter(is_active=True).order_by('username') if request.user.is_superuser else [],
+        'hoje': timezone.localdate(),
+    }
+    return render(request, 'core/banco_horas.html', contexto)
+
+@superuser_required
+@require_POST
+def lancar_banco_horas(request):
+    """Lança um ajuste manual ou horas pagas em folha no banco de horas de um funcionário"""
+    from datetime import datetime
+    from decimal import Decimal, InvalidOperation
+    from django.urls import reverse
+    from .banco_horas import SaldoInsuficiente, lancar
+
+    tipo = request.POST.get('tipo')
+    descricao = request.POST.get('descricao', '').strip()
+    try:
+        usuario = User.objects.get(pk=request.POST.get('usuario_id'))
+        horas = Decimal(request.POST.get('horas', '').replace(',', '.'))
+        data = datetime.strptime(request.POST.get('data', ''), '%Y-%m-%d').date()
+    except User.DoesNotExist:
+        messages.error(request, 'Usuário não encontrado.')
+        return redirect('banco_horas')
+    except (InvalidOperation, ValueError):
+        messages.error(request, 'Informe as horas e a data corretamente.')
+        return redirect('banco_horas')
+
+    url = reverse('banco_horas') + f'?usuario_id={usuario.pk}'
+    if tipo not in ('ajuste', 'pagamento') or not horas.is_finite() or horas == 0:
+        messages.error(request, 'Lançamento inválido.')
+        return redirect(url)
+    if tipo == 'pagamento':
+        # Horas pagas em folha saem do banco
+        horas = -abs(horas)
+
+    try:
+        lancamento = lancar(
+            usuario, horas, tipo, data, descricao=descricao[:200], criado_por=request.user,
+            exigir_saldo=tipo == 'pagamento',
+        )
+    except SaldoInsuficiente:
+        messages.error(request, f'{usuario.username} não tem {-horas}h no banco para pagar.')
+        return redirect(url)
+    messages.success(request, f'Lançamento de {lancamento.horas:+}h registrado para {usuario.username}. Saldo: {lancamento.saldo:+}h')
+    return redirect(url)
+
 # === VIEWS DE CLIENTES ===
 
 @login_required
@@ -2832,12 +3052,62 @@ def editar_cliente(request, pk):
 
     return render(request, 'core/form_cliente.html', {'form': form, 'titulo': f'Editar {cliente.nome}', 'cliente': cliente})
 
+def _chave_volume_cliente(cliente_id):
+    return f'clientes:{cliente_id}:volume_mensal'
+
+
+def invalidar_volume_clientes(*cliente_ids):
+    """Descarta a análise em cache dos clientes afetados por uma expedição."""
+    from django.core.cache import cache
+    cache.delete_many([_chave_volume_cliente(pk) for pk in cliente_ids if pk])
+
+
+def volume_mensal_cliente(cliente_id):
+    """
+    Volume expedido por produto e por mês para um cliente, mais recente
+    primeiro. Uma única consulta agrupada, guardada em cache por 10 minutos.
+    """
+    from django.core.cache import cache
+    from django.db.models.functions import TruncMonth
+
+    chave = _chave_volume_cliente(cliente_id)
+    meses = cache.get(chave)
+    if meses is not None:
+        return meses
+
+    linhas = (
+        ItemExpedido.objects
+        .filter(expedicao__cliente_id=cliente_id)
+        .annotate(mes=TruncMonth('expedicao__data_expedicao'))
+        .values('mes', 'produto_id', 'produto__nome')
+        .annotate(total=Sum('quantidade'))
+        .order_by('-mes', 'produto__nome')
+    )
+
+    meses = []
+    for linha in linhas:
+        if not meses or meses[-1]['mes'] != linha['mes']:
+            meses.append({'mes': linha['mes'], 'produtos': [], 'total': 0})
+        meses[-1]['produtos'].append({'id': linha['produto_id'], 'nome': linha['produto__nome'], 'total': linha['total']})
+        meses[-1]['total'] += linha['total']
+
+    cache.set(chave, meses, 600)
+    return meses
+
+
 @login_required
 def detalhe_cliente(request, pk):
     # SEGURANÇA: Garantir que o cliente pertence à empresa do usuário
     empresas = get_user_empresa(request.user)
     cliente = get_object_or_404(Cliente, pk=pk, empresa__in=empresas)
-    return render(request, 'core/detalhe_cliente.html', {'cliente': cliente})
+
+    contexto = {
+        'cliente': cliente,
+        # Histórico pelo índice (cliente, data) em vez de buscar o nome em todas as expedições
+        'expedicoes': cliente.expedicoes.select_related('usuario').order_by('-data_expedicao')[:20],
+        'volume_mensal': volume_mensal_cliente(cliente.pk),
+    }
+    return render(request, 'core/detalhe_cliente.html', contexto)
 
 @login_required
 def excluir_cliente(request, pk):
@@ -3222,14 +3492,16 @@ def editar_requisicao(request, requisicao_id):
             requisicao.dias_aviso_pagamento = new_dias_aviso
 
         # Upload de documento do boleto
-        if request.FILES.get('documento_boleto'):
+        documento_boleto = arquivo_enviado(request, 'documento_boleto')
+        if documento_boleto:
             changes.append(f"Documento do boleto atualizado")
-            requisicao.documento_boleto = request.FILES['documento_boleto']
+            requisicao.documento_boleto = documento_boleto
 
     # Upload de nota fiscal
-    if request.FILES.get('documento_nota_fiscal'):
+    documento_nota_fiscal = arquivo_enviado(request, 'documento_nota_fiscal')
+    if documento_nota_fiscal:
         changes.append(f"Documento da nota fiscal atualizado")
-        requisicao.documento_nota_fiscal = request.FILES['documento_nota_fiscal']
+        requisicao.documento_nota_fiscal = documento_nota_fiscal
 
     # Atualizar dados de aprovação
     observacao_aprovacao = request.POST.get('observacao_aprovacao', '')
@@ -3460,12 +3732,14 @@ def marcar_como_comprado(request, requisicao_id):
             requisicao.dias_pagamento = request.POST.get('dias_pagamento', '')
 
         # Upload de documento do boleto
-        if request.FILES.get('documento_boleto'):
-            requisicao.documento_boleto = request.FILES['documento_boleto']
+        documento_boleto = arquivo_enviado(request, 'documento_boleto')
+        if documento_boleto:
+            requisicao.documento_boleto = documento_boleto
 
     # Upload de nota fiscal (para todas as formas de pagamento)
-    if request.FILES.get('documento_nota_fiscal'):
-        requisicao.documento_nota_fiscal = request.FILES['documento_nota_fiscal']
+    documento_nota_fiscal = arquivo_enviado(request, 'documento_nota_fiscal')
+    if documento_nota_fiscal:
+        requisicao.documento_nota_fiscal = documento_nota_fiscal
 
     requisicao.save()
 